@@ -15,13 +15,27 @@ import os
 import time
 
 import carla
+import numpy as np
 from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
 
-from leaderboard.envs.sensor_interface import CallBack, OpenDriveMapReader, SpeedometerReader, SensorConfigurationInvalid
+from leaderboard.envs.lidar_sweep import LidarSweepAccumulator, packets_per_sweep
+from leaderboard.envs.sensor_decoder import sensor_transforms
+from leaderboard.envs.sensor_history import HISTORY_SENSORS
+from leaderboard.envs.sensor_preprocess import validate_preprocess
+from leaderboard.envs.sensor_ring import RING_SENSORS, RingBuffer, points_per_frame
+from leaderboard.envs.sensor_interface import (BaseReader, CallBack, OpenDriveMapReader, SpeedometerReader,
+                                               SensorConfigurationInvalid)
 from leaderboard.autoagents.autonomous_agent import Track
 
 MAX_ALLOWED_RADIUS_SENSOR = 3.0
 
+LIDAR_POINTS_PER_SECOND = 600000
+LIDAR_ROTATION_FREQUENCY = 10
+RADAR_POINTS_PER_SECOND = 1500
+
+# Taken from the sensor_tick of the sensors with a rate, for the rounding not to delay their capture to the next frame
+SENSOR_TICK_MARGIN = 1e-6
+
 SENSORS_LIMITS = {
     'sensor.camera.rgb': 4,
     'sensor.lidar.ray_cast': 1,
@@ -33,6 +47,15 @@ SENSORS_LIMITS = {
 }
 
 
+def sensor_period(sensor_spec, frame_rate):
+    """
+    Frames between the readings of a sensor, from the 'rate' (Hz) of its specification. Defaults to every frame
+    """
+    if 'rate' not in sensor_spec:
+        return 1
+    return max(int(round(frame_rate / float(sensor_spec['rate']))), 1)
+
+
 class AgentError(Exception):
     """
     Exceptions thrown when the agent returns an error during the simulation
@@ -62,11 +85,13 @@ class AgentWrapper(object):
     _agent = None
     _sensors_list = []
 
-    def __init__(self, agent):
+    def __init__(self, agent, decoder=None):
         """
-        Set the autonomous agent
+        Set the autonomous agent, and the pool decoding its sensor data (see SensorDecoder), if any
         """
         self._agent = agent
+        self._decoder = decoder
+        self._pseudo_sensors = []
 
     def __call__(self):
         """
@@ -77,25 +102,62 @@ class AgentWrapper(object):
     def agent_call(self, display_additional_info = None):
         return self._agent.agent_call(display_additional_info)
 
+    def tick_pseudo_sensors(self):
+        """
+        Let the pseudo sensors (speedometer, opendrive map) send their data, if due.
+        Called by the tick loop once GameTime has been updated.
+        """
+        for sensor in self._pseudo_sensors:
+            sensor.tick()
+
+    def get_sensor_wait_time(self):
+        """
+        Time spent by the last agent call waiting for the sensor data, in seconds
+        """
+        return self._agent.sensor_interface.last_wait_time
+
+    def mark_sensor_frame(self, frame):
+        """
+        Tell the sensor interface that the server has completed the frame
+        """
+        self._agent.sensor_interface.mark_frame(frame)
+
+    def get_sensor_metrics(self):
+        """
+        Latency and bandwidth metrics of each sensor (see SensorMetrics.summary)
+        """
+        return self._agent.sensor_interface.get_metrics()
+
     def setup_sensors(self, vehicle, debug_mode=False):
         """
-        Create the sensors defined by the user and attach them to the ego-vehicle
+        Create the sensors defined by the user and attach them to the ego-vehicle.
+        The sensors of the world are spawned in a single batch, and listened to once all are spawned
         :param vehicle: ego vehicle
         :return:
         """
         bp_library = CarlaDataProvider.get_world().get_blueprint_library()
+        frame_rate = 1 / CarlaDataProvider.get_world().get_settings().fixed_delta_seconds
+        pending_sensors = []
+        batch = []
         for sensor_spec in self._agent.sensors():
+            sensor = None
+            batch_index = None
+            ring = None
+            sweep = None
+            period = sensor_period(sensor_spec, frame_rate)
+            sensor_rate = frame_rate / period
+            zero_copy = sensor_spec.get('zero_copy', False)
             # These are the pseudosensors (not spawned)
             if sensor_spec['type'].startswith('sensor.opendrive_map'):
                 # The HDMap pseudo sensor is created directly here
                 sensor = OpenDriveMapReader(vehicle, sensor_spec['reading_frequency'])
             elif sensor_spec['type'].startswith('sensor.speedometer'):
-                delta_time = CarlaDataProvider.get_world().get_settings().fixed_delta_seconds
-                frame_rate = 1 / delta_time
                 sensor = SpeedometerReader(vehicle, frame_rate)
             # These are the sensors spawned on the carla world
             else:
                 bp = bp_library.find(str(sensor_spec['type']))
+                if period > 1:
+                    bp.set_attribute('sensor_tick', str(period / frame_rate - SENSOR_TICK_MARGIN))
                 if sensor_spec['type'].startswith('sensor.camera'):
                     bp.set_attribute('image_size_x', str(sensor_spec['width']))
                     bp.set_attribute('image_size_y', str(sensor_spec['height']))
@@ -104,6 +166,8 @@ class AgentWrapper(object):
                     bp.set_attribute('lens_circle_falloff', str(3.0))
                     bp.set_attribute('chromatic_aberration_intensity', str(0.5))
                     bp.set_attribute('chromatic_aberration_offset', str(0))
+                    if zero_copy:
+                        ring = RingBuffer((sensor_spec['height'], sensor_spec['width'], 4), np.uint8)
 
                     sensor_location = carla.Location(x=sensor_spec['x'], y=sensor_spec['y'],
                                                      z=sensor_spec['z'])
@@ -112,15 +176,23 @@ class AgentWrapper(object):
                                                      yaw=sensor_spec['yaw'])
                 elif sensor_spec['type'].startswith('sensor.lidar'):
                     bp.set_attribute('range', str(85))
-                    bp.set_attribute('rotation_frequency', str(10))
+                    bp.set_attribute('rotation_frequency', str(LIDAR_ROTATION_FREQUENCY))
                     bp.set_attribute('channels', str(64))
                     bp.set_attribute('upper_fov', str(10))
                     bp.set_attribute('lower_fov', str(-30))
-                    bp.set_attribute('points_per_second', str(600000))
+                    bp.set_attribute('points_per_second', str(LIDAR_POINTS_PER_SECOND))
                     bp.set_attribute('atmosphere_attenuation_rate', str(0.004))
                     bp.set_attribute('dropoff_general_rate', str(0.45))
                     bp.set_attribute('dropoff_intensity_limit', str(0.8))
                     bp.set_attribute('dropoff_zero_intensity', str(0.4))
+                    packet_rows = points_per_frame(LIDAR_POINTS_PER_SECOND, sensor_rate)
+                    if 'sweep' in sensor_spec:
+                        points = sensor_spec['sweep'] if sensor_spec['sweep'] != 'full' else None
+                        sweep = LidarSweepAccumulator(packet_rows,
+                                                      packets_per_sweep(sensor_rate, LIDAR_ROTATION_FREQUENCY), points,
+                                                      zero_copy=zero_copy, frame_step=period)
+                    elif zero_copy:
+                        ring = RingBuffer((packet_rows, 4), np.float32)
                     sensor_location = carla.Location(x=sensor_spec['x'], y=sensor_spec['y'],
                                                      z=sensor_spec['z'])
                     sensor_rotation = carla.Rotation(pitch=sensor_spec['pitch'],
@@ -129,8 +201,10 @@ class AgentWrapper(object):
                 elif sensor_spec['type'].startswith('sensor.other.radar'):
                     bp.set_attribute('horizontal_fov', str(sensor_spec['fov']))  # degrees
                     bp.set_attribute('vertical_fov', str(sensor_spec['fov']))  # degrees
-                    bp.set_attribute('points_per_second', '1500')
+                    bp.set_attribute('points_per_second', str(RADAR_POINTS_PER_SECOND))
                     bp.set_attribute('range', '100')  # meters
+                    if zero_copy:
+                        ring = RingBuffer((points_per_frame(RADAR_POINTS_PER_SECOND, sensor_rate), 4), np.float32)
 
                     sensor_location = carla.Location(x=sensor_spec['x'],
                                                      y=sensor_spec['y'],
@@ -166,17 +240,56 @@ class AgentWrapper(object):
                     sensor_rotation = carla.Rotation(pitch=sensor_spec['pitch'],
                                                      roll=sensor_spec['roll'],
                                                      yaw=sensor_spec['yaw'])
-                # create sensor
+                # create sensor, once all of them are ready
                 sensor_transform = carla.Transform(sensor_location, sensor_rotation)
-                sensor = CarlaDataProvider.get_world().spawn_actor(bp, sensor_transform, vehicle)
+                batch_index = len(batch)
+                batch.append(carla.command.SpawnActor(bp, sensor_transform, vehicle.id))
+            pending_sensors.append((sensor_spec, sensor, batch_index, ring, sweep, period))
+
+        spawned_sensors = self._spawn_sensors(batch)
+
+        for sensor_spec, sensor, batch_index, ring, sweep, period in pending_sensors:
+            if batch_index is not None:
+                sensor = spawned_sensors[batch_index]
             # setup callback
-            sensor.listen(CallBack(sensor_spec['id'], sensor_spec['type'], sensor, self._agent.sensor_interface))
+            sensor.listen(CallBack(sensor_spec['id'], sensor_spec['type'], sensor, self._agent.sensor_interface, ring,
+                                   sensor_transforms(sensor_spec), self._decoder, sweep, sensor_spec.get('history', 0),
+                                   period))
             self._sensors_list.append(sensor)
+            if isinstance(sensor, BaseReader):
+                self._pseudo_sensors.append(sensor)
 
         # Tick once to spawn the sensors
         CarlaDataProvider.get_world().tick()
 
 
+    @staticmethod
+    def _spawn_sensors(batch):
+        """
+        Spawn the sensors with a single request to the server. Returns the actors, in the order of the batch.
+        If any of them fails, the spawned ones are destroyed
+        """
+        if not batch:
+            return []
+
+        client = CarlaDataProvider.get_client()
+        responses = client.apply_batch_sync(batch)
+        errors = [response.error for response in responses if response.error]
+        actor_ids = [response.actor_id for response in responses if not response.error]
+        if errors:
+            client.apply_batch_sync([carla.command.DestroyActor(actor_id) for actor_id in actor_ids])
+            raise RuntimeError("The sensors could not be spawned: {}".format(', '.join(errors)))
+
+        actors = {actor.id: actor for actor in CarlaDataProvider.get_world().get_actors(actor_ids)}
+        return [actors[actor_id] for actor_id in actor_ids]
+
+    @staticmethod
+    def requires_rendering(sensors):
+        """
+        Returns True if any of the sensors needs the world to be rendered, i.e. is a camera
+        """
+        return any(sensor['type'].startswith('sensor.camera') for sensor in sensors)
+
     @staticmethod
     def validate_sensor_configuration(sensors, agent_track, selected_track):
         """
@@ -207,6 +320,40 @@ class AgentWrapper(object):
             if sensor['type'] not in AgentWrapper.allowed_sensors:
                 raise SensorConfigurationInvalid("Illegal sensor used. {} are not allowed!".format(sensor['type']))
 
+            # Check the preprocessing of the sensor data
+            validate_preprocess(sensor)
+
+            # Check the opt-in of the readings stored in ring buffers
+            if 'zero_copy' in sensor:
+                if not sensor['type'].startswith(RING_SENSORS):
+                    raise SensorConfigurationInvalid("Only {} can be zero copy [{}]".format(
+                        ', '.join(RING_SENSORS), sensor_id))
+                if not isinstance(sensor['zero_copy'], bool):
+                    raise SensorConfigurationInvalid("Invalid zero_copy of sensor [{}]".format(sensor_id))
+
+            # Check the accumulation of the LiDAR packets
+            if 'sweep' in sensor:
+                if not sensor['type'].startswith('sensor.lidar'):
+                    raise SensorConfigurationInvalid("Only the LiDAR sweeps can be accumulated [{}]".format(sensor_id))
+                if sensor['sweep'] != 'full' and (not isinstance(sensor['sweep'], int) or sensor['sweep'] <= 0):
+                    raise SensorConfigurationInvalid("Invalid sweep of sensor [{}]".format(sensor_id))
+
+            # Check the rate of the sensors, only the ones spawned in the world can have one
+            if 'rate' in sensor:
+                if sensor['type'].startswith(('sensor.opendrive_map', 'sensor.speedometer')):
+                    raise SensorConfigurationInvalid("The rate of [{}] can't be set".format(sensor_id))
+                if isinstance(sensor['rate'], bool) or not isinstance(sensor['rate'], (int, float)) \
+                        or sensor['rate'] <= 0:
+                    raise SensorConfigurationInvalid("Invalid rate of sensor [{}]".format(sensor_id))
+
+            # Check the history of the small sensors
+            if 'history' in sensor:
+                if sensor['type'] not in HISTORY_SENSORS:
+                    raise SensorConfigurationInvalid("Only {} can keep a history [{}]".format(
+                        ', '.join(HISTORY_SENSORS), sensor_id))
+                if not isinstance(sensor['history'], int) or sensor['history'] <= 0:
+                    raise SensorConfigurationInvalid("Invalid history of sensor [{}]".format(sensor_id))
+
             # Check the extrinsics of the sensor
             if 'x' in sensor and 'y' in sensor and 'z' in sensor:
                 if math.sqrt(sensor['x']**2 + sensor['y']**2 + sensor['z']**2) > MAX_ALLOWED_RADIUS_SENSOR:
@@ -238,3 +385,8 @@ class AgentWrapper(object):
                 self._sensors_list[i].destroy()
                 self._sensors_list[i] = None
         self._sensors_list = []
+        self._pseudo_sensors = []
+
+        # Decode what was already received, and stop the decoding threads
+        if self._decoder is not None:
+            self._decoder.shutdown()
@@ -71,6 +71,13 @@ class AutonomousAgent(object):
              'id': 'LIDAR'}
         ]
 
+        The 'sensor.opendrive_map' readings are {'town', 'version'} dictionaries. The OpenDRIVE document
+        itself is only under the 'opendrive' key of the first reading of each map, and has to be kept by
+        the agent (see OpenDriveMapReader).
+
+        Cameras, LiDARs and radars can set 'zero_copy': True to receive read-only views of preallocated
+        buffers instead of new arrays. Those views are only valid until the next get_data() (see sensor_ring).
+
         """
         sensors = []
 
@@ -113,6 +120,7 @@ class AutonomousAgent(object):
 
         control = self.run_step(input_data, timestamp,display_additional_info)
         control.manual_gear_shift = False
+        self.sensor_interface.record_control(control, display_additional_info)
 
         return control
 
@@ -133,6 +141,7 @@ class AutonomousAgent(object):
 
         control = self.run_step(input_data, timestamp)
         control.manual_gear_shift = False
+        self.sensor_interface.record_control(control)
 
         return control
 
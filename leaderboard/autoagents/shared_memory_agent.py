@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module runs a user agent in its own process, receiving the sensor data
+through shared memory (see SharedFrameWriter).
+
+Use it as the evaluated agent, giving the real agent and its configuration
+as the agent configuration, separated by a colon:
+
+    --agent=leaderboard/autoagents/shared_memory_agent.py
+    --agent-config=/path/to/my_agent.py:/path/to/my_agent_config
+
+Needs Python 3.8 or newer (see shared_memory_transport).
+"""
+
+from __future__ import print_function
+
+import importlib
+import multiprocessing
+import os
+import sys
+import traceback
+
+import carla
+
+from leaderboard.autoagents.autonomous_agent import AutonomousAgent, Track
+from leaderboard.envs.shared_memory_transport import SharedFrameReader, SharedFrameWriter
+
+# Time given to the agent process to start or stop, in seconds
+PROCESS_TIMEOUT = 60.0
+
+# Period at which a blocked evaluator checks that the agent process is still alive, in seconds
+ALIVE_CHECK_PERIOD = 1.0
+
+CONTROL_FIELDS = ('throttle', 'steer', 'brake', 'hand_brake', 'reverse', 'manual_gear_shift', 'gear')
+
+
+def get_entry_point():
+    return 'SharedMemoryAgent'
+
+
+def encode_control(control):
+    return {field: getattr(control, field) for field in CONTROL_FIELDS}
+
+
+def decode_control(values):
+    return carla.VehicleControl(**values)
+
+
+def encode_route(route):
+    """
+    Routes of (carla.Transform, RoadOption) as plain tuples, for them to be pickled
+    """
+    return [((transform.location.x, transform.location.y, transform.location.z,
+              transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll), option)
+            for transform, option in route]
+
+
+def decode_route(route):
+    return [(carla.Transform(carla.Location(x, y, z), carla.Rotation(pitch=pitch, yaw=yaw, roll=roll)), option)
+            for (x, y, z, pitch, yaw, roll), option in route]
+
+
+def run_agent_process(agent_path, agent_config, connection):
+    """
+    Main loop of the agent process: creates the user agent and answers the requests of the SharedMemoryAgent
+    """
+    try:
+        module_name = os.path.basename(agent_path).split('.')[0]
+        sys.path.insert(0, os.path.dirname(agent_path))
+        module_agent = importlib.import_module(module_name)
+        agent = getattr(module_agent, module_agent.get_entry_point())(agent_config)
+        connection.send(('ready', (agent.track.value, agent.sensors())))
+    except Exception:  # pylint: disable=broad-except
+        connection.send(('error', traceback.format_exc()))
+        return
+
+    reader = SharedFrameReader()
+    while True:
+        command, payload = connection.recv()
+        if command == 'destroy':
+            break
+
+        try:
+            if command == 'run_step':
+                readings, timestamp, display_additional_info = payload
+                control = agent.run_step(reader.read(readings), timestamp, display_additional_info)
+                connection.send(('control', encode_control(control)))
+
+            elif command == 'global_plan':
+                global_plan_gps, global_plan_world_coord = payload
+                agent.set_global_plan(global_plan_gps, decode_route(global_plan_world_coord))
+                connection.send(('global_plan_set', None))
+
+        except Exception:  # pylint: disable=broad-except
+            connection.send(('error', traceback.format_exc()))
+
+    # The process ends once the agent is destroyed, whether it succeeded or not
+    reply = ('destroyed', None)
+    try:
+        agent.destroy()
+    except Exception:  # pylint: disable=broad-except
+        reply = ('error', traceback.format_exc())
+
+    reader.close()
+    connection.send(reply)
+
+
+class SharedMemoryAgent(AutonomousAgent):
+
+    """
+    Proxy of an agent running in its own process
+    """
+
+    def setup(self, path_to_conf_file):
+        """
+        Start the agent process, with the agent and configuration given as 'agent_path:agent_config'
+        """
+        agent_path, _, agent_config = path_to_conf_file.partition(':')
+
+        # Spawn instead of fork, as the CARLA client has threads running
+        context = multiprocessing.get_context('spawn')
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(target=run_agent_process,
+                                        args=(agent_path, agent_config, child_connection),
+                                        daemon=True)
+        self._process.start()
+        self._writer = SharedFrameWriter()
+
+        track, self._sensors = self._receive(PROCESS_TIMEOUT)
+        self.track = Track(track)
+
+    def _receive(self, timeout=None):
+        """
+        Wait for the answer of the agent process, raising its errors
+        """
+        waited = 0.0
+        while not self._connection.poll(ALIVE_CHECK_PERIOD):
+            waited += ALIVE_CHECK_PERIOD
+            if not self._process.is_alive():
+                raise RuntimeError("The agent process has died")
+            if timeout is not None and waited >= timeout:
+                raise RuntimeError("The agent process took too long to answer")
+
+        command, payload = self._connection.recv()
+        if command == 'error':
+            raise RuntimeError("Error in the agent process:\n{}".format(payload))
+
+        return payload
+
+    def sensors(self):
+        return self._sensors
+
+    def set_global_plan(self, global_plan_gps, global_plan_world_coord):
+        """
+        Set the route of the agent process, waiting for it so that its errors are raised here
+        """
+        super(SharedMemoryAgent, self).set_global_plan(global_plan_gps, global_plan_world_coord)
+        self._connection.send(('global_plan', (global_plan_gps, encode_route(global_plan_world_coord))))
+        self._receive()
+
+    def run_step(self, input_data, timestamp, display_additional_info=None):
+        readings = self._writer.write(input_data)
+        self._connection.send(('run_step', (readings, timestamp, display_additional_info)))
+        return decode_control(self._receive())
+
+    def destroy(self):
+        """
+        Stop the agent process and free the shared memory
+        """
+        try:
+            if self._process.is_alive():
+                self._connection.send(('destroy', None))
+                self._receive(PROCESS_TIMEOUT)
+        finally:
+            self._process.join(PROCESS_TIMEOUT)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._writer.close()
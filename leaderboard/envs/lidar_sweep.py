@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Accumulation of the LiDAR packets into full sweeps.
+
+The LiDAR rotates slower than the simulation ticks, so every measurement only
+covers part of a rotation (half of it at 10 Hz and 20 FPS). Agents can ask for
+the packets to be accumulated with the 'sweep' key of the sensor specification:
+
+    {'type': 'sensor.lidar.ray_cast', ..., 'sweep': 'full'}     latest full 360 degrees sweep
+    {'type': 'sensor.lidar.ray_cast', ..., 'sweep': 40000}      latest 40000 points
+
+Both are delivered every frame, with the packets in the order of their frames,
+whatever their order of arrival. Packets older than the ones kept are dropped.
+
+A full sweep is made of the packets of one rotation, counted from the first
+packet received, when the LiDAR starts rotating. It changes once every rotation,
+when its last packet is received, and the same sweep is delivered in between.
+Until the first rotation is complete, the reading is empty (no points), never
+a partial sweep. With a window of points, the first readings have fewer points
+than requested, until enough of them are received.
+
+The packets are kept in preallocated storage. Each reading is a new array, or
+with 'zero_copy' (see sensor_ring) it is copied into a RingBuffer slot, so
+nothing is allocated per tick.
+"""
+
+from __future__ import print_function
+
+import math
+from threading import Lock
+
+import numpy as np
+
+from leaderboard.envs.sensor_ring import POINTS_MARGIN, RingBuffer
+
+
+def packets_per_sweep(frame_rate, rotation_frequency):
+    """
+    Amount of measurements needed to cover a full rotation
+    """
+    return int(math.ceil(frame_rate / float(rotation_frequency)))
+
+
+class LidarSweepAccumulator(object):
+
+    """
+    Keeps the latest packets of a LiDAR, and composes them into the readings sent to the agent.
+
+    - packet_rows: maximum amount of points of a packet. Grows if a larger packet is received
+    - packets: amount of packets of a full sweep
+    - points: if given, the readings are the latest amount of points instead of the full sweep
+    - frame_step: frames between two packets, for the LiDARs with a period
+    - zero_copy: if set, the readings are read-only views of a RingBuffer, to be released
+    """
+
+    def __init__(self, packet_rows, packets, points=None, columns=4, dtype=np.float32, zero_copy=False,
+                 frame_step=1):
+        self._sweep_packets = packets
+        self._frame_step = frame_step
+
+        if points is not None:
+            # A window of points may need an extra packet, as the oldest one is only partially used.
+            # The packets are usually smaller than packet_rows, which has margin
+            slots = max(packets, int(math.ceil(points * POINTS_MARGIN / float(packet_rows))) + 1)
+        else:
+            # The complete rotation being delivered, and the next one being received
+            slots = 2 * packets
+
+        self._packets = np.empty((slots, packet_rows, columns), dtype=dtype)
+        self._rows = [0] * slots
+        # Frame of each stored packet, or with full sweeps its number since the first packet
+        self._keys = [None] * slots
+        self._first_frame = None
+        self._rotation = None
+        self._points = points
+        self._zero_copy = zero_copy
+        self._lock = Lock()
+
+        self._ring = RingBuffer((points if points is not None else packets * packet_rows, columns), dtype) \
+            if zero_copy else None
+
+    def _key_of(self, frame):
+        if self._points is not None:
+            return frame
+        if self._first_frame is None:
+            self._first_frame = frame
+        return int(round((frame - self._first_frame) / float(self._frame_step)))
+
+    def _slot_of(self, key):
+        """
+        Place of the packet in the storage, or None if it is older than the ones kept
+        """
+        if key in self._keys:
+            return self._keys.index(key)
+
+        if self._points is None:
+            return key % len(self._keys) if key >= 0 else None
+
+        if None in self._keys:
+            return self._keys.index(None)
+        oldest = min(range(len(self._keys)), key=self._keys.__getitem__)
+        return oldest if key > self._keys[oldest] else None
+
+    def _store(self, raw_data, key):
+        """
+        Copy the packet into its place of the storage, unless it is too old
+        """
+        slot = self._slot_of(key)
+        if slot is None:
+            return
+
+        source = np.frombuffer(raw_data, dtype=self._packets.dtype)
+        rows = source.size // self._packets.shape[2]
+        if rows > self._packets.shape[1]:
+            grown = np.empty((self._packets.shape[0], rows) + self._packets.shape[2:], dtype=self._packets.dtype)
+            grown[:, :self._packets.shape[1]] = self._packets
+            self._packets = grown
+
+        np.copyto(self._packets[slot, :rows], source.reshape((rows, self._packets.shape[2])))
+        self._rows[slot] = rows
+        self._keys[slot] = key
+
+    def _rotation_slots(self, rotation):
+        """
+        Places of the packets of a rotation, None for the ones not stored
+        """
+        keys = range(rotation * self._sweep_packets, (rotation + 1) * self._sweep_packets)
+        return [self._keys.index(key) if key in self._keys else None for key in keys]
+
+    def _sweep_parts(self, key):
+        """
+        Views of the packets of the latest complete rotation, once the given packet is stored
+        """
+        rotation = key // self._sweep_packets
+        if (self._rotation is None or rotation > self._rotation) and None not in self._rotation_slots(rotation):
+            self._rotation = rotation
+
+        if self._rotation is None:
+            return []
+
+        slots = self._rotation_slots(self._rotation)
+        if None in slots:
+            # Partly overwritten by the packets of a later rotation, not complete yet
+            return []
+        return [self._packets[slot, :self._rows[slot]] for slot in slots]
+
+    def _window_parts(self):
+        """
+        Views of the stored packets, from the oldest to the newest one, limited to the requested points
+        """
+        slots = sorted((slot for slot, key in enumerate(self._keys) if key is not None),
+                       key=self._keys.__getitem__, reverse=True)
+
+        parts = []
+        remaining = self._points
+        for slot in slots:
+            part = self._packets[slot, :self._rows[slot]]
+            part = part[len(part) - min(remaining, len(part)):]
+            remaining -= len(part)
+            parts.append(part)
+            if remaining == 0:
+                break
+
+        parts.reverse()
+        return parts
+
+    def add(self, raw_data, frame):
+        """
+        Add the packet of a frame. Returns the slot index of the reading in the ring, to be released,
+        and the reading. Without zero_copy, the index is None and the reading is a new array
+        """
+        with self._lock:
+            key = self._key_of(frame)
+            self._store(raw_data, key)
+            if self._points is None:
+                parts = self._sweep_parts(key)
+            else:
+                parts = self._window_parts()
+
+            if not parts:
+                parts = [self._packets[0, :0]]
+            if not self._zero_copy:
+                return None, np.concatenate(parts)
+            return self._ring.write_parts(parts)
+
+    def release(self, index):
+        self._ring.release(index)
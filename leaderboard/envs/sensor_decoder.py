@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Decode stage of the sensor data, run by a pool of threads.
+
+The CARLA listener threads only hand the raw measurements to the pool, which
+copies them into numpy arrays (the copies release the GIL), applies the
+transforms of each sensor and sends the readings to the SensorInterface.
+
+The measurements of a sensor are decoded one at a time, in their order of
+arrival, so that its readings aren't overwritten by older ones. The threads
+of the pool thus decode the measurements of different sensors in parallel.
+
+The amount of measurements waiting to be decoded is bounded. Once the bound
+is reached, the listener threads wait for a free place, which is reported
+as a stall: frequent stalls mean that decoding is the bottleneck.
+"""
+
+from __future__ import print_function
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from threading import BoundedSemaphore, Lock
+import time
+
+import numpy as np
+
+from leaderboard.envs.sensor_preprocess import preprocess_transforms
+
+DEFAULT_WORKERS = 2
+
+# Measurements waiting to be decoded, per worker, before the listener threads are stalled
+PENDING_PER_WORKER = 2
+
+
+def flip_radar(points):
+    """
+    Radar detections as [depth, azimuth, altitude, velocity], instead of the order sent by the server
+    """
+    return np.flip(points, 1)
+
+
+def sensor_transforms(sensor_spec):
+    """
+    Transforms applied to the readings of a sensor, once copied into an array
+    (images as (height, width, 4), point clouds as (points, 4)), followed by
+    its preprocessing (see sensor_preprocess)
+    """
+    transforms = []
+    if sensor_spec['type'].startswith('sensor.other.radar'):
+        transforms.append(flip_radar)
+    return transforms + preprocess_transforms(sensor_spec)
+
+
+class SensorDecoder(object):
+
+    """
+    Bounded pool of threads decoding the sensor measurements.
+
+    - workers: amount of decoding threads
+    - max_pending: measurements accepted before the listener threads are stalled,
+      by default PENDING_PER_WORKER per worker
+
+    The threads are started with the first measurement, and stopped by shutdown(),
+    at the end of every route. The measurements received after shutdown() are
+    dropped, and counted, until start() is called for the next route.
+    The metrics are kept until reset().
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=None):
+        self._workers = workers
+        self._executor = None
+        self._max_pending = max_pending or PENDING_PER_WORKER * workers
+        self._free_places = BoundedSemaphore(self._max_pending)
+        self._lock = Lock()
+        self._closed = False
+
+        # Measurements waiting to be decoded per sensor tag, and the tags being decoded by a thread
+        self._queues = {}
+        self._active_tags = set()
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the metrics
+        """
+        with self._lock:
+            self._pending = 0
+            self._peak_pending = 0
+            self._decoded = 0
+            self._errors = 0
+            self._dropped = 0
+            self._stalls = 0
+            self._stall_time = 0.0
+            self._queue_time = 0.0
+            self._decode_time = 0.0
+
+    def start(self):
+        """
+        Accept measurements again, after shutdown()
+        """
+        with self._lock:
+            self._closed = False
+
+    def submit(self, tag, decode, data):
+        """
+        Decode the data on the pool, after the measurements of the same sensor tag already submitted,
+        waiting for a free place if there are too many pending measurements.
+        Called by the CARLA listener threads
+        """
+        start_time = time.perf_counter()
+        stalled = not self._free_places.acquire(blocking=False)
+        if stalled:
+            self._free_places.acquire()
+
+        with self._lock:
+            if stalled:
+                self._stalls += 1
+                self._stall_time += time.perf_counter() - start_time
+
+            if self._closed:
+                self._dropped += 1
+                self._free_places.release()
+                return
+
+            self._pending += 1
+            self._peak_pending = max(self._peak_pending, self._pending)
+            self._queues.setdefault(tag, deque()).append((decode, data, time.perf_counter()))
+
+            if tag not in self._active_tags:
+                self._active_tags.add(tag)
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._workers,
+                                                        thread_name_prefix='sensor_decoder')
+                self._executor.submit(self._decode_tag, tag)
+
+    def _decode_tag(self, tag):
+        """
+        Decode the measurements of a sensor tag until none is left
+        """
+        while True:
+            with self._lock:
+                queue = self._queues[tag]
+                if not queue:
+                    self._active_tags.discard(tag)
+                    return
+                decode, data, submit_time = queue.popleft()
+
+            self._decode(decode, data, submit_time)
+
+    def _decode(self, decode, data, submit_time):
+        start_time = time.perf_counter()
+        failed = False
+        try:
+            decode(data)
+        except Exception:  # pylint: disable=broad-except
+            failed = True
+            logging.exception('Error decoding the sensor data')
+
+        end_time = time.perf_counter()
+        with self._lock:
+            self._pending -= 1
+            self._decoded += 1
+            self._errors += int(failed)
+            self._queue_time += start_time - submit_time
+            self._decode_time += end_time - start_time
+        self._free_places.release()
+
+    def summary(self):
+        """
+        Returns the backpressure metrics: decoded measurements, errors, measurements dropped after
+        shutdown(), maximum amount of pending measurements (and its bound), stalls of the listener threads and their total time,
+        and the mean time waiting for a worker and decoding. Times in ms
+        """
+        with self._lock:
+            decoded = max(self._decoded, 1)
+            return {
+                'decoded': self._decoded,
+                'errors': self._errors,
+                'dropped': self._dropped,
+                'peak_pending': self._peak_pending,
+                'max_pending': self._max_pending,
+                'stalls': self._stalls,
+                'stall_time': round(1000 * self._stall_time, 3),
+                'mean_queue_time': round(1000 * self._queue_time / decoded, 3),
+                'mean_decode_time': round(1000 * self._decode_time / decoded, 3),
+            }
+
+    def shutdown(self):
+        """
+        Wait for the pending measurements and stop the threads. The measurements received
+        afterwards are dropped, until start() is called
+        """
+        with self._lock:
+            self._closed = True
+            executor = self._executor
+            self._executor = None
+
+        if executor is not None:
+            executor.shutdown(wait=True)
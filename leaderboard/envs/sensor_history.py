@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+History of the latest samples of the small sensors (IMU, GNSS, speedometer).
+
+Agents opt in with the 'history' key of the sensor specification, giving the
+amount of samples, e.g. {'type': 'sensor.other.imu', ..., 'history': 20}.
+Instead of the latest sample, they then receive a dictionary with read-only
+views of the latest samples, from the oldest to the newest one:
+
+    {'values': (n, columns) array, 'timestamps': (n,) array, 'frames': (n,) array}
+
+Every sample is written twice, at its position and at its position plus the
+amount of samples, so the window is always a contiguous slice of a single
+preallocated array. The views are read-only, like the rest of the readings
+stored in preallocated buffers, and valid until the next get_data().
+
+The timestamps don't share the same time base:
+- IMU and GNSS: simulation time of the measurement given by the server
+  (carla.SensorData.timestamp), in seconds since the world was loaded
+- speedometer: game time (GameTime.get_time()), in seconds since the route started
+The frames are the simulation frames of the samples for all of them.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+# Sensors that can keep a history
+HISTORY_SENSORS = ('sensor.other.imu', 'sensor.other.gnss', 'sensor.speedometer')
+
+
+class SensorHistory(object):
+
+    """
+    Window of the latest samples of a sensor, stored in double length float64 arrays
+    """
+
+    def __init__(self, samples):
+        self._samples = samples
+        self._values = None
+        self._timestamps = np.zeros(2 * samples, dtype=np.float64)
+        self._frames = np.zeros(2 * samples, dtype=np.int64)
+        self._next = 0
+        self._count = 0
+
+    def append(self, frame, timestamp, values):
+        """
+        Add a sample. The values can be an array, or a dictionary of values (e.g. {'speed': speed}).
+        The timestamp is the one of the sensor (see the module docstring for its time base)
+        """
+        if isinstance(values, dict):
+            values = list(values.values())
+        values = np.asarray(values, dtype=np.float64).ravel()
+
+        if self._values is None:
+            self._values = np.zeros((2 * self._samples, values.size), dtype=np.float64)
+
+        for index in (self._next, self._next + self._samples):
+            self._values[index] = values
+            self._timestamps[index] = timestamp
+            self._frames[index] = frame
+
+        self._next = (self._next + 1) % self._samples
+        self._count = min(self._count + 1, self._samples)
+
+    def window(self):
+        """
+        Read-only views of the latest samples, from the oldest to the newest one
+        """
+        end = self._next + self._samples
+        start = end - self._count
+
+        window = {'values': self._values[start:end].view(),
+                  'timestamps': self._timestamps[start:end].view(),
+                  'frames': self._frames[start:end].view()}
+        for view in window.values():
+            view.flags.writeable = False
+        return window
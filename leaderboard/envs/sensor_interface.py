@@ -1,26 +1,29 @@
 import copy
+from functools import partial
 import logging
 import numpy as np
 import os
 import time
-from threading import Thread
-
-from queue import Queue
-from queue import Empty
+from threading import Condition
 
 import carla
 from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
 from srunner.scenariomanager.timer import GameTime
 
+from leaderboard.envs.sensor_history import SensorHistory
+from leaderboard.envs.sensor_metrics import SensorMetrics
+from leaderboard.envs.sensor_recorder import SensorRecorder
+from leaderboard.utils.actor_registry import ActorRegistry
+from leaderboard.utils.opendrive_cache import OpenDriveCache
+
+# Sensors that are read by the leaderboard instead of being spawned on the world
+PSEUDO_SENSORS = ('sensor.opendrive_map', 'sensor.speedometer')
 
-def threaded(fn):
-    def wrapper(*args, **kwargs):
-        thread = Thread(target=fn, args=args, kwargs=kwargs)
-        thread.setDaemon(True)
-        thread.start()
+# Tolerance when checking if a pseudo sensor is due, to absorb the rounding of the game time
+DUE_TOLERANCE = 1e-6
 
-        return thread
-    return wrapper
+# Measurements decoded by the SensorDecoder, if any. The others are cheap enough for the listener threads
+DECODED_MEASUREMENTS = (carla.libcarla.Image, carla.libcarla.LidarMeasurement, carla.libcarla.RadarMeasurement)
 
 
 class SensorConfigurationInvalid(Exception):
@@ -41,50 +44,61 @@ class SensorReceivedNoData(Exception):
         super(SensorReceivedNoData, self).__init__(message)
 
 
+class SensorFrame(dict):
+    """
+    Readings of the sensors for one frame, as a dictionary of tag -> (frame, data)
+    """
+
+    def __init__(self, frame, readings=None):
+        super(SensorFrame, self).__init__(readings or {})
+        self.frame = frame
+
+
 class GenericMeasurement(object):
-    def __init__(self, data, frame):
+    def __init__(self, data, frame, timestamp=None):
         self.data = data
         self.frame = frame
+        self.timestamp = timestamp
 
 
 class BaseReader(object):
+
+    """
+    Pseudo sensor, read by the tick loop (see tick()) at its reading frequency
+    """
+
     def __init__(self, vehicle, reading_frequency=1.0):
         self._vehicle = vehicle
         self._reading_frequency = reading_frequency
         self._callback = None
-        self._run_ps = True
-        self.run()
+        self._latest_time = None
 
     def __call__(self):
         pass
 
-    @threaded
-    def run(self):
-        first_time = True
-        latest_time = GameTime.get_time()
-        while self._run_ps:
-            if self._callback is not None:
-                current_time = GameTime.get_time()
-
-                # Second part forces the sensors to send data at the first tick, regardless of frequency
-                if current_time - latest_time > (1 / self._reading_frequency) \
-                        or (first_time and GameTime.get_frame() != 0):
-                    self._callback(GenericMeasurement(self.__call__(), GameTime.get_frame()))
-                    latest_time = GameTime.get_time()
-                    first_time = False
+    def tick(self):
+        """
+        Called once per tick, after GameTime is updated. Sends a reading if the sensor is due.
+        """
+        if self._callback is None or GameTime.get_frame() == 0:
+            return
 
-                else:
-                    time.sleep(0.001)
+        # The first tick always sends a reading, regardless of the frequency
+        current_time = GameTime.get_time()
+        if self._latest_time is None \
+                or current_time - self._latest_time >= 1 / self._reading_frequency - DUE_TOLERANCE:
+            self._callback(GenericMeasurement(self.__call__(), GameTime.get_frame(), current_time))
+            self._latest_time = current_time
 
     def listen(self, callback):
         # Tell that this function receives what the producer does.
         self._callback = callback
 
     def stop(self):
-        self._run_ps = False
+        self._callback = None
 
     def destroy(self):
-        self._run_ps = False
+        self._callback = None
 
 
 class SpeedometerReader(BaseReader):
@@ -107,9 +121,25 @@ class SpeedometerReader(BaseReader):
         speed = np.dot(vel_np, orientation)
         return speed
 
+    def _get_cached_forward_speed(self):
+        """ Compute the forward speed from the actor state cached for this tick """
+        state = ActorRegistry.get_state(self._vehicle.id)
+        if state is None:
+            return None
+
+        _, rotation, vel_np = state
+        pitch = np.deg2rad(rotation[0])
+        yaw = np.deg2rad(rotation[1])
+        orientation = np.array([np.cos(pitch) * np.cos(yaw), np.cos(pitch) * np.sin(yaw), np.sin(pitch)])
+        return np.dot(vel_np, orientation)
+
     def __call__(self):
         """ We convert the vehicle physics information into a convenient dictionary """
 
+        speed = self._get_cached_forward_speed()
+        if speed is not None:
+            return {'speed': speed}
+
         # protect this access against timeout
         attempts = 0
         while attempts < self.MAX_CONNECTION_ATTEMPTS:
@@ -126,18 +156,58 @@ class SpeedometerReader(BaseReader):
 
 
 class OpenDriveMapReader(BaseReader):
+    """
+    Sensor sending the OpenDRIVE map. The full document is only sent when the map changes
+    (including the first reading). The other readings only reference it by its town and version:
+
+        {'town': 'Town01', 'version': 1, 'opendrive': '<OpenDRIVE>...'}    first reading of a map
+        {'town': 'Town01', 'version': 1}                                   later readings
+
+    Agents have to keep the 'opendrive' document of the first reading, as reading that key
+    every time raises a KeyError. The version changes whenever a new document is sent.
+    """
+
+    def __init__(self, vehicle, reading_frequency=1.0):
+        super(OpenDriveMapReader, self).__init__(vehicle, reading_frequency)
+        self._sent_version = None
+
     def __call__(self):
-        return {'opendrive': CarlaDataProvider.get_map().to_opendrive()}
+        carla_map = CarlaDataProvider.get_map()
+        version = OpenDriveCache.get_version(carla_map)
+        reading = {'town': OpenDriveCache.get_town(), 'version': version}
+        if version != self._sent_version:
+            reading['opendrive'] = OpenDriveCache.get_opendrive(carla_map)
+            self._sent_version = version
+        return reading
 
 
 class CallBack(object):
-    def __init__(self, tag, sensor_type, sensor, data_provider):
+    def __init__(self, tag, sensor_type, sensor, data_provider, ring=None, transforms=None, decoder=None,
+                 sweep=None, history=0, period=1):
         self._tag = tag
         self._data_provider = data_provider
 
-        self._data_provider.register_sensor(tag, sensor_type, sensor)
+        # Preallocated storage of the readings (see RingBuffer), if any
+        self._ring = ring
+
+        # Accumulation of the LiDAR packets into sweeps (see LidarSweepAccumulator), if any
+        self._sweep = sweep
+
+        # Applied to the images and point clouds once copied (see sensor_transforms)
+        self._transforms = transforms or []
+
+        # Pool decoding the images and point clouds off the listener thread (see SensorDecoder), if any
+        self._decoder = decoder
+
+        self._data_provider.register_sensor(tag, sensor_type, sensor, history, period)
 
     def __call__(self, data):
+        if self._decoder is not None and isinstance(data, DECODED_MEASUREMENTS):
+            self._decoder.submit(self._tag, self._parse, data)
+        else:
+            self._parse(data)
+
+    def _parse(self, data):
         if isinstance(data, carla.libcarla.Image):
             self._parse_image_cb(data, self._tag)
         elif isinstance(data, carla.libcarla.LidarMeasurement):
@@ -154,31 +224,63 @@ class CallBack(object):
             logging.error('No callback method for this sensor.')
 
     # Parsing CARLA physical Sensors
+    def _write_ring(self, data):
+        """
+        Copy the raw data into the ring, returning the read-only reading and the function releasing it
+        """
+        index, array = self._ring.write(data.raw_data)
+        return array, partial(self._ring.release, index)
+
+    def _transform(self, array):
+        for transform in self._transforms:
+            array = transform(array)
+        return array
+
     def _parse_image_cb(self, image, tag):
+        if self._ring is not None:
+            array, release = self._write_ring(image)
+            self._data_provider.update_sensor(tag, self._transform(array), image.frame, release)
+            return
+
         array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
         array = copy.deepcopy(array)
         array = np.reshape(array, (image.height, image.width, 4))
-        self._data_provider.update_sensor(tag, array, image.frame)
+        self._data_provider.update_sensor(tag, self._transform(array), image.frame)
 
     def _parse_lidar_cb(self, lidar_data, tag):
+        if self._sweep is not None:
+            index, points = self._sweep.add(lidar_data.raw_data, lidar_data.frame)
+            release = partial(self._sweep.release, index) if index is not None else None
+            self._data_provider.update_sensor(tag, self._transform(points), lidar_data.frame, release)
+            return
+
+        if self._ring is not None:
+            points, release = self._write_ring(lidar_data)
+            self._data_provider.update_sensor(tag, self._transform(points), lidar_data.frame, release)
+            return
+
         points = np.frombuffer(lidar_data.raw_data, dtype=np.dtype('f4'))
         points = copy.deepcopy(points)
         points = np.reshape(points, (int(points.shape[0] / 4), 4))
-        self._data_provider.update_sensor(tag, points, lidar_data.frame)
+        self._data_provider.update_sensor(tag, self._transform(points), lidar_data.frame)
 
     def _parse_radar_cb(self, radar_data, tag):
-        # [depth, azimuth, altitute, velocity]
+        # [depth, azimuth, altitute, velocity], once flipped (see flip_radar)
+        if self._ring is not None:
+            points, release = self._write_ring(radar_data)
+            self._data_provider.update_sensor(tag, self._transform(points), radar_data.frame, release)
+            return
+
         points = np.frombuffer(radar_data.raw_data, dtype=np.dtype('f4'))
         points = copy.deepcopy(points)
         points = np.reshape(points, (int(points.shape[0] / 4), 4))
-        points = np.flip(points, 1)
-        self._data_provider.update_sensor(tag, points, radar_data.frame)
+        self._data_provider.update_sensor(tag, self._transform(points), radar_data.frame)
 
     def _parse_gnss_cb(self, gnss_data, tag):
         array = np.array([gnss_data.latitude,
                           gnss_data.longitude,
                           gnss_data.altitude], dtype=np.float64)
-        self._data_provider.update_sensor(tag, array, gnss_data.frame)
+        self._data_provider.update_sensor(tag, array, gnss_data.frame, sample_time=gnss_data.timestamp)
 
     def _parse_imu_cb(self, imu_data, tag):
         array = np.array([imu_data.accelerometer.x,
@@ -189,55 +291,265 @@ class CallBack(object):
                           imu_data.gyroscope.z,
                           imu_data.compass,
                          ], dtype=np.float64)
-        self._data_provider.update_sensor(tag, array, imu_data.frame)
+        self._data_provider.update_sensor(tag, array, imu_data.frame, sample_time=imu_data.timestamp)
 
     def _parse_pseudosensor(self, package, tag):
-        self._data_provider.update_sensor(tag, package.data, package.frame)
+        self._data_provider.update_sensor(tag, package.data, package.frame, sample_time=package.timestamp)
 
 
 class SensorInterface(object):
+
+    """
+    Buffer of the latest reading of each sensor, indexed by frame.
+
+    Readings older than the buffered one of the same sensor are dropped as late,
+    and buffered readings replaced before being returned count as superseded.
+    get_data() waits until every sensor has a reading for the requested frame.
+
+    Sensors with a period (in frames) are only waited for on the frames they
+    are due, and return their last reading in between.
+
+    Readings stored in a RingBuffer (the sensors with 'zero_copy') come with a release
+    function, called when they are dropped or, once returned, at the next get_data()
+    or release_data(). Their slot can be overwritten from then on.
+    The ones of the sensors with a period are kept until their next reading is returned.
+
+    While recording (see start_recording), the arrays are returned read-only, and the
+    ring buffer readings are only released once written by the recorder.
+    """
+
     def __init__(self):
         self._sensors_objects = {}
-        self._data_buffers = {}
-        self._new_data_buffers = Queue()
+        self._pseudo_sensors = set()
+        self._histories = {}
+        self._periods = {}
+        self._readings = {}
+        self._fresh_tags = set()
+        self._releases = {}
+        self._kept_releases = {}
+        self._held_releases = []
+        self._condition = Condition()
         self._queue_timeout = 10
 
+        # Time spent by the last get_data() waiting for the sensors
+        self.last_wait_time = 0.0
+
+        # Readings dropped (late, superseded) or returned for another frame (mismatched)
+        self._frame_counters = {'late': 0, 'superseded': 0, 'mismatched': 0}
+
+        # Latency and bandwidth of each sensor
+        self._metrics = SensorMetrics()
+
+        # Recorder of the delivered frames, if recording (see start_recording)
+        self._recorder = None
+
         # Only sensor that doesn't get the data on tick, needs special treatment
         self._opendrive_tag = None
 
 
-    def register_sensor(self, tag, sensor_type, sensor):
+    def register_sensor(self, tag, sensor_type, sensor, history=0, period=1):
+        """
+        Register a sensor. With history, its readings are a window of its latest samples (see SensorHistory).
+        With a period, the sensor only sends a reading every that amount of frames
+        """
         if tag in self._sensors_objects:
             raise SensorConfigurationInvalid("Duplicated sensor tag [{}]".format(tag))
 
         self._sensors_objects[tag] = sensor
 
+        if history:
+            self._histories[tag] = SensorHistory(history)
+
+        if period > 1:
+            self._periods[tag] = period
+
+        if sensor_type.startswith(PSEUDO_SENSORS):
+            self._pseudo_sensors.add(tag)
+
         if sensor_type == 'sensor.opendrive_map': 
             self._opendrive_tag = tag
 
-    def update_sensor(self, tag, data, timestamp):
+    def update_sensor(self, tag, data, timestamp, release=None, sample_time=None):
         # print("Updating {} - {}".format(tag, timestamp))
         if tag not in self._sensors_objects:
             raise SensorConfigurationInvalid("The sensor with tag [{}] has not been created!".format(tag))
 
-        self._new_data_buffers.put((tag, timestamp, data))
-
-    def get_data(self):
-        try: 
-            data_dict = {}
-            while len(data_dict.keys()) < len(self._sensors_objects.keys()):
-
-                # Don't wait for the opendrive sensor
-                if self._opendrive_tag and self._opendrive_tag not in data_dict.keys() \
-                        and len(self._sensors_objects.keys()) == len(data_dict.keys()) + 1:
-                    # print("Ignoring opendrive sensor")
-                    break
-
-                sensor_data = self._new_data_buffers.get(True, self._queue_timeout)
-                # print("Getting {} - {}".format(sensor_data[0],sensor_data[1]))
-                data_dict[sensor_data[0]] = ((sensor_data[1], sensor_data[2]))
-
-        except Empty:
-            raise SensorReceivedNoData("A sensor took too long to send their data")
-
-        return data_dict
+        with self._condition:
+            self._metrics.on_arrival(tag, timestamp, data, time.perf_counter())
+
+            reading = self._readings.get(tag, None)
+            if reading is not None and timestamp < reading[0]:
+                self._frame_counters['late'] += 1
+                self._metrics.on_drop(tag)
+                dropped_release = release
+            else:
+                if tag in self._fresh_tags:
+                    self._frame_counters['superseded'] += 1
+                    self._metrics.on_drop(tag)
+                    dropped_release = self._releases.pop(tag, None)
+                else:
+                    dropped_release = None
+
+                history = self._histories.get(tag, None)
+                if history is not None:
+                    history.append(timestamp, sample_time, data)
+                    data = history.window()
+
+                self._readings[tag] = (timestamp, data)
+                self._fresh_tags.add(tag)
+                if release is not None:
+                    self._releases[tag] = release
+                self._condition.notify_all()
+
+        if dropped_release is not None:
+            dropped_release()
+
+    def release_data(self):
+        """
+        Release the readings returned by the last get_data(), which the agent can't use anymore
+        """
+        with self._condition:
+            held_releases = self._held_releases
+            self._held_releases = []
+
+        if self._recorder is not None and held_releases:
+            self._recorder.release_after_writes(held_releases)
+            return
+
+        for release in held_releases:
+            release()
+
+    def get_frame_counters(self):
+        """
+        Returns the amount of late, superseded and mismatched readings
+        """
+        with self._condition:
+            return dict(self._frame_counters)
+
+    def mark_frame(self, frame):
+        """
+        Called once the server has completed the frame, as reference of the latency of its readings
+        """
+        with self._condition:
+            self._metrics.mark_frame(frame, time.perf_counter())
+
+    def get_metrics(self):
+        """
+        Returns the latency and bandwidth metrics of each sensor (see SensorMetrics.summary)
+        """
+        with self._condition:
+            return self._metrics.summary()
+
+    def reset_metrics(self):
+        with self._condition:
+            self._metrics.reset()
+
+    def start_recording(self, path, gps_route=None, route=None):
+        """
+        Record every delivered frame, and the answers of the agent, into the given directory (see SensorRecorder).
+        The route given to the agent is saved too, for it to be replayed
+        """
+        self.stop_recording()
+        self._recorder = SensorRecorder(path)
+        if route is not None:
+            self._recorder.record_route(gps_route, route)
+
+    def stop_recording(self):
+        """
+        Wait for the pending writes of the recording, if any, and close it
+        """
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+
+    def record_control(self, control, display_additional_info=None):
+        """
+        Record the control given by the agent to the last delivered frame, if recording
+        """
+        if self._recorder is not None:
+            self._recorder.record_control(control, display_additional_info)
+
+    def _is_ready(self, tag, frame):
+        """
+        A sensor is ready with a reading not returned yet, which for the sensors of the world
+        also has to be from the requested frame (or a later one)
+        """
+        if tag not in self._fresh_tags:
+            return False
+        return tag in self._pseudo_sensors or not frame or self._readings[tag][0] >= frame
+
+    def _is_due(self, tag, frame):
+        """
+        Sensors with a period are due until their first reading, and then every period frames
+        """
+        period = self._periods.get(tag, None)
+        if period is None:
+            return True
+        reading = self._readings.get(tag, None)
+        if reading is None:
+            return True
+        return bool(frame) and frame >= reading[0] + period
+
+    def get_data(self, frame=None):
+        """
+        Returns a SensorFrame with the readings of all the sensors for the given frame,
+        by default the current one. The opendrive map is only included when updated,
+        and the sensors with a period not due on this frame return their last reading.
+        """
+        start_time = time.perf_counter()
+        if frame is None:
+            frame = GameTime.get_frame()
+
+        self.release_data()
+
+        # Don't wait for the opendrive sensor, nor for the sensors not due on this frame
+        tags = [tag for tag in self._sensors_objects if tag != self._opendrive_tag]
+
+        with self._condition:
+            while not all(self._is_ready(tag, frame) for tag in tags if self._is_due(tag, frame)):
+                remaining = self._queue_timeout - (time.perf_counter() - start_time)
+                if remaining <= 0:
+                    raise SensorReceivedNoData("A sensor took too long to send their data")
+                self._condition.wait(remaining)
+
+            if self._opendrive_tag in self._fresh_tags:
+                tags.append(self._opendrive_tag)
+
+            delivery_time = time.perf_counter()
+            sensor_frame = SensorFrame(frame)
+            delivered_frames = []
+            for tag in tags:
+                reading = self._readings[tag]
+                sensor_frame[tag] = reading
+
+                # Last reading of a sensor not due on this frame, already returned
+                if tag not in self._fresh_tags:
+                    continue
+
+                # Readings of the sensors with a period can be from any of the frames since they were due
+                if frame and reading[0] != frame and (reading[0] > frame or self._is_due(tag, frame)):
+                    self._frame_counters['mismatched'] += 1
+                self._fresh_tags.discard(tag)
+                self._metrics.on_delivery(tag, reading[0], delivery_time)
+                delivered_frames.append(reading[0])
+
+                if tag in self._periods:
+                    if tag in self._kept_releases:
+                        self._held_releases.append(self._kept_releases.pop(tag))
+                    if tag in self._releases:
+                        self._kept_releases[tag] = self._releases.pop(tag)
+                elif tag in self._releases:
+                    self._held_releases.append(self._releases.pop(tag))
+            self._metrics.prune(min(delivered_frames) if delivered_frames else frame)
+
+        if self._recorder is not None:
+            # The arrays are written later on by the recorder, so the agent can't modify them
+            for tag, (reading_frame, data) in sensor_frame.items():
+                if isinstance(data, np.ndarray) and data.flags.writeable:
+                    data = data.view()
+                    data.flags.writeable = False
+                    sensor_frame[tag] = (reading_frame, data)
+            self._recorder.record_frame(sensor_frame, GameTime.get_time())
+
+        self.last_wait_time = time.perf_counter() - start_time
+        return sensor_frame
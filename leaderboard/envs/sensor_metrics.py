@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Latency and bandwidth of the sensor pipeline, per sensor tag.
+
+The latency of a reading is the wall time from the moment its frame is known
+to the client (the world tick returning it, or the first reading of that frame
+arriving, whatever happens first) to the reading being delivered to the agent
+by get_data(). The queue depth is the amount of readings received since the
+previous delivery, so anything above one means that readings were superseded.
+"""
+
+from __future__ import print_function
+
+from leaderboard.utils.tick_profiler import PhaseHistogram, PERCENTILES
+
+
+class TagMetrics(object):
+
+    """
+    Counters of one sensor
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.bytes = 0
+        self.first_arrival = None
+        self.last_arrival = None
+        self.pending = 0
+        self.peak_pending = 0
+        self.delivered_pending = 0
+        self.latency = PhaseHistogram()
+
+
+class SensorMetrics(object):
+
+    """
+    Metrics of all the sensors. Not thread safe, the SensorInterface calls it under its lock.
+    Times are given by the caller, from time.perf_counter()
+    """
+
+    def __init__(self):
+        self._tags = {}
+        self._frame_starts = {}
+
+    def _tag(self, tag):
+        metrics = self._tags.get(tag, None)
+        if metrics is None:
+            metrics = self._tags[tag] = TagMetrics()
+        return metrics
+
+    def mark_frame(self, frame, now):
+        """
+        The frame has been completed by the server
+        """
+        start = self._frame_starts.get(frame, None)
+        if start is None or now < start:
+            self._frame_starts[frame] = now
+
+    def on_arrival(self, tag, frame, data, now):
+        metrics = self._tag(tag)
+        metrics.received += 1
+        metrics.bytes += getattr(data, 'nbytes', 0)
+        if metrics.first_arrival is None:
+            metrics.first_arrival = now
+        metrics.last_arrival = now
+
+        metrics.pending += 1
+        if metrics.pending > metrics.peak_pending:
+            metrics.peak_pending = metrics.pending
+
+        if frame not in self._frame_starts:
+            self._frame_starts[frame] = now
+
+    def on_drop(self, tag):
+        self._tag(tag).dropped += 1
+
+    def on_delivery(self, tag, frame, now):
+        metrics = self._tag(tag)
+        metrics.delivered += 1
+        metrics.delivered_pending += metrics.pending
+        metrics.pending = 0
+
+        start = self._frame_starts.get(frame, None)
+        if start is not None:
+            metrics.latency.add(max(now - start, 0.0))
+
+    def prune(self, frame):
+        """
+        Forget the frames older than the given one, once delivered
+        """
+        for old_frame in [old_frame for old_frame in self._frame_starts if old_frame < frame]:
+            del self._frame_starts[old_frame]
+
+    def reset(self):
+        self._tags = {}
+        self._frame_starts = {}
+
+    def summary(self):
+        """
+        Returns a dictionary of tag -> received, delivered and dropped readings, frames per second,
+        bandwidth (MB/s), mean and peak queue depth and the delivery latency percentiles (ms)
+        """
+        summary = {}
+        for tag, metrics in self._tags.items():
+            elapsed = (metrics.last_arrival - metrics.first_arrival) if metrics.received > 1 else 0.0
+            tag_summary = {
+                'received': metrics.received,
+                'delivered': metrics.delivered,
+                'dropped': metrics.dropped,
+                'fps': round((metrics.received - 1) / elapsed, 2) if elapsed > 0 else 0.0,
+                'bandwidth': round(metrics.bytes / elapsed / 1e6, 3) if elapsed > 0 else 0.0,
+                'mean_queue_depth': round(metrics.delivered_pending / float(metrics.delivered), 3)
+                                    if metrics.delivered else 0.0,
+                'peak_queue_depth': metrics.peak_pending,
+            }
+            for percentile in PERCENTILES:
+                tag_summary['latency_p{}'.format(percentile)] = round(1000 * metrics.latency.percentile(percentile), 3)
+            tag_summary['latency_max'] = round(1000 * metrics.latency.max, 3)
+            summary[tag] = tag_summary
+
+        return summary
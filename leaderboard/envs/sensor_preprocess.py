@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Preprocessing of the sensor data, declared by the agents in their sensors()
+specifications under the 'preprocess' key, and applied when the data is
+received, before it is handed to the SensorInterface. For example:
+
+    {'type': 'sensor.camera.rgb', ..., 'preprocess': {'crop': [0, 200, 800, 400], 'size': [400, 200],
+                                                      'channels': 'rgb'}}
+    {'type': 'sensor.lidar.ray_cast', ..., 'preprocess': {'range': 50.0, 'voxel_size': 0.25}}
+
+Cameras:
+- crop: region of interest, as [x, y, width, height] in pixels. Applied first
+- size: resolution [width, height] the image is resized to
+- channels: 'bgra' (as sent by the server, default), 'bgr' or 'rgb'. 'bgr' is a strided view
+  of the image, while 'rgb' is copied into a contiguous array, as the reversed view has
+  negative strides that many cv2 functions reject
+
+LiDAR:
+- range: points further than this distance from the sensor, in meters, are removed
+- voxel_size: only the first point of each voxel of this size, in meters, is kept
+"""
+
+from __future__ import print_function
+
+import cv2
+import numpy as np
+
+from leaderboard.envs.sensor_interface import SensorConfigurationInvalid
+
+CAMERA_OPTIONS = ('crop', 'size', 'channels')
+LIDAR_OPTIONS = ('range', 'voxel_size')
+
+CHANNEL_VIEWS = {
+    'bgra': lambda image: image,
+    'bgr': lambda image: image[:, :, :3],
+    'rgb': lambda image: np.ascontiguousarray(image[:, :, 2::-1]),
+}
+
+
+def crop_image(image, x, y, width, height):
+    return image[y:y + height, x:x + width]
+
+
+def resize_image(image, width, height):
+    # Area interpolation avoids the aliasing of the other methods when downscaling
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def crop_range(points, max_range):
+    """
+    Points of the cloud within the given distance of the sensor
+    """
+    xyz = points[:, :3]
+    return points[np.einsum('ij,ij->i', xyz, xyz) <= max_range * max_range]
+
+
+def voxel_downsample(points, voxel_size):
+    """
+    First point of each occupied voxel, ordered by voxel
+    """
+    if len(points) == 0:
+        return points
+
+    voxels = np.floor(points[:, :3] / voxel_size).astype(np.int64)
+    voxels -= voxels.min(axis=0)
+    extent = voxels.max(axis=0) + 1
+    keys = (voxels[:, 0] * extent[1] + voxels[:, 1]) * extent[2] + voxels[:, 2]
+    _, first = np.unique(keys, return_index=True)
+    return points[first]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_int_list(value, length):
+    return isinstance(value, (list, tuple)) and len(value) == length \
+        and all(isinstance(item, int) and not isinstance(item, bool) for item in value)
+
+
+def validate_preprocess(sensor_spec):
+    """
+    Check the preprocessing of a sensor, raising SensorConfigurationInvalid if it isn't valid
+    """
+    preprocess = sensor_spec.get('preprocess', None)
+    if not preprocess:
+        return
+    if not isinstance(preprocess, dict):
+        raise SensorConfigurationInvalid("Invalid preprocessing of sensor [{}]".format(sensor_spec['id']))
+
+    if sensor_spec['type'].startswith('sensor.camera'):
+        options = CAMERA_OPTIONS
+    elif sensor_spec['type'].startswith('sensor.lidar'):
+        options = LIDAR_OPTIONS
+    else:
+        raise SensorConfigurationInvalid("Sensor [{}] can't be preprocessed".format(sensor_spec['id']))
+
+    unknown = [option for option in preprocess if option not in options]
+    if unknown:
+        raise SensorConfigurationInvalid("Unknown preprocessing {} of sensor [{}]".format(unknown, sensor_spec['id']))
+
+    if 'crop' in preprocess:
+        if not _is_int_list(preprocess['crop'], 4):
+            raise SensorConfigurationInvalid("Crop of sensor [{}] isn't [x, y, width, height]".format(
+                sensor_spec['id']))
+        x, y, width, height = preprocess['crop']
+        if x < 0 or y < 0 or width <= 0 or height <= 0 \
+                or x + width > sensor_spec['width'] or y + height > sensor_spec['height']:
+            raise SensorConfigurationInvalid("Crop of sensor [{}] outside of the image".format(sensor_spec['id']))
+    if 'size' in preprocess and (not _is_int_list(preprocess['size'], 2) or min(preprocess['size']) <= 0):
+        raise SensorConfigurationInvalid("Invalid size of sensor [{}]".format(sensor_spec['id']))
+    if 'channels' in preprocess and (not isinstance(preprocess['channels'], str)
+                                     or preprocess['channels'] not in CHANNEL_VIEWS):
+        raise SensorConfigurationInvalid("Invalid channels of sensor [{}]".format(sensor_spec['id']))
+    for option in LIDAR_OPTIONS:
+        if option in preprocess and (not _is_number(preprocess[option]) or preprocess[option] <= 0):
+            raise SensorConfigurationInvalid("Invalid {} of sensor [{}]".format(option, sensor_spec['id']))
+
+
+def preprocess_transforms(sensor_spec):
+    """
+    Transforms applying the preprocessing of a sensor, in order
+    """
+    preprocess = sensor_spec.get('preprocess', None)
+    if not preprocess:
+        return []
+
+    transforms = []
+    if sensor_spec['type'].startswith('sensor.camera'):
+        if 'crop' in preprocess:
+            transforms.append(lambda image, crop=preprocess['crop']: crop_image(image, *crop))
+        if 'size' in preprocess:
+            transforms.append(lambda image, size=preprocess['size']: resize_image(image, *size))
+        if preprocess.get('channels', 'bgra') != 'bgra':
+            transforms.append(CHANNEL_VIEWS[preprocess['channels']])
+
+    elif sensor_spec['type'].startswith('sensor.lidar'):
+        if 'range' in preprocess:
+            transforms.append(lambda points, max_range=preprocess['range']: crop_range(points, max_range))
+        if 'voxel_size' in preprocess:
+            transforms.append(lambda points, size=preprocess['voxel_size']: voxel_downsample(points, size))
+
+    return transforms
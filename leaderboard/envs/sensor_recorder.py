@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Recording of what the agent received and answered, for offline replay.
+
+Every frame delivered by the SensorInterface is written to a directory with
+the following layout:
+
+    meta.json               recording parameters and the description of each sensor
+    frames.npy              index of the delivered frames (frame, game time), by delivery position
+    controls.jsonl          controls of the agent and display info, one line per frame
+    route.json              route given to the agent, in GPS and world coordinates, if any
+    <tag>/chunk_<n>.npy     arrays of a sensor, CHUNK_FRAMES readings per file, with a fixed stride
+    <tag>/index.npy         position, frame, rows, chunk and slot of each reading of the sensor
+    <tag>/values.jsonl      readings that aren't arrays (speedometer, opendrive map, history windows), one per line
+
+The chunks are .npy files, so they can be memory mapped with np.load(mmap_mode='r')
+(see SensorRecording). Point clouds are stored padded to the capacity of their
+chunk, with their amount of rows in the index. A reading delivered again, with
+the same frame (sensors with a period), isn't stored again: its index entry
+points at the row already written, and its values line at the previous position.
+
+Writing, including the copy of the arrays, is done by a background thread. The
+arrays are queued as they are, so they must not change until written: the
+SensorInterface delivers them read-only while recording, and hands the release
+of the ones stored in ring buffers to the recorder (see release_after_writes).
+Only the history windows, views of a buffer overwritten by the next samples,
+are copied when queued. They are a few hundred bytes.
+"""
+
+from __future__ import print_function
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from queue import Queue, Full
+
+import numpy as np
+
+# Readings per chunk file
+CHUNK_FRAMES = 256
+
+# Frames waiting to be written before the recording slows the evaluation down
+MAX_QUEUED_FRAMES = 32
+
+# Extra room given to the point clouds, whose amount of rows changes every frame
+ROWS_MARGIN = 1.5
+
+INDEX_DTYPE = np.dtype([('position', np.int64), ('frame', np.int64), ('rows', np.int64),
+                        ('chunk', np.int32), ('slot', np.int32)])
+FRAMES_DTYPE = np.dtype([('frame', np.int64), ('timestamp', np.float64)])
+
+CONTROL_FIELDS = ('throttle', 'steer', 'brake', 'hand_brake', 'reverse', 'manual_gear_shift', 'gear')
+
+
+def _to_json(value):
+    """
+    Fallback of the json encoder for the numpy values
+    """
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError("{} is not JSON serializable".format(type(value)))
+
+
+class _ArrayWriter(object):
+
+    """
+    Writes the arrays of one sensor into fixed stride chunks
+    """
+
+    def __init__(self, path, chunk_frames):
+        self._path = path
+        self._chunk_frames = chunk_frames
+        self._chunk = None
+        self._chunk_index = -1
+        self._slot = 0
+        self._index = []
+        self.dtype = None
+        self.shape = None
+
+    def _open_chunk(self, array):
+        if self._chunk is not None:
+            self._chunk.flush()
+
+        # Point clouds (N, columns) get room for more rows. The rest keep their shape
+        if array.ndim == 2:
+            stride = (int(math.ceil(array.shape[0] * ROWS_MARGIN)),) + array.shape[1:]
+        else:
+            stride = array.shape
+
+        self._chunk_index += 1
+        self._slot = 0
+        self._chunk = np.lib.format.open_memmap(
+            os.path.join(self._path, 'chunk_{:05d}.npy'.format(self._chunk_index)),
+            mode='w+', dtype=array.dtype, shape=(self._chunk_frames,) + stride)
+        self.dtype = array.dtype
+        self.shape = stride
+
+    def _fits(self, array):
+        if self._chunk is None or self._slot >= self._chunk_frames or array.dtype != self.dtype:
+            return False
+        if array.ndim == 2:
+            return array.shape[1:] == self.shape[1:] and array.shape[0] <= self.shape[0]
+        return array.shape == self.shape
+
+    def write(self, position, frame, array):
+        if not self._fits(array):
+            self._open_chunk(array)
+
+        if array.ndim == 2:
+            self._chunk[self._slot, :array.shape[0]] = array
+            rows = array.shape[0]
+        else:
+            self._chunk[self._slot] = array
+            rows = -1
+
+        self._index.append((position, frame, rows, self._chunk_index, self._slot))
+        self._slot += 1
+
+    def repeat(self, position):
+        """
+        Index the last written reading again, at the given position
+        """
+        self._index.append((position,) + tuple(self._index[-1][1:]))
+
+    def close(self):
+        if self._chunk is not None:
+            self._chunk.flush()
+            self._chunk = None
+        np.save(os.path.join(self._path, 'index.npy'), np.array(self._index, dtype=INDEX_DTYPE))
+
+
+class SensorRecorder(object):
+
+    """
+    Asynchronous recorder of the sensor frames delivered to the agent, and of its answers.
+
+    To use it:
+    1. Create it with the directory of the recording
+    2. Call record_frame() with each delivered SensorFrame, and record_control() with the answer of the agent
+    3. Call close() to wait for the pending writes and write the indices
+    """
+
+    def __init__(self, path, chunk_frames=CHUNK_FRAMES, max_queued_frames=MAX_QUEUED_FRAMES):
+        self._path = path
+        self._chunk_frames = chunk_frames
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self._array_writers = {}
+        self._value_files = {}
+        self._value_arrays = {}
+        self._value_positions = {}
+        self._queued_frames = {}
+        self._frames = []
+        self._position = -1
+        self._controls_file = open(os.path.join(path, 'controls.jsonl'), 'w')
+
+        # Time spent by the evaluation waiting for the writer, when the queue is full
+        self.stall_time = 0.0
+
+        self._queue = Queue(maxsize=max_queued_frames)
+        self._thread = threading.Thread(target=self._run, name='sensor_recorder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except Full:
+            start_time = time.perf_counter()
+            self._queue.put(item)
+            self.stall_time += time.perf_counter() - start_time
+
+    def record_route(self, gps_route, route):
+        """
+        Save the route given to the agent: a list of (gps, option) and a list of (carla.Transform, option)
+        """
+        world_route = [((transform.location.x, transform.location.y, transform.location.z,
+                         transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll), option.value)
+                       for transform, option in route]
+        gps_route = [(gps, option.value) for gps, option in gps_route]
+        with open(os.path.join(self._path, 'route.json'), 'w') as fd:
+            json.dump({'gps': gps_route, 'world': world_route}, fd, default=_to_json)
+
+    def record_frame(self, sensor_frame, timestamp):
+        """
+        Queue the readings of a SensorFrame (tag -> (frame, data)) delivered at the given game time.
+        The arrays are written later on, and must not change until then (see the module docstring)
+        """
+        readings = []
+        for tag, (frame, data) in sensor_frame.items():
+            if self._queued_frames.get(tag, None) == frame:
+                # Same reading as the last one queued, only indexed again
+                data = None
+            elif isinstance(data, dict):
+                data = {key: np.array(value) if isinstance(value, np.ndarray) else value
+                        for key, value in data.items()}
+            self._queued_frames[tag] = frame
+            readings.append((tag, frame, data))
+
+        self._position += 1
+        self._put(('frame', self._position, (sensor_frame.frame, timestamp, readings)))
+
+    def record_control(self, control, display_additional_info=None):
+        """
+        Queue the control given by the agent to the last recorded frame, with its display info
+        """
+        if self._position < 0:
+            return
+        values = {field: getattr(control, field) for field in CONTROL_FIELDS}
+        self._put(('control', self._position, (values, display_additional_info)))
+
+    def release_after_writes(self, releases):
+        """
+        Call the release functions of ring buffer readings once the frames already queued are written
+        """
+        self._put(('release', self._position, releases))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(*item)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception('Error recording the sensor data')
+
+    def _tag_path(self, tag):
+        tag_path = os.path.join(self._path, tag)
+        if not os.path.exists(tag_path):
+            os.makedirs(tag_path)
+        return tag_path
+
+    def _write(self, kind, position, payload):
+        if kind == 'control':
+            control, display_additional_info = payload
+            line = {'position': position, 'frame': self._frames[position][0], 'control': control,
+                    'display': display_additional_info}
+            self._controls_file.write(json.dumps(line, default=_to_json) + '\n')
+            return
+
+        if kind == 'release':
+            for release in payload:
+                release()
+            return
+
+        frame, timestamp, readings = payload
+        self._frames.append((frame, timestamp))
+        for tag, reading_frame, data in readings:
+            if data is None:
+                self._write_repeat(tag, position, reading_frame)
+            elif isinstance(data, np.ndarray):
+                writer = self._array_writers.get(tag, None)
+                if writer is None:
+                    writer = self._array_writers[tag] = _ArrayWriter(self._tag_path(tag), self._chunk_frames)
+                writer.write(position, reading_frame, data)
+            else:
+                values_file = self._value_files.get(tag, None)
+                if values_file is None:
+                    values_file = open(os.path.join(self._tag_path(tag), 'values.jsonl'), 'w')
+                    self._value_files[tag] = values_file
+                if isinstance(data, dict):
+                    arrays = self._value_arrays.setdefault(tag, {})
+                    for key, value in data.items():
+                        if isinstance(value, np.ndarray):
+                            arrays[key] = value.dtype.str
+                line = {'position': position, 'frame': reading_frame, 'data': data}
+                values_file.write(json.dumps(line, default=_to_json) + '\n')
+                self._value_positions[tag] = position
+
+    def _write_repeat(self, tag, position, reading_frame):
+        if tag in self._array_writers:
+            self._array_writers[tag].repeat(position)
+        else:
+            line = {'position': position, 'frame': reading_frame, 'repeat': self._value_positions[tag]}
+            self._value_files[tag].write(json.dumps(line) + '\n')
+
+    def close(self):
+        """
+        Wait for the pending writes, and write the indices and the description of the recording
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+        sensors = {}
+        for tag, writer in self._array_writers.items():
+            writer.close()
+            sensors[tag] = {'kind': 'array', 'dtype': writer.dtype.str, 'ndim': len(writer.shape)}
+        for tag, values_file in self._value_files.items():
+            values_file.close()
+            sensors[tag] = {'kind': 'values'}
+            # Entries of the dictionary readings that were arrays (e.g. history windows), with their dtype
+            if tag in self._value_arrays:
+                sensors[tag]['arrays'] = self._value_arrays[tag]
+        self._controls_file.close()
+
+        np.save(os.path.join(self._path, 'frames.npy'), np.array(self._frames, dtype=FRAMES_DTYPE))
+        with open(os.path.join(self._path, 'meta.json'), 'w') as fd:
+            json.dump({'chunk_frames': self._chunk_frames, 'sensors': sensors,
+                       'stall_time': self.stall_time}, fd, indent=2)
+
+
+class SensorRecording(object):
+
+    """
+    Read access to a recording made by the SensorRecorder. The arrays are memory mapped
+    """
+
+    def __init__(self, path):
+        self._path = path
+        with open(os.path.join(path, 'meta.json')) as fd:
+            self.meta = json.load(fd)
+
+        self.frames = np.load(os.path.join(path, 'frames.npy'))
+
+        self._indices = {}
+        self._chunks = {}
+        self._values = {}
+        for tag, sensor in self.meta['sensors'].items():
+            if sensor['kind'] == 'array':
+                self._indices[tag] = np.load(os.path.join(path, tag, 'index.npy'))
+                self._chunks[tag] = {}
+            else:
+                self._values[tag] = self._load_lines(os.path.join(path, tag, 'values.jsonl'))
+
+        self.controls = self._load_lines(os.path.join(path, 'controls.jsonl'))
+
+        self.route = None
+        if os.path.exists(os.path.join(path, 'route.json')):
+            with open(os.path.join(path, 'route.json')) as fd:
+                self.route = json.load(fd)
+
+    @staticmethod
+    def _load_lines(path):
+        """
+        Lines of a .jsonl file of the recording, by delivery position. The repeated readings
+        get the data of the position they point at
+        """
+        lines = {}
+        with open(path) as fd:
+            for line in fd:
+                values = json.loads(line)
+                if 'repeat' in values:
+                    values['data'] = lines[values.pop('repeat')]['data']
+                lines[values['position']] = values
+        return lines
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def tags(self):
+        return list(self.meta['sensors'])
+
+    def _chunk(self, tag, chunk):
+        chunks = self._chunks[tag]
+        if chunk not in chunks:
+            chunks[chunk] = np.load(os.path.join(self._path, tag, 'chunk_{:05d}.npy'.format(chunk)), mmap_mode='r')
+        return chunks[chunk]
+
+    def get_frame(self, position):
+        """
+        Returns the frame id, the game time and the readings (tag -> (frame, data)) delivered
+        at the given position. The arrays are read-only views of the recording
+        """
+        frame, timestamp = self.frames[position]
+
+        readings = {}
+        for tag, index in self._indices.items():
+            row = np.searchsorted(index['position'], position)
+            if row >= len(index) or index['position'][row] != position:
+                continue
+            entry = index[row]
+            data = self._chunk(tag, int(entry['chunk']))[int(entry['slot'])]
+            if entry['rows'] >= 0:
+                data = data[:int(entry['rows'])]
+            readings[tag] = (int(entry['frame']), data)
+
+        for tag, values in self._values.items():
+            if position in values:
+                readings[tag] = (values[position]['frame'], self._value_data(tag, values[position]['data']))
+
+        return int(frame), float(timestamp), readings
+
+    def _value_data(self, tag, data):
+        """
+        Restore the entries of a dictionary reading that were arrays, as read-only arrays
+        """
+        arrays = self.meta['sensors'][tag].get('arrays', None)
+        if not arrays or not isinstance(data, dict):
+            return data
+
+        data = dict(data)
+        for key, dtype in arrays.items():
+            if key in data:
+                array = np.array(data[key], dtype=dtype)
+                array.flags.writeable = False
+                data[key] = array
+        return data
+
+    def get_control(self, position):
+        """
+        Returns the recorded control of the given position, and its display info, or None
+        """
+        line = self.controls.get(position, None)
+        if line is None:
+            return None
+        return line['control'], line['display']
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Offline replay of a sensor recording (see SensorRecorder), without CARLA.
+
+The ReplaySensorInterface replaces the SensorInterface of an agent, and
+returns the recorded frames in order, as fast as the agent asks for them.
+The game time is driven by the recorded timestamps, so the agent sees the
+same GameTime values as during the evaluation.
+"""
+
+from __future__ import print_function
+
+import time
+
+import carla
+from agents.navigation.local_planner import RoadOption
+from srunner.scenariomanager.timer import GameTime
+
+from leaderboard.envs.sensor_interface import SensorFrame, SensorInterface
+from leaderboard.utils.tick_profiler import PhaseHistogram, PERCENTILES
+
+# Controls compared against the recorded ones
+COMPARED_CONTROLS = ('throttle', 'steer', 'brake')
+
+
+class ReplayFinished(Exception):
+    """
+    Exception thrown when the agent asks for a frame after the end of the recording
+    """
+
+    def __init__(self, message):
+        super(ReplayFinished, self).__init__(message)
+
+
+class ReplayTimestamp(object):
+
+    """
+    Stand-in of the carla.Timestamp of a recorded frame, to update the GameTime
+    """
+
+    def __init__(self, frame, elapsed_seconds, delta_seconds):
+        self.frame = frame
+        self.elapsed_seconds = elapsed_seconds
+        self.delta_seconds = delta_seconds
+        self.platform_timestamp = time.time()
+
+
+class ReplaySensorInterface(SensorInterface):
+
+    """
+    Drop-in replacement of the SensorInterface, returning the frames of a SensorRecording
+    """
+
+    def __init__(self, recording):
+        super(ReplaySensorInterface, self).__init__()
+        self._recording = recording
+        self._position = 0
+        self._last_frame = None
+        self._last_time = 0.0
+
+    @property
+    def position(self):
+        """
+        Position of the next frame to be returned
+        """
+        return self._position
+
+    def finished(self):
+        return self._position >= len(self._recording)
+
+    def _update_game_time(self, frame, timestamp):
+        """
+        Advance the GameTime the same way the recorded ticks did
+        """
+        frames = frame - self._last_frame if self._last_frame is not None else 1
+        frames = max(frames, 1)
+        GameTime.on_carla_tick(ReplayTimestamp(frame, timestamp, (timestamp - self._last_time) / frames))
+        self._last_frame = frame
+        self._last_time = timestamp
+
+    def get_data(self, frame=None):
+        """
+        Returns the next recorded frame, whatever the requested one
+        """
+        start_time = time.perf_counter()
+        if self.finished():
+            raise ReplayFinished("The recording has no more frames")
+
+        frame, timestamp, readings = self._recording.get_frame(self._position)
+        self._update_game_time(frame, timestamp)
+        self._position += 1
+
+        self.last_wait_time = time.perf_counter() - start_time
+        return SensorFrame(frame, readings)
+
+
+def decode_recorded_route(route):
+    """
+    Returns the GPS and world routes saved by SensorRecorder.record_route, as given to set_global_plan()
+    """
+    gps_route = [(gps, RoadOption(option)) for gps, option in route['gps']]
+    world_route = [(carla.Transform(carla.Location(x, y, z), carla.Rotation(pitch=pitch, yaw=yaw, roll=roll)),
+                    RoadOption(option))
+                   for (x, y, z, pitch, yaw, roll), option in route['world']]
+    return gps_route, world_route
+
+
+def replay_agent(agent, recording, max_frames=None):
+    """
+    Run the agent over the recorded frames, as fast as it can go. Returns a dictionary with the
+    amount of frames, the throughput (frames per second), the latency percentiles of the agent (ms),
+    excluding the reading of the recording, and the difference between the produced and the recorded controls
+    """
+    if recording.route is not None:
+        agent.set_global_plan(*decode_recorded_route(recording.route))
+
+    sensor_interface = ReplaySensorInterface(recording)
+    agent.sensor_interface = sensor_interface
+    GameTime.restart()
+
+    latency = PhaseHistogram()
+    differences = {field: [] for field in COMPARED_CONTROLS}
+    total_frames = len(recording) if max_frames is None else min(max_frames, len(recording))
+
+    start_time = time.perf_counter()
+    while sensor_interface.position < total_frames:
+        position = sensor_interface.position
+        recorded = recording.get_control(position)
+        display_additional_info = recorded[1] if recorded is not None else None
+
+        call_start = time.perf_counter()
+        control = agent.agent_call(display_additional_info)
+        latency.add(max(time.perf_counter() - call_start - sensor_interface.last_wait_time, 0.0))
+
+        if recorded is not None:
+            for field in COMPARED_CONTROLS:
+                differences[field].append(abs(getattr(control, field) - recorded[0][field]))
+
+    elapsed = time.perf_counter() - start_time
+
+    results = {
+        'frames': total_frames,
+        'throughput': round(total_frames / elapsed, 2) if elapsed > 0 else 0.0,
+        'latency_mean': round(1000 * latency.total / latency.count, 3) if latency.count else 0.0,
+    }
+    for percentile in PERCENTILES:
+        results['latency_p{}'.format(percentile)] = round(1000 * latency.percentile(percentile), 3)
+    results['latency_max'] = round(1000 * latency.max, 3)
+
+    for field, field_differences in differences.items():
+        results['{}_mean_diff'.format(field)] = \
+            round(sum(field_differences) / len(field_differences), 6) if field_differences else 0.0
+        results['{}_max_diff'.format(field)] = round(max(field_differences), 6) if field_differences else 0.0
+
+    return results
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Preallocated storage for the raw data of the sensors.
+
+Cameras, LiDARs and radars can opt in with the 'zero_copy' key of the sensor
+specification, e.g. {'type': 'sensor.camera.rgb', ..., 'zero_copy': True}.
+Without it, every reading is a new array owned by the agent.
+
+Opted in sensors get a ring of arrays sized from their specification. The raw
+data received from the server is copied once, straight into a free slot, and
+the agent gets a read-only view of it. A slot is only reused once released,
+which the SensorInterface does when the reading is superseded or, once returned
+to the agent, at the next get_data() (or release_data()). Agents that modify
+the readings in place, or keep them for longer than a frame, have to copy them.
+"""
+
+from __future__ import print_function
+
+import math
+from threading import Lock
+
+import numpy as np
+
+# Sensors whose readings can be stored in ring buffers
+RING_SENSORS = ('sensor.camera', 'sensor.lidar', 'sensor.other.radar')
+
+# Reading held by the agent, buffered one and the one being written
+DEFAULT_SLOTS = 3
+
+# Extra room given to the sensors whose amount of points changes every frame
+POINTS_MARGIN = 1.5
+
+
+def points_per_frame(points_per_second, frame_rate):
+    """
+    Amount of rows to preallocate for a point cloud sensor
+    """
+    return int(math.ceil(points_per_second / float(frame_rate) * POINTS_MARGIN))
+
+
+class RingBuffer(object):
+
+    """
+    Ring of preallocated arrays for the readings of one sensor.
+
+    - shape: shape of a reading. For point clouds, the first dimension is the
+      maximum amount of points, and grows if a larger reading is received
+    - slots: initial amount of arrays. More are allocated if they are all in use
+    """
+
+    def __init__(self, shape, dtype, slots=DEFAULT_SLOTS):
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._row_size = int(np.prod(self._shape[1:]))
+        self._slots = [np.empty(self._shape, dtype=self._dtype) for _ in range(slots)]
+        self._in_use = [False] * slots
+        self._lock = Lock()
+
+    @property
+    def nbytes(self):
+        return sum(slot.nbytes for slot in self._slots)
+
+    def _acquire(self, rows):
+        """
+        Mark the next free slot, with room for the given amount of rows, as in use
+        """
+        with self._lock:
+            # The first free slot is the most recently released one in steady state, still warm in cache
+            for index, in_use in enumerate(self._in_use):
+                if not in_use:
+                    break
+            else:
+                index = len(self._slots)
+                self._slots.append(np.empty(self._shape, dtype=self._dtype))
+                self._in_use.append(False)
+
+            if rows > self._slots[index].shape[0]:
+                self._shape = (int(math.ceil(rows * POINTS_MARGIN)),) + self._shape[1:]
+                self._slots[index] = np.empty(self._shape, dtype=self._dtype)
+
+            self._in_use[index] = True
+
+        return index
+
+    def write(self, raw_data):
+        """
+        Copy the raw data into a free slot. Returns the slot index, to be released,
+        and a read-only view of the reading
+        """
+        source = np.frombuffer(raw_data, dtype=self._dtype)
+        rows = source.size // self._row_size
+        index = self._acquire(rows)
+
+        reading = self._slots[index][:rows]
+        np.copyto(reading, source.reshape((rows,) + self._shape[1:]))
+
+        view = reading.view()
+        view.flags.writeable = False
+        return index, view
+
+    def write_parts(self, parts):
+        """
+        Copy the arrays one after the other into a free slot. Returns the slot index, to be released,
+        and a read-only view of the reading
+        """
+        rows = sum(len(part) for part in parts)
+        index = self._acquire(rows)
+
+        reading = self._slots[index][:rows]
+        start = 0
+        for part in parts:
+            np.copyto(reading[start:start + len(part)], part)
+            start += len(part)
+
+        view = reading.view()
+        view.flags.writeable = False
+        return index, view
+
+    def release(self, index):
+        with self._lock:
+            self._in_use[index] = False
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Transport of the sensor frames to an agent running in another process.
+
+The arrays of a SensorFrame are written into one shared memory segment per
+sensor, and only a small description of the frame (segment names, shapes
+and dtypes) goes through the control channel. The other process builds numpy
+views over the segments, so no image is pickled. The readings that aren't
+arrays (e.g. the speedometer) are sent inline.
+
+A segment is only rewritten once the other process has answered the previous
+frame, so the views stay valid until then.
+
+Needs Python 3.8 or newer (multiprocessing.shared_memory), so a CARLA
+PythonAPI built for it, as the CARLA 0.9.10 release egg is for Python 3.7.
+"""
+
+from __future__ import print_function
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    raise ImportError("The shared memory transport needs Python 3.8 or newer (multiprocessing.shared_memory)")
+
+import numpy as np
+
+# Extra room given to the segments, for the sensors whose size changes every frame
+SEGMENT_MARGIN = 1.5
+
+
+class SharedFrameWriter(object):
+
+    """
+    Writes the arrays of the sensor frames into shared memory segments, one per sensor tag
+    """
+
+    def __init__(self):
+        self._segments = {}
+
+    def _segment(self, tag, nbytes):
+        """
+        Returns the segment of the sensor, replacing it if the reading doesn't fit
+        """
+        segment = self._segments.get(tag, None)
+        if segment is not None and segment.size >= nbytes:
+            return segment
+
+        if segment is not None:
+            segment.close()
+            segment.unlink()
+
+        segment = shared_memory.SharedMemory(create=True, size=max(int(nbytes * SEGMENT_MARGIN), 1))
+        self._segments[tag] = segment
+        return segment
+
+    def write(self, sensor_frame):
+        """
+        Copy the arrays of the frame (tag -> (frame, data)) into the segments.
+        Returns the description of the readings, to be sent to the SharedFrameReader
+        """
+        readings = []
+        for tag, (frame, data) in sensor_frame.items():
+            if isinstance(data, np.ndarray):
+                segment = self._segment(tag, data.nbytes)
+                target = np.ndarray(data.shape, dtype=data.dtype, buffer=segment.buf)
+                np.copyto(target, data)
+                readings.append((tag, frame, (segment.name, data.shape, data.dtype.str), None))
+            else:
+                readings.append((tag, frame, None, data))
+
+        return readings
+
+    def close(self):
+        for segment in self._segments.values():
+            segment.close()
+            segment.unlink()
+        self._segments = {}
+
+
+class SharedFrameReader(object):
+
+    """
+    Builds the sensor frames of the other process as read-only views of the shared memory segments
+    """
+
+    def __init__(self):
+        self._segments = {}
+        self._replaced_segments = []
+
+    def _segment(self, tag, name):
+        segment = self._segments.get(tag, None)
+        if segment is not None and segment.name == name:
+            return segment
+
+        # Replaced segments are closed once the agent drops its views of them
+        if segment is not None:
+            self._replaced_segments.append(segment)
+        self._close_replaced()
+
+        segment = shared_memory.SharedMemory(name=name)
+        self._segments[tag] = segment
+        return segment
+
+    def _close_replaced(self):
+        still_used = []
+        for segment in self._replaced_segments:
+            try:
+                segment.close()
+            except BufferError:
+                still_used.append(segment)
+        self._replaced_segments = still_used
+
+    def read(self, readings):
+        """
+        Returns a dictionary of tag -> (frame, data) from the description made by the SharedFrameWriter
+        """
+        input_data = {}
+        for tag, frame, segment_info, data in readings:
+            if segment_info is not None:
+                name, shape, dtype = segment_info
+                data = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self._segment(tag, name).buf)
+                data.flags.writeable = False
+            input_data[tag] = (frame, data)
+
+        return input_data
+
+    def close(self):
+        self._replaced_segments.extend(self._segments.values())
+        self._segments = {}
+        self._close_replaced()
@@ -32,7 +32,10 @@ from leaderboard.scenarios.scenario_manager import ScenarioManager
 from leaderboard.scenarios.route_scenario import RouteScenario
 from leaderboard.envs.sensor_interface import SensorConfigurationInvalid
 from leaderboard.autoagents.agent_wrapper import  AgentWrapper, AgentError
+from leaderboard.utils.actor_registry import ActorRegistry
+from leaderboard.utils.opendrive_cache import OpenDriveCache
 from leaderboard.utils.statistics_manager import StatisticsManager
+from leaderboard.utils.time_to_collision import TTCBrakePolicy, DEFAULT_BRAKE_TTC, DEFAULT_HORIZON
 from leaderboard.utils.route_indexer import RouteIndexer
 
 
@@ -68,6 +71,7 @@ class LeaderboardEvaluator(object):
         self.statistics_manager = statistics_manager
         self.sensors = None
         self.sensor_icons = []
+        self._headless = args.headless == 'on'
         self._vehicle_lights = carla.VehicleLightState.Position | carla.VehicleLightState.LowBeam
 
         # First of all, we need to create the client that will send the requests
@@ -80,6 +84,9 @@ class LeaderboardEvaluator(object):
 
         self.traffic_manager = self.client.get_trafficmanager(int(args.trafficManagerPort))
 
+        # Keep the actor registry up to date with the actors spawned and destroyed by the scenarios
+        ActorRegistry.track_data_provider(CarlaDataProvider)
+
         dist = pkg_resources.get_distribution("carla")
         if dist.version != 'leaderboard':
             if LooseVersion(dist.version) < LooseVersion('0.9.10'):
@@ -91,7 +98,11 @@ class LeaderboardEvaluator(object):
         self.module_agent = importlib.import_module(module_name)
 
         # Create the ScenarioManager
-        self.manager = ScenarioManager(args.timeout, args.debug > 1)
+        brake_policy = TTCBrakePolicy(args.brake_ttc) if args.brake_policy == 'ttc' else None
+        self.manager = ScenarioManager(args.timeout, args.debug > 1,
+                                       overlay_rate=args.debug_overlay_rate, frame_delta=1.0 / self.frame_rate,
+                                       brake_policy=brake_policy, ttc_horizon=args.ttc_horizon,
+                                       pipelined=args.tick_mode == 'pipelined', decode_workers=args.decode_workers)
 
         # Time control for summary purposes
         self._start_time = GameTime.get_time()
@@ -133,6 +144,7 @@ class LeaderboardEvaluator(object):
             settings = self.world.get_settings()
             settings.synchronous_mode = False
             settings.fixed_delta_seconds = None
+            settings.no_rendering_mode = False
             self.world.apply_settings(settings)
             self.traffic_manager.set_synchronous_mode(False)
 
@@ -140,6 +152,7 @@ class LeaderboardEvaluator(object):
             self.manager.cleanup()
 
         CarlaDataProvider.cleanup()
+        ActorRegistry.cleanup()
 
         for i, _ in enumerate(self.ego_vehicles):
             if self.ego_vehicles[i]:
@@ -151,6 +164,7 @@ class LeaderboardEvaluator(object):
             self._agent_watchdog.stop()
 
         if hasattr(self, 'agent_instance') and self.agent_instance:
+            self.agent_instance.sensor_interface.stop_recording()
             self.agent_instance.destroy()
             self.agent_instance = None
 
@@ -175,9 +189,10 @@ class LeaderboardEvaluator(object):
             while ego_vehicle_missing:
                 self.ego_vehicles = []
                 ego_vehicle_missing = False
+                ActorRegistry.reconcile(CarlaDataProvider.get_world())
                 for ego_vehicle in ego_vehicles:
                     ego_vehicle_found = False
-                    carla_vehicles = CarlaDataProvider.get_world().get_actors().filter('vehicle.*')
+                    carla_vehicles = ActorRegistry.get_vehicles()
                     for carla_vehicle in carla_vehicles:
                         if carla_vehicle.attributes['role_name'] == ego_vehicle.rolename:
                             ego_vehicle_found = True
@@ -202,6 +217,7 @@ class LeaderboardEvaluator(object):
         settings = self.world.get_settings()
         settings.fixed_delta_seconds = 1.0 / self.frame_rate
         settings.synchronous_mode = True
+        settings.no_rendering_mode = self._headless
         self.world.apply_settings(settings)
 
         self.world.reset_all_traffic_lights()
@@ -223,6 +239,8 @@ class LeaderboardEvaluator(object):
             raise Exception("The CARLA server uses the wrong map!"
                             "This scenario requires to use map {}".format(town))
 
+        OpenDriveCache.load(CarlaDataProvider.get_map())
+
     def _register_statistics(self, config, checkpoint, entry_status, crash_message=""):
         """
         Computes and saved the simulation statistics
@@ -232,7 +250,12 @@ class LeaderboardEvaluator(object):
             config,
             self.manager.scenario_duration_system,
             self.manager.scenario_duration_game,
-            crash_message
+            crash_message,
+            tick_profile=self.manager.tick_profiler.summary(),
+            decode_stats=self.manager.sensor_decoder.summary() if self.manager.sensor_decoder else None,
+            sensor_metrics=self.manager.sensor_metrics,
+            sensor_setup_time=self.manager.sensor_setup_time,
+            headless=self._headless
         )
 
         print("\033[1m> Registering the route statistics\033[0m")
@@ -272,6 +295,16 @@ class LeaderboardEvaluator(object):
                 self.sensor_icons = [sensors_to_icons[sensor['type']] for sensor in self.sensors]
                 self.statistics_manager.save_sensors(self.sensor_icons, args.checkpoint)
 
+                # Nothing needs to be rendered without cameras, and cameras get no images without rendering.
+                # Known before the world is loaded, so it applies from the first route on
+                if args.headless == 'auto':
+                    self._headless = not AgentWrapper.requires_rendering(self.sensors)
+                elif self._headless and AgentWrapper.requires_rendering(self.sensors):
+                    print("\033[93mThe agent has cameras, which need the rendering. "
+                          "Ignoring --headless on\033[0m")
+                    self._headless = False
+                self.manager.set_headless(self._headless)
+
             self._agent_watchdog.stop()
 
         except SensorConfigurationInvalid as e:
@@ -305,8 +338,8 @@ class LeaderboardEvaluator(object):
         try:
             self._load_and_wait_for_world(args, config.town, config.ego_vehicles)
             self._prepare_ego_vehicles(config.ego_vehicles, False)
-            scenario = RouteScenario(world=self.world, config=config, debug_mode=args.debug)
-            self.statistics_manager.set_scenario(scenario.scenario)
+            scenario = RouteScenario(world=self.world, config=config, debug_mode=args.debug,
+                                     headless=self._headless, overlay=self.manager.overlay)
 
             # Night mode
             if config.weather.sun_altitude_angle < 0.0:
@@ -317,6 +350,11 @@ class LeaderboardEvaluator(object):
             if args.record:
                 self.client.start_recorder("{}/{}_rep{}.log".format(args.record, config.name, config.repetition_index))
             self.manager.load_scenario(scenario, self.agent_instance, config.repetition_index)
+            self.statistics_manager.set_scenario(scenario.scenario, self.manager.criteria)
+            if args.record_sensors:
+                self.agent_instance.sensor_interface.start_recording(
+                    os.path.join(args.record_sensors, "{}_rep{}".format(config.name, config.repetition_index)),
+                    scenario.gps_route, scenario.route)
 
         except Exception as e:
             # The scenario is wrong -> set the ejecution to crashed and stop
@@ -424,8 +462,32 @@ def main():
     parser.add_argument('--debug', type=int, help='Run with debug output', default=0)
     parser.add_argument('--record', type=str, default='',
                         help='Use CARLA recording feature to create a recording of the scenario')
+    parser.add_argument('--record-sensors', type=str, default='',
+                        help='Directory where the sensor data received by the agent, and its controls, are recorded')
     parser.add_argument('--timeout', default="60.0",
                         help='Set the CARLA client timeout value in seconds')
+    parser.add_argument('--debug-overlay-rate', type=int, default=1,
+                        help='Draw the debug overlay one every N frames, 0 to disable it (default: 1). '
+                             'The drawing is rate-limited, not batched: every drawn primitive is still '
+                             'one draw call to the server')
+    parser.add_argument('--brake-policy', choices=['zones', 'ttc'], default='zones',
+                        help='Engage the safety brake when an actor is inside the areas around the ego (zones), '
+                             'or when a collision is predicted (ttc) (default: zones)')
+    parser.add_argument('--brake-ttc', type=float, default=DEFAULT_BRAKE_TTC,
+                        help='Time to collision, in seconds, under which the ttc policy brakes')
+    parser.add_argument('--ttc-horizon', type=float, default=DEFAULT_HORIZON,
+                        help='Time horizon, in seconds, of the collision prediction')
+    parser.add_argument('--tick-mode', choices=['serial', 'pipelined'], default='serial',
+                        help='Evaluate the criteria of a frame on a worker thread while the agent computes its '
+                             'control (pipelined), or after it (serial). Both modes give the same scores '
+                             '(default: serial)')
+    parser.add_argument('--headless', choices=['off', 'on', 'auto'], default='off',
+                        help='Disable the rendering, the spectator and the debug drawing (on), '
+                             'or do so only if the agent has no cameras (auto). Agents with cameras '
+                             'are always rendered (default: off)')
+    parser.add_argument('--decode-workers', type=int, default=0,
+                        help='Threads decoding the images and point clouds, instead of the CARLA listener '
+                             'threads (default: 0, decode on the listener threads)')
 
     # simulation setup
     parser.add_argument('--routes',
@@ -43,6 +43,7 @@ from srunner.scenariomanager.scenarioatomics.atomic_criteria import (CollisionTe
                                                                      RunningStopTest,
                                                                      ActorSpeedAboveThresholdTest)
 
+from leaderboard.utils.debug_overlay import DebugOverlay
 from leaderboard.utils.route_parser import RouteParser, TRIGGER_THRESHOLD, TRIGGER_ANGLE_THRESHOLD
 from leaderboard.utils.route_manipulation import interpolate_trajectory
 
@@ -178,13 +179,18 @@ class RouteScenario(BasicScenario):
 
     category = "RouteScenario"
 
-    def __init__(self, world, config, debug_mode=0, criteria_enable=True):
+    def __init__(self, world, config, debug_mode=0, criteria_enable=True, headless=False, overlay=None):
         """
-        Setup all relevant parameters and create scenarios along route
+        Setup all relevant parameters and create scenarios along route.
+        In headless mode, the spectator isn't moved and nothing is drawn on the world.
+        The debug drawings use the given overlay (see ScenarioManager.overlay), if any.
         """
         self.config = config
         self.route = None
+        self.gps_route = None
         self.sampled_scenarios_definitions = None
+        self._headless = headless
+        self._overlay = overlay if overlay is not None else DebugOverlay(rate=0 if headless else 1)
 
         self._update_route(world, config, debug_mode>0)
 
@@ -224,6 +230,7 @@ class RouteScenario(BasicScenario):
             config.town, route, world_annotations)
 
         self.route = route
+        self.gps_route = gps_route
         CarlaDataProvider.set_ego_vehicle_route(convert_transform_to_location(self.route))
 
         config.agent.set_global_plan(gps_route, self.route)
@@ -250,10 +257,11 @@ class RouteScenario(BasicScenario):
                                                           elevate_transform,
                                                           rolename='hero')
 
-        spectator = CarlaDataProvider.get_world().get_spectator()
-        ego_trans = ego_vehicle.get_transform()
-        spectator.set_transform(carla.Transform(ego_trans.location + carla.Location(z=50),
-                                                    carla.Rotation(pitch=-90)))
+        if not self._headless:
+            spectator = CarlaDataProvider.get_world().get_spectator()
+            ego_trans = ego_vehicle.get_transform()
+            spectator.set_transform(carla.Transform(ego_trans.location + carla.Location(z=50),
+                                                        carla.Rotation(pitch=-90)))
 
         return ego_vehicle
 
@@ -271,11 +279,12 @@ class RouteScenario(BasicScenario):
 
         return int(SECONDS_GIVEN_PER_METERS * route_length + INITIAL_SECONDS_DELAY)
 
-    # pylint: disable=no-self-use
     def _draw_waypoints(self, world, waypoints, vertical_shift, persistency=-1):
         """
         Draw a list of waypoints at a certain height given in vertical_shift.
         """
+        overlay = self._overlay
+        overlay.begin_static(world)
         for w in waypoints:
             wp = w[0].location + carla.Location(z=vertical_shift)
 
@@ -294,12 +303,13 @@ class RouteScenario(BasicScenario):
                 color = carla.Color(0, 255, 0) # Green
                 size = 0.1
 
-            world.debug.draw_point(wp, size=size, color=color, life_time=persistency)
+            overlay.draw_point(wp, size=size, color=color, life_time=persistency)
 
-        world.debug.draw_point(waypoints[0][0].location + carla.Location(z=vertical_shift), size=0.2,
-                               color=carla.Color(0, 0, 255), life_time=persistency)
-        world.debug.draw_point(waypoints[-1][0].location + carla.Location(z=vertical_shift), size=0.2,
-                               color=carla.Color(255, 0, 0), life_time=persistency)
+        overlay.draw_point(waypoints[0][0].location + carla.Location(z=vertical_shift), size=0.2,
+                           color=carla.Color(0, 0, 255), life_time=persistency)
+        overlay.draw_point(waypoints[-1][0].location + carla.Location(z=vertical_shift), size=0.2,
+                           color=carla.Color(255, 0, 0), life_time=persistency)
+        overlay.flush()
 
     def _scenario_sampling(self, potential_scenarios_definitions, random_seed=0):
         """
@@ -365,13 +375,16 @@ class RouteScenario(BasicScenario):
         scenario_instance_vec = []
 
         if debug_mode:
+            overlay = self._overlay
+            overlay.begin_static(world)
             for scenario in scenario_definitions:
                 loc = carla.Location(scenario['trigger_position']['x'],
                                      scenario['trigger_position']['y'],
                                      scenario['trigger_position']['z']) + carla.Location(z=2.0)
-                world.debug.draw_point(loc, size=0.3, color=carla.Color(255, 0, 0), life_time=100000)
-                world.debug.draw_string(loc, str(scenario['name']), draw_shadow=False,
-                                        color=carla.Color(0, 0, 255), life_time=100000, persistent_lines=True)
+                overlay.draw_point(loc, size=0.3, color=carla.Color(255, 0, 0), life_time=100000)
+                overlay.draw_string(loc, str(scenario['name']), draw_shadow=False,
+                                    color=carla.Color(0, 0, 255), life_time=100000, persistent_lines=True)
+            overlay.flush()
 
         for scenario_number, definition in enumerate(scenario_definitions):
             # Get the class possibilities for this scenario number
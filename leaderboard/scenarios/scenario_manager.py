@@ -14,18 +14,24 @@ from __future__ import print_function
 import signal
 import sys
 import time
-
+import numpy as np
 import py_trees
 import carla
 
-import math
-
 from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
 from srunner.scenariomanager.timer import GameTime
 from srunner.scenariomanager.watchdog import Watchdog
 
 from leaderboard.autoagents.agent_wrapper import AgentWrapper, AgentError
+from leaderboard.envs.sensor_decoder import SensorDecoder
 from leaderboard.envs.sensor_interface import SensorReceivedNoData
+from leaderboard.utils.actor_registry import ActorRegistry
+from leaderboard.utils.criteria_pipeline import CriteriaPipeline
+from leaderboard.utils.criteria_registry import CriteriaRegistry
+from leaderboard.utils.debug_overlay import DebugOverlay
+from leaderboard.utils.tick_profiler import TickProfiler
+from leaderboard.utils.time_to_collision import TimeToCollision, DEFAULT_HORIZON
+from leaderboard.utils.zone_geometry import PROXIMITY_RADIUS, ZoneGeometry
 from leaderboard.utils.result_writer import ResultOutputProvider # testing result -> fail or Succes
 
 
@@ -47,13 +53,23 @@ class ScenarioManager(object):
     """
 
 
-    def __init__(self, timeout, debug_mode=False):
+    def __init__(self, timeout, debug_mode=False, overlay_rate=1, frame_delta=0.05, zone_shapes=None,
+                 brake_policy=None, ttc_horizon=DEFAULT_HORIZON, pipelined=False, decode_workers=0):
         """
         Setups up the parameters, which will be filled at load_scenario()
+
+        The debug overlay is drawn one every overlay_rate frames (0 disables it).
+        The areas checked by the safety brake are given by zone_shapes (see ZoneShape).
+        If a brake_policy (see TTCBrakePolicy) is given, the safety brake is engaged by the
+        time to collision instead of by the presence of actors inside the areas.
+        In pipelined mode, the criteria of a frame are evaluated on a worker thread
+        while the agent computes its control for that frame (see CriteriaPipeline).
+        With decode_workers, the sensor data is decoded by a pool of threads (see SensorDecoder).
         """
         self.scenario = None
         self.scenario_tree = None
         self.scenario_class = None
+        self.criteria = None
         self.ego_vehicles = None
         self.other_actors = None
 
@@ -62,6 +78,21 @@ class ScenarioManager(object):
         self._running = False
         self._timestamp_last_run = 0.0
         self._timeout = float(timeout)
+        self._zones = ZoneGeometry(zone_shapes)
+        self._ttc = TimeToCollision(horizon=ttc_horizon)
+        self._brake_policy = brake_policy
+        self._earliest_ttc = float('inf')
+        self._overlay_rate = overlay_rate
+        self._overlay = DebugOverlay(rate=overlay_rate, frame_delta=frame_delta)
+        self._headless = False
+
+        # Wall time spent in each phase of the tick
+        self.tick_profiler = TickProfiler()
+
+        # Pool decoding the sensor data off the CARLA listener threads, if any
+        self.sensor_decoder = SensorDecoder(decode_workers) if decode_workers > 0 else None
+
+        self._criteria_pipeline = CriteriaPipeline(pipelined)
 
         # Used to detect if the simulation is down
         watchdog_timeout = max(5, self._timeout - 2)
@@ -77,6 +108,11 @@ class ScenarioManager(object):
         self.end_system_time = None
         self.end_game_time = None
 
+        # Latency and bandwidth metrics of the sensors, stored when the route is stopped
+        self.sensor_metrics = None
+
+        # Wall time spent spawning and attaching the sensors of the agent
+        self.sensor_setup_time = None
 
         # Register the scenario tick as callback for the CARLA world
         # Use the callback_id inside the signal handler to allow external interrupts
@@ -98,6 +134,31 @@ class ScenarioManager(object):
         self.start_system_time = None
         self.end_system_time = None
         self.end_game_time = None
+        self.tick_profiler.reset()
+        if self.sensor_decoder is not None:
+            self.sensor_decoder.shutdown()
+            self.sensor_decoder.reset()
+        self.sensor_metrics = None
+        self.sensor_setup_time = None
+        self._criteria_pipeline.shutdown()
+
+    @property
+    def headless(self):
+        return self._headless
+
+    @property
+    def overlay(self):
+        """
+        Debug overlay of the manager, drawn at the configured rate and disabled in headless mode
+        """
+        return self._overlay
+
+    def set_headless(self, headless):
+        """
+        In headless mode, the spectator isn't moved and the debug overlay isn't drawn
+        """
+        self._headless = headless
+        self._overlay.set_rate(0 if headless else self._overlay_rate)
 
     def load_scenario(self, scenario, agent, rep_number):
         """
@@ -105,10 +166,15 @@ class ScenarioManager(object):
         """
 
         GameTime.restart()
-        self._agent = AgentWrapper(agent)
+        if self.sensor_decoder is not None:
+            self.sensor_decoder.start()
+        self._agent = AgentWrapper(agent, self.sensor_decoder)
         self.scenario_class = scenario
         self.scenario = scenario.scenario
         self.scenario_tree = self.scenario.scenario_tree
+        self.criteria = CriteriaRegistry(self.scenario.get_criteria())
+        self._criteria_pipeline.load(self.scenario_tree, getattr(self.scenario, 'criteria_tree', None),
+                                     self.criteria.criteria)
         self.ego_vehicles = scenario.ego_vehicles
         self.other_actors = scenario.other_actors
         self.repetition_number = rep_number
@@ -116,7 +182,9 @@ class ScenarioManager(object):
         # To print the scenario tree uncomment the next line
         # py_trees.display.render_dot_tree(self.scenario_tree)
 
+        setup_start = time.perf_counter()
         self._agent.setup_sensors(self.ego_vehicles[0], self._debug_mode)
+        self.sensor_setup_time = time.perf_counter() - setup_start
 
 
     def run_scenario(self):
@@ -125,123 +193,144 @@ class ScenarioManager(object):
         """
         self.start_system_time = time.time()
         self.start_game_time = GameTime.get_time()
+        self.tick_profiler.reset()
+        if self.sensor_decoder is not None:
+            self.sensor_decoder.reset()
 
         self._watchdog.start()
         self._running = True
         while self._running:
+            # The criteria of the previous frame are done before anything of the next one is read
+            self._wait_for_criteria()
+
             timestamp = None
             world = CarlaDataProvider.get_world()
             brake_on = False
+            close_actors = []
 
             if world:
 
-                # get ego vehicle info
-                ego_vehicle = self.ego_vehicles[0]
-                control = ego_vehicle.get_control()
-                ego_location = ego_vehicle.get_location()
-
-                # initialize area info
-                angle = { "front" : 0, "left" : -90.0 , "right" : 90.0 }
-                distance = {"front" : 10.0, "left" : 3.0, "right" : 3.0}
-                width = {"front" : ego_vehicle.bounding_box.extent.x ,  "left" : ego_vehicle.bounding_box.extent.y * 2, "right" : ego_vehicle.bounding_box.extent.y *2}
-                
-                yaw = ego_vehicle.get_transform().rotation.yaw
-                interval_point = {}
-                right_symmetry = {}
-                left_symmetry = {}
-                slope = {}
-                close_actors = []
-                
-                # set Area
-                for i in angle.keys():
-                    slope[i] = math.tan(math.radians(yaw + angle[i]))
-                    interval_point[i] = carla.Location(ego_location.x + distance[i] * math.cos(math.radians(yaw + angle[i])) , ego_location.y + distance[i] * math.sin(math.radians(yaw + angle[i])) ,0.0)
-                    left_symmetry[i] = carla.Location(- width[i] * slope[i] * math.sqrt(1/ (slope[i] **2 + 1)) + interval_point[i].x , width[i] * math.sqrt( 1 / (slope[i] **2 + 1)) + interval_point[i].y ,1.0)
-                    right_symmetry[i] = carla.Location( width[i] * slope[i] * math.sqrt( 1 / (slope[i] **2 + 1)) + interval_point[i].x ,- width[i] * math.sqrt(1  / (slope[i]**2 + 1)) + interval_point[i].y ,1.0)
-                    
-                    # draw Area
-                    # world.debug.draw_string( interval_point[i],"M", draw_shadow=False, color=carla.Color(225,0,0), life_time= 0.006)
-                    # world.debug.draw_string( left_symmetry[i],"L", draw_shadow=False, color=carla.Color(225,0,0), life_time= 0.006)
-                    # world.debug.draw_string( right_symmetry[i],"R", draw_shadow=False, color=carla.Color(225,0,0), life_time= 0.006)
-                
-                # vehicle check
-
-                for vehicle in world.get_actors().filter('vehicle.*'):
-                    vehicle_location = vehicle.get_location()
-                    if(ego_vehicle.id != vehicle.id and vehicle.is_alive):
-                        if((ego_location.x -vehicle_location.x)**2 + (ego_location.y - vehicle_location.y)**2  < 2500):
-                            
-                            # draw Box
-                            transform = vehicle.get_transform()
-                            bounding_box = vehicle.bounding_box
-                            bounding_box.location += transform.location
-                            world.debug.draw_box(bounding_box, transform.rotation, thickness = 0.1, color = carla.Color(10,15,219,0), life_time=0.006)
-                            
-                            # Front, left, right area check 
-                            
-                            for i in angle.keys():
-                                front_diff = (vehicle_location.x - interval_point[i].x) / slope[i] + interval_point[i].y - vehicle_location.y
-                                back_diff = (vehicle_location.x - ego_location.x) / slope[i] + ego_location.y - vehicle_location.y
-                                left_diff = (vehicle_location.x - left_symmetry[i].x ) * slope[i] + left_symmetry[i].y - vehicle_location.y
-                                right_diff = (vehicle_location.x - right_symmetry[i].x) * slope[i] + right_symmetry[i].y - vehicle_location.y
-                                if(front_diff * back_diff < 0 and left_diff * right_diff < 0):
-                                    brake_on = True
-                                    if(vehicle.type_id not in close_actors):
-                                        close_actors.append(vehicle.type_id)
-                # walker check
-
-                for walker in world.get_actors().filter('walker.*'):
-                    walker_location = walker.get_location()
-                    if(ego_vehicle.id != walker.id and walker.is_alive):
-                        if((ego_location.x - walker_location.x)**2 + (ego_location.y - walker_location.y)**2  < 2500):
-                            
-                            # draw Box
-                            transform = walker.get_transform()
-                            bounding_box = walker.bounding_box
-                            bounding_box.location += transform.location
-                            world.debug.draw_box(bounding_box, transform.rotation, thickness = 0.1, color = carla.Color(215,10,15,0), life_time=0.006)
-
-                            # Front, left, right area check
-                            for i in angle.keys():
-                                front_diff = (walker_location.x - interval_point[i].x) / slope[i] + interval_point[i].y - walker_location.y
-                                back_diff = (walker_location.x - ego_location.x) / slope[i] + ego_location.y - walker_location.y
-                                left_diff = (walker_location.x - left_symmetry[i].x ) * slope[i] + left_symmetry[i].y - walker_location.y
-                                right_diff = (walker_location.x - right_symmetry[i].x) * slope[i] + right_symmetry[i].y - walker_location.y
-                                if(front_diff * back_diff < 0 and left_diff * right_diff < 0):
-                                    brake_on = True
-                                    if(walker.type_id not in close_actors):
-                                        close_actors.append(walker.type_id)
-
+                self.tick_profiler.begin('snapshot')
                 snapshot = world.get_snapshot()
                 if snapshot:
                     timestamp = snapshot.timestamp
+
+                    # Update the state of all the actors at once
+                    ActorRegistry.on_carla_tick(world, snapshot)
+                    self.tick_profiler.end('snapshot')
+
+                    self.tick_profiler.begin('proximity')
+                    self._overlay.begin_frame(snapshot.frame, world)
+                    brake_on, close_actors = self._check_proximity()
+                    self._overlay.flush()
+                    self.tick_profiler.end('proximity')
+
             if timestamp:
                 self._tick_scenario(timestamp,close_actors, brake_on)
 
+        self._wait_for_criteria()
 
 
+
+    def _check_proximity(self):
+        """
+        Check which vehicles and walkers are inside the front, left and right areas
+        of the ego vehicle, using the state of the actors cached for this tick
+        """
+        self._earliest_ttc = float('inf')
+
+        frame_state = ActorRegistry.get_frame_state()
+        ego_vehicle = self.ego_vehicles[0]
+        ego_index = frame_state.index(ego_vehicle.id)
+        if ego_index is None:
+            return False, []
+
+        # get ego vehicle info
+        ego_location = frame_state.positions[ego_index]
+        ego_extent = ActorRegistry.get_extent(ego_vehicle.id)
+        yaw = frame_state.rotations[ego_index, 1]
+
+        # set Area
+        self._zones.update(ego_location[0], ego_location[1], yaw, *ego_extent)
+
+        # gather the vehicles and walkers around the ego
+        ids, positions = ActorRegistry.get_grid().query_radius(ego_location[0], ego_location[1], PROXIMITY_RADIUS)
+        others = ids != ego_vehicle.id
+        ids = ids[others]
+        positions = positions[others]
+        rows = frame_state.rows(ids.tolist())
+        vehicles = frame_state.mask('vehicle.')
+
+        # draw Box
+        if self._overlay.active:
+            life_time = self._overlay.frame_life_time(0.006)
+            for actor_id, row in zip(ids.tolist(), rows):
+                actor = ActorRegistry.get_actor(actor_id)
+                if actor is None:
+                    continue
+                location = frame_state.positions[row]
+                pitch, actor_yaw, roll = frame_state.rotations[row]
+                bounding_box = actor.bounding_box
+                bounding_box.location += carla.Location(x=location[0], y=location[1], z=location[2])
+                color = carla.Color(10, 15, 219, 0) if vehicles[row] else carla.Color(215, 10, 15, 0)
+                self._overlay.draw_box(bounding_box, carla.Rotation(pitch=pitch, yaw=actor_yaw, roll=roll),
+                                       thickness=0.1, color=color, life_time=life_time)
+
+        # Front, left, right area check, using the bounding boxes of the actors
+        yaws = frame_state.rotations[rows, 1]
+        extents = np.array([ActorRegistry.get_extent(actor_id) for actor_id in ids.tolist()]).reshape(-1, 2)
+        overlap = self._zones.boxes_in_zones(positions, yaws, extents)
+        hits = np.flatnonzero(overlap.any(axis=1))
+
+        close_actors = []
+        for type_id in frame_state.type_ids[rows[hits]].tolist():
+            if type_id not in close_actors:
+                close_actors.append(type_id)
+
+        # Predicted conflicts with the neighbors
+        ego_state = (ego_location[:2], frame_state.rotations[ego_index, 1], frame_state.velocities[ego_index, :2])
+        ttc = self._ttc.compute(ego_state, ego_extent,
+                                positions, yaws, frame_state.velocities[rows, :2], extents)
+        if len(ttc):
+            self._earliest_ttc = float(np.min(ttc))
+
+        if self._brake_policy is not None:
+            return self._brake_policy.should_brake(ttc), close_actors
+
+        return len(hits) > 0, close_actors
+
     def _tick_scenario(self, timestamp , close_actors = None ,brake_on = False):
         """
         Run next tick of scenario and the agent and tick the world.
         """
-
         if self._timestamp_last_run < timestamp.elapsed_seconds and self._running:
             self._timestamp_last_run = timestamp.elapsed_seconds
             self._watchdog.update()
 
             # Update game time and actor information
+            self.tick_profiler.begin('game_time')
             GameTime.on_carla_tick(timestamp)
 
             CarlaDataProvider.on_carla_tick()
+            self._criteria_pipeline.begin_frame(timestamp.frame)
+            self.tick_profiler.end('game_time')
 
-            coll_value = list(filter(lambda x: x.name == "CollisionTest", self.scenario.get_criteria()))
-            coll_value = coll_value[0].actual_value
+            self.tick_profiler.begin('pseudo_sensors')
+            self._agent.tick_pseudo_sensors()
+            self.tick_profiler.end('pseudo_sensors')
+
+            coll_value = self.criteria.update_scoreboard()['collisions']
             control = self.ego_vehicles[0].get_control()
 
-            display_additional_info = {"throttle" : control.throttle, "steer" : control.steer, "brake" : control.brake , "collision" : coll_value , "actors" : close_actors}
+            display_additional_info = {"throttle" : control.throttle, "steer" : control.steer, "brake" : control.brake , "collision" : coll_value , "ttc" : self._earliest_ttc, "actors" : close_actors}
             
+            # In pipelined mode, the criteria of this frame run while the agent does
+            self._criteria_pipeline.start()
+
             try:
+                self.tick_profiler.begin('agent')
                 ego_action = self._agent.agent_call(display_additional_info) # print tick count # display 
+                agent_time = self.tick_profiler.end('agent')
 
             # Special exception inside the agent that isn't caused by the agent
             except SensorReceivedNoData as e:
@@ -249,31 +338,66 @@ class ScenarioManager(object):
 
             except Exception as e:
                 raise AgentError(e)
+
+            # Split the agent call into the wait for the sensors and the agent's run_step
+            sensor_wait_time = self._agent.get_sensor_wait_time()
+            self.tick_profiler.add('sensor_wait', sensor_wait_time)
+            self.tick_profiler.add('run_step', max(agent_time - sensor_wait_time, 0.0))
             
+            self._wait_for_criteria()
+
             # set brake
             ego_action.brake = 1 if brake_on else ego_action.brake
             
             self.ego_vehicles[0].apply_control(ego_action)
             # Tick scenario
-            self.scenario_tree.tick_once()
-            
-            if self._debug_mode:
-                print("\n")
-                py_trees.display.print_ascii_tree(
-                    self.scenario_tree, show_status=True)
-                sys.stdout.flush()
-
-            if self.scenario_tree.status != py_trees.common.Status.RUNNING:
-                self._running = False
-
-            spectator = CarlaDataProvider.get_world().get_spectator()
-            ego_trans = self.ego_vehicles[0].get_transform()
-            spectator.set_transform(carla.Transform(ego_trans.location + carla.Location(z=50),
-                                                        carla.Rotation(pitch=-90)))
+            self.tick_profiler.begin('scenario_tree')
+            self._tick_scenario_tree()
+            self.tick_profiler.end('scenario_tree')
+
+            if not self._headless:
+                self.tick_profiler.begin('spectator')
+                spectator = CarlaDataProvider.get_world().get_spectator()
+                ego_trans = self.ego_vehicles[0].get_transform()
+                spectator.set_transform(carla.Transform(ego_trans.location + carla.Location(z=50),
+                                                            carla.Rotation(pitch=-90)))
+                self.tick_profiler.end('spectator')
             
 
         if self._running and self.get_running_status():
-            CarlaDataProvider.get_world().tick(self._timeout)
+            self.tick_profiler.begin('world_tick')
+            frame = CarlaDataProvider.get_world().tick(self._timeout)
+            self.tick_profiler.end('world_tick')
+            self._agent.mark_sensor_frame(frame)
+
+    def _tick_scenario_tree(self):
+        """
+        Tick the scenario tree. In pipelined mode, the criteria have already been ticked
+        during the agent step, and only take part in the status of the root.
+        """
+        if self._criteria_pipeline.tick() != py_trees.common.Status.RUNNING:
+            self._running = False
+        self._print_scenario_tree()
+
+    def _wait_for_criteria(self):
+        """
+        Wait for the criteria ticked on the worker, if any
+        """
+        if not self._criteria_pipeline.pending:
+            return
+
+        self.tick_profiler.begin('criteria_wait')
+        criteria_time = self._criteria_pipeline.wait()
+        self.tick_profiler.end('criteria_wait')
+        if criteria_time is not None:
+            self.tick_profiler.add('criteria', criteria_time)
+
+    def _print_scenario_tree(self):
+        if self._debug_mode:
+            print("\n")
+            py_trees.display.print_ascii_tree(
+                self.scenario_tree, show_status=True)
+            sys.stdout.flush()
 
     def get_running_status(self):
         """
@@ -288,6 +412,12 @@ class ScenarioManager(object):
         """
         self._watchdog.stop()
 
+        # Only left pending if the route was interrupted, in which case the error is already known
+        try:
+            self._wait_for_criteria()
+        except Exception as e:  # pylint: disable=broad-except
+            print("Ignoring the criteria of the interrupted frame: {}".format(e))
+
         self.end_system_time = time.time()
         self.end_game_time = GameTime.get_time()
 
@@ -299,6 +429,7 @@ class ScenarioManager(object):
                 self.scenario.terminate()
 
             if self._agent is not None:
+                self.sensor_metrics = self._agent.get_sensor_metrics()
                 self._agent.cleanup()
                 self._agent = None
 
@@ -310,7 +441,7 @@ class ScenarioManager(object):
         """
         global_result = '\033[92m'+'SUCCESS'+'\033[0m'
 
-        for criterion in self.scenario.get_criteria():
+        for criterion in self.criteria.criteria:
             if criterion.test_status != "SUCCESS":
                 global_result = '\033[91m'+'FAILURE'+'\033[0m'
 
@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Registry of the actors alive in the world, owned by the leaderboard.
+
+This is the single per-tick source of the actors: their handles, type ids,
+extents and, once per tick, their state taken from the world snapshot.
+
+The registry learns about the actors when they are spawned and destroyed
+through the CarlaDataProvider (see track_data_provider()), which covers the ego
+vehicles, RouteScenario._initialize_actors and remove_all_actors. The typed
+actor collections then don't have to be rebuilt with world.get_actors().filter()
+every tick. Actors spawned or destroyed elsewhere (the map props, other clients)
+are caught by a full reconcile against the server, on the first tick and then
+every RECONCILE_PERIOD ticks. Until then, they are part of the frame state with
+an empty type id.
+
+The state of all the actors is kept in contiguous arrays (ActorStateFrame),
+so that the per-tick consumers (proximity check, criteria, pseudo-sensors)
+don't do one request to the server per actor.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+from leaderboard.utils.spatial_hash import SpatialHashGrid
+
+# Type prefixes for which a pre-filtered collection is kept
+ACTOR_TYPES = ('vehicle.', 'walker.', 'traffic.', 'sensor.')
+
+# Actors added to the spatial grid, i.e. the ones taking part of the traffic
+GRID_ACTOR_TYPES = ('vehicle.', 'walker.')
+
+# Amount of ticks between two full reconciles against the server
+RECONCILE_PERIOD = 200
+
+
+class ActorStateFrame(object):
+
+    """
+    State of all the actors at a given frame. The instances are never modified
+    once created: the arrays are read-only, and the masks of the ACTOR_TYPES are
+    computed by the constructor. They can thus be safely shared between threads.
+
+    - ids: (N,) array with the actor ids
+    - type_ids: (N,) array with the actor type ids
+    - positions: (N, 3) array with the x, y, z locations
+    - rotations: (N, 3) array with the pitch, yaw, roll angles (in degrees)
+    - velocities: (N, 3) array with the x, y, z velocities
+    """
+
+    def __init__(self, frame, ids, type_ids, positions, rotations, velocities):
+        self.frame = frame
+        self.ids = ids
+        self.type_ids = type_ids
+        self.positions = positions
+        self.rotations = rotations
+        self.velocities = velocities
+
+        self._index = {actor_id: i for i, actor_id in enumerate(ids.tolist())}
+        self._masks = {actor_type: np.char.startswith(type_ids, actor_type) for actor_type in ACTOR_TYPES}
+
+        for array in [ids, type_ids, positions, rotations, velocities] + list(self._masks.values()):
+            array.setflags(write=False)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index(self, actor_id):
+        """
+        Returns the row of the actor, or None if it isn't part of the frame
+        """
+        return self._index.get(actor_id, None)
+
+    def rows(self, actor_ids):
+        """
+        Returns an array with the rows of the given actors, which must be part of the frame
+        """
+        return np.fromiter((self._index[actor_id] for actor_id in actor_ids), dtype=np.int64, count=len(actor_ids))
+
+    def mask(self, type_filter):
+        """
+        Returns a boolean mask of the actors whose type id starts with the
+        given prefix, e.g. 'vehicle.' or 'walker.'. The masks of the ACTOR_TYPES
+        are precomputed, the other ones are computed at every call.
+        """
+        if type_filter in self._masks:
+            return self._masks[type_filter]
+        return np.char.startswith(self.type_ids, type_filter)
+
+
+class ActorRegistry(object):
+
+    """
+    This class keeps track of the actors of the world, together with their
+    type ids, in pre-filtered collections (see ACTOR_TYPES).
+
+    It also keeps the state of all the actors at the latest tick, updated via
+    on_carla_tick(). Vehicles and walkers are kept in a spatial grid, to be
+    used for neighbor queries.
+    """
+
+    _actors = {}
+    _type_ids = {}
+    _collections = {actor_type: {} for actor_type in ACTOR_TYPES}
+    _extents = {}
+    _ticks_since_reconcile = RECONCILE_PERIOD  # the first tick reconciles
+    _frame_state = None
+    _grid = SpatialHashGrid()
+
+    @staticmethod
+    def _collection_of(type_id):
+        for actor_type in ACTOR_TYPES:
+            if type_id.startswith(actor_type):
+                return ActorRegistry._collections[actor_type]
+        return None
+
+    @staticmethod
+    def track_data_provider(provider):
+        """
+        Hook the spawn and destroy paths of the given CarlaDataProvider class, so that the
+        actors registered to it or removed from it are added to or removed from the registry.
+        Hooking the same class more than once has no effect.
+        """
+        if getattr(provider, '_tracked_by_actor_registry', False):
+            return
+
+        register_actor = provider.register_actor
+        remove_actor_by_id = provider.remove_actor_by_id
+        remove_actors_in_surrounding = provider.remove_actors_in_surrounding
+
+        def registered(actor):
+            register_actor(actor)
+            ActorRegistry.register_actor(actor)
+
+        def removed_by_id(actor_id):
+            remove_actor_by_id(actor_id)
+            ActorRegistry.unregister_actor(actor_id)
+
+        def removed_in_surrounding(location, distance):
+            actor_ids = set(actor_id for actor_id, _ in provider.get_actors())
+            remove_actors_in_surrounding(location, distance)
+            for actor_id in actor_ids - set(actor_id for actor_id, _ in provider.get_actors()):
+                ActorRegistry.unregister_actor(actor_id)
+
+        # request_new_actor(s), request_new_batch_actors and register_actors all go through register_actor
+        provider.register_actor = staticmethod(registered)
+        provider.remove_actor_by_id = staticmethod(removed_by_id)
+        provider.remove_actors_in_surrounding = staticmethod(removed_in_surrounding)
+        provider._tracked_by_actor_registry = True
+
+    @staticmethod
+    def register_actor(actor):
+        """
+        Add a newly spawned actor to the registry
+        """
+        if actor is None:
+            return
+
+        ActorRegistry._actors[actor.id] = actor
+        ActorRegistry._type_ids[actor.id] = actor.type_id
+
+        collection = ActorRegistry._collection_of(actor.type_id)
+        if collection is not None:
+            collection[actor.id] = actor
+
+    @staticmethod
+    def register_actors(actors):
+        """
+        Add a list of newly spawned actors to the registry
+        """
+        for actor in actors:
+            ActorRegistry.register_actor(actor)
+
+    @staticmethod
+    def unregister_actor(actor_id):
+        """
+        Remove a destroyed actor from the registry
+        """
+        ActorRegistry._actors.pop(actor_id, None)
+        ActorRegistry._extents.pop(actor_id, None)
+        type_id = ActorRegistry._type_ids.pop(actor_id, None)
+
+        if type_id is not None:
+            collection = ActorRegistry._collection_of(type_id)
+            if collection is not None:
+                collection.pop(actor_id, None)
+
+    @staticmethod
+    def unregister_actors(actors):
+        """
+        Remove a list of destroyed actors from the registry
+        """
+        for actor in actors:
+            if actor is not None:
+                ActorRegistry.unregister_actor(actor.id)
+
+    @staticmethod
+    def on_carla_tick(world, snapshot=None):
+        """
+        Update the state of the actors with the given world snapshot (or a new one if none is given).
+        The actors themselves are only requested to the server by the periodic reconcile.
+        """
+        if snapshot is None:
+            snapshot = world.get_snapshot()
+
+        actor_snapshots = list(snapshot)
+        ids = np.fromiter((actor.id for actor in actor_snapshots), dtype=np.int64, count=len(actor_snapshots))
+
+        ActorRegistry._ticks_since_reconcile += 1
+        if ActorRegistry._ticks_since_reconcile >= RECONCILE_PERIOD:
+            ActorRegistry.reconcile(world)
+
+        positions = np.empty((len(actor_snapshots), 3))
+        rotations = np.empty((len(actor_snapshots), 3))
+        velocities = np.empty((len(actor_snapshots), 3))
+        for i, actor in enumerate(actor_snapshots):
+            transform = actor.get_transform()
+            velocity = actor.get_velocity()
+            positions[i] = (transform.location.x, transform.location.y, transform.location.z)
+            rotations[i] = (transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll)
+            velocities[i] = (velocity.x, velocity.y, velocity.z)
+
+        type_ids = np.array([ActorRegistry.get_type_id(actor_id) for actor_id in ids.tolist()], dtype=str)
+
+        frame_state = ActorStateFrame(snapshot.frame, ids, type_ids, positions, rotations, velocities)
+
+        in_grid = np.zeros(len(frame_state), dtype=bool)
+        for type_filter in GRID_ACTOR_TYPES:
+            in_grid |= frame_state.mask(type_filter)
+        ActorRegistry._grid.update(ids[in_grid], positions[in_grid, :2])
+
+        ActorRegistry._frame_state = frame_state
+
+    @staticmethod
+    def reconcile(world):
+        """
+        Rebuild the registry from the full list of actors of the server
+        """
+        ActorRegistry._ticks_since_reconcile = 0
+
+        actors = world.get_actors()
+        alive_ids = set(actor.id for actor in actors)
+
+        for actor_id in set(ActorRegistry._type_ids) - alive_ids:
+            ActorRegistry.unregister_actor(actor_id)
+
+        for actor in actors:
+            if actor.id not in ActorRegistry._type_ids:
+                ActorRegistry.register_actor(actor)
+
+    @staticmethod
+    def get_actor(actor_id):
+        """
+        Returns the CARLA actor handle, or None if the actor isn't registered
+        """
+        return ActorRegistry._actors.get(actor_id, None)
+
+    @staticmethod
+    def get_type_id(actor_id):
+        """
+        Returns the type id of the actor, or an empty string if it isn't registered
+        """
+        return ActorRegistry._type_ids.get(actor_id, '')
+
+    @staticmethod
+    def get_extent(actor_id):
+        """
+        Returns the (x, y) half extents of the actor bounding box, requested only once per actor.
+        Actors without bounding box have a null extent.
+        """
+        if actor_id not in ActorRegistry._extents:
+            actor = ActorRegistry._actors.get(actor_id, None)
+            extent = getattr(actor, 'bounding_box', None)
+            if extent is None:
+                return (0.0, 0.0)
+            extent = extent.extent
+            ActorRegistry._extents[actor_id] = (extent.x, extent.y)
+
+        return ActorRegistry._extents[actor_id]
+
+    @staticmethod
+    def get_actors(actor_type):
+        """
+        Returns the list of registered actors of one of the ACTOR_TYPES, e.g. 'vehicle.'
+        """
+        return list(ActorRegistry._collections[actor_type].values())
+
+    @staticmethod
+    def get_vehicles():
+        return ActorRegistry.get_actors('vehicle.')
+
+    @staticmethod
+    def get_walkers():
+        return ActorRegistry.get_actors('walker.')
+
+    @staticmethod
+    def get_frame_state():
+        """
+        Returns the latest ActorStateFrame, or None if on_carla_tick() hasn't been called yet
+        """
+        return ActorRegistry._frame_state
+
+    @staticmethod
+    def get_grid():
+        """
+        Returns the SpatialHashGrid with the vehicles and walkers of the latest frame
+        """
+        return ActorRegistry._grid
+
+    @staticmethod
+    def get_actors_in_radius(x, y, radius):
+        """
+        Returns the ids of the vehicles and walkers closer than radius to the (x, y) point
+        """
+        ids, _ = ActorRegistry._grid.query_radius(x, y, radius)
+        return ids
+
+    @staticmethod
+    def get_state(actor_id):
+        """
+        Returns a tuple with the position, rotation and velocity arrays of an actor,
+        or None if it isn't part of the latest frame
+        """
+        frame_state = ActorRegistry._frame_state
+        if frame_state is None:
+            return None
+
+        index = frame_state.index(actor_id)
+        if index is None:
+            return None
+
+        return frame_state.positions[index], frame_state.rotations[index], frame_state.velocities[index]
+
+    @staticmethod
+    def cleanup():
+        """
+        Cleanup and remove all entries from the registry
+        """
+        ActorRegistry._actors = {}
+        ActorRegistry._type_ids = {}
+        ActorRegistry._collections = {actor_type: {} for actor_type in ACTOR_TYPES}
+        ActorRegistry._extents = {}
+        ActorRegistry._ticks_since_reconcile = RECONCILE_PERIOD
+        ActorRegistry._frame_state = None
+        ActorRegistry._grid.clear()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Ticking of the scenario tree of a route, with the criteria optionally ticked on a worker thread.
+
+The criteria of a frame must see the world of that frame, as they do in serial
+mode. This is why, in pipelined mode, they don't overlap the world tick, during
+which the state read by the criteria of scenario_runner (the traffic light
+states, the actor transforms) moves to the next frame. They overlap the agent
+step of the same frame instead, during which the world can't advance:
+
+1. begin_frame(): the sensor events of the criteria up to this frame are handled
+2. start(): in pipelined mode, the criteria of the frame are ticked on the worker
+3. The agent computes its control
+4. wait(), the control is applied, and tick(): the rest of the tree is ticked,
+   and the status of the root computed
+5. The world is ticked
+
+The rest of the tree (behavior, timeout, weather, actor controls) is ticked in
+the same order as in serial mode. It only sends commands to the server, applied
+at the next world tick, so it doesn't change what the criteria of the frame read.
+The scores are thus identical in both modes, except for a route interrupted by
+an agent error, where the criteria of the failed frame were already ticked.
+"""
+
+from __future__ import print_function
+
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# Sensor attribute of a criterion -> static method handling its events, as (weak_self, event)
+CRITERIA_SENSORS = {
+    '_collision_sensor': '_count_collisions',
+    '_lane_sensor': '_count_lane_invasion',
+}
+
+
+class CriteriaEventBuffer(object):
+
+    """
+    Holds the events of the sensors owned by the criteria (e.g. the collision sensor
+    of the CollisionTest), and hands them to the criteria at the start of their frame.
+
+    The sensor callbacks otherwise run on the CARLA listener threads, at any point of
+    the tick, and possibly while the criteria are ticked. Buffering them makes the
+    criteria see the same events, in the same order, whatever the tick mode.
+    """
+
+    def __init__(self, criteria):
+        self._lock = threading.Lock()
+        self._events = []
+
+        for criterion in criteria:
+            for sensor_name, handler_name in CRITERIA_SENSORS.items():
+                sensor = getattr(criterion, sensor_name, None)
+                handler = getattr(type(criterion), handler_name, None)
+                if sensor is None or handler is None:
+                    continue
+
+                sensor.stop()
+                sensor.listen(self._make_callback(weakref.ref(criterion), handler))
+
+    def _make_callback(self, weak_criterion, handler):
+        def callback(event):
+            with self._lock:
+                self._events.append((event.frame, weak_criterion, handler, event))
+        return callback
+
+    def __len__(self):
+        with self._lock:
+            return len(self._events)
+
+    def deliver(self, frame):
+        """
+        Hand the events up to the given frame to their criteria, by frame and then by order of arrival
+        """
+        with self._lock:
+            due = [event for event in self._events if event[0] <= frame]
+            self._events = [event for event in self._events if event[0] > frame]
+
+        due.sort(key=lambda event: event[0])
+        for _, weak_criterion, handler, event in due:
+            handler(weak_criterion, event)
+
+
+class CriteriaPipeline(object):
+
+    """
+    Ticks the scenario tree of a route, in serial or pipelined mode (see the module docstring).
+
+    To use it:
+    1. Call load() with the trees and the criteria of the route
+    2. Every frame, call begin_frame(), start(), wait() and tick(), in this order
+    3. Call shutdown() once done with it
+    """
+
+    def __init__(self, pipelined=False):
+        self._pipelined = pipelined
+        self._executor = None
+        self._pending = None
+        self._criteria_ticked = False
+
+        self._scenario_tree = None
+        self._criteria_tree = None
+        self._events = None
+
+    @property
+    def pipelined(self):
+        return self._pipelined
+
+    @property
+    def pending(self):
+        """
+        True if criteria started on the worker haven't been waited for yet
+        """
+        return self._pending is not None
+
+    def load(self, scenario_tree, criteria_tree, criteria):
+        """
+        Use the trees of a new route. Without criteria_tree, the whole tree is ticked serially.
+        """
+        self._pending = None
+        self._criteria_ticked = False
+        self._scenario_tree = scenario_tree
+        self._criteria_tree = criteria_tree if self._pipelined else None
+        self._events = CriteriaEventBuffer(criteria)
+
+    def begin_frame(self, frame):
+        """
+        Hand the buffered sensor events up to this frame to the criteria
+        """
+        self._events.deliver(frame)
+
+    def start(self):
+        """
+        In pipelined mode, start ticking the criteria of the frame on the worker
+        """
+        if self._criteria_tree is None:
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = self._executor.submit(self._tick_criteria, self._criteria_tree)
+
+    @staticmethod
+    def _tick_criteria(criteria_tree):
+        start_time = time.perf_counter()
+        criteria_tree.tick_once()
+        return time.perf_counter() - start_time
+
+    def wait(self):
+        """
+        Wait for the criteria started on the worker, if any, raising their errors.
+        Returns the time the criteria took to tick, or None if none were started.
+        """
+        if self._pending is None:
+            return None
+
+        pending = self._pending
+        self._pending = None
+        criteria_time = pending.result()
+        self._criteria_ticked = True
+        return criteria_time
+
+    def tick(self):
+        """
+        Tick the scenario tree and return the status of its root. The criteria already
+        ticked on the worker aren't ticked again, but take part in the status of the root
+        as they do in serial mode.
+        """
+        self.wait()
+        if not self._criteria_ticked:
+            self._scenario_tree.tick_once()
+            return self._scenario_tree.status
+
+        criteria_tree = self._criteria_tree
+        criteria_tree.tick = lambda: iter([criteria_tree])
+        try:
+            self._scenario_tree.tick_once()
+        finally:
+            del criteria_tree.tick
+            self._criteria_ticked = False
+
+        return self._scenario_tree.status
+
+    def reset(self):
+        """
+        Drop the state of the route. The criteria still running on the worker, if any, are waited for.
+        """
+        pending = self._pending
+        self._pending = None
+        self._criteria_ticked = False
+        self._scenario_tree = None
+        self._criteria_tree = None
+        self._events = None
+
+        if pending is not None:
+            pending.exception()
+
+    def shutdown(self):
+        """
+        Stop the worker. It is created again if the pipeline is used afterwards.
+        """
+        self.reset()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
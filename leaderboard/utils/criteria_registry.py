@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Index of the criteria of a route.
+
+The criteria are extracted from the scenario tree once, when the route is
+loaded, and can then be accessed by name or type without walking the tree.
+A scoreboard with the main results of the route is kept up to date, reading
+only the traffic events registered since its last update.
+"""
+
+from __future__ import print_function
+
+# Scoreboard entry -> name of the criterion whose actual value it shows
+SCOREBOARD_VALUES = {
+    'collisions': 'CollisionTest',
+    'red_lights': 'RunningRedLightTest',
+    'stop_signs': 'RunningStopTest',
+    'route_completion': 'RouteCompletionTest',
+    'outside_lanes': 'OutsideRouteLanesTest',
+}
+
+
+class CriteriaRegistry(object):
+
+    """
+    Handles to the criteria of a route, by name and by type, together with a live scoreboard.
+
+    To use it:
+    1. Create it with the criteria of the scenario, e.g. CriteriaRegistry(scenario.get_criteria())
+    2. Call update_scoreboard() once per tick, after the criteria have been ticked
+    3. Read the scoreboard, or get the criteria with get() and get_by_type()
+    """
+
+    def __init__(self, criteria):
+        self._criteria = list(criteria)
+        self._by_name = {}
+        self._by_type = {}
+
+        for criterion in self._criteria:
+            self._by_name.setdefault(criterion.name, []).append(criterion)
+            self._by_type.setdefault(type(criterion), []).append(criterion)
+
+        self._value_handles = [(entry, self.get(name)) for entry, name in SCOREBOARD_VALUES.items()
+                               if self.get(name) is not None]
+        self._event_handles = [criterion for criterion in self._criteria
+                               if getattr(criterion, 'list_traffic_events', None) is not None]
+        self._event_cursors = [0] * len(self._event_handles)
+
+        self._scoreboard = {entry: 0 for entry in SCOREBOARD_VALUES}
+        self._scoreboard['events'] = {}
+
+    @property
+    def criteria(self):
+        """
+        All the criteria, in the order of the scenario tree
+        """
+        return self._criteria
+
+    @property
+    def scoreboard(self):
+        """
+        Main results of the route, as of the last update_scoreboard()
+        """
+        return self._scoreboard
+
+    def get(self, name):
+        """
+        Returns the first criterion with the given name, or None
+        """
+        criteria = self._by_name.get(name, None)
+        return criteria[0] if criteria else None
+
+    def get_all(self, name):
+        return list(self._by_name.get(name, []))
+
+    def get_by_type(self, criterion_type):
+        """
+        Returns the criteria that are instances of the given class
+        """
+        if criterion_type in self._by_type:
+            return list(self._by_type[criterion_type])
+        return [criterion for criterion in self._criteria if isinstance(criterion, criterion_type)]
+
+    def update_scoreboard(self):
+        """
+        Refresh the scoreboard values, and count the traffic events added since the last update
+        """
+        for entry, criterion in self._value_handles:
+            self._scoreboard[entry] = criterion.actual_value
+
+        event_counts = self._scoreboard['events']
+        for index, criterion in enumerate(self._event_handles):
+            events = criterion.list_traffic_events
+            for event in events[self._event_cursors[index]:]:
+                event_name = event.get_type().name.lower()
+                event_counts[event_name] = event_counts.get(event_name, 0) + 1
+            self._event_cursors[index] = len(events)
+
+        return self._scoreboard
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Debug overlay drawn on the CARLA world.
+
+The primitives are collected during a tick and drawn at flush() time, at the
+end of the tick. This is not a batch: CARLA's DebugHelper has no batch command,
+so flush() still sends one draw request per primitive. The requests are saved
+by disabling the overlay, or only drawing it every N frames, when nobody is
+looking at the spectator.
+"""
+
+from __future__ import print_function
+
+
+class DebugOverlay(object):
+
+    """
+    Collects debug primitives (boxes, points, strings, lines) and draws them on flush(),
+    one world.debug.draw_* call per primitive.
+
+    - rate: the overlay is drawn one every 'rate' frames. A rate of 0 disables it.
+    - frame_delta: duration of a frame, in seconds, used to extend the life time of
+      the primitives so that they remain visible until the next drawn frame
+    """
+
+    def __init__(self, world=None, rate=1, frame_delta=0.05):
+        self._world = world
+        self._rate = int(rate)
+        self._frame_delta = frame_delta
+        self._active = self._rate > 0
+        self._pending = []
+
+    @property
+    def enabled(self):
+        return self._rate > 0
+
+    @property
+    def active(self):
+        """
+        True if the primitives added in the current frame are going to be drawn
+        """
+        return self._active
+
+    def set_rate(self, rate):
+        """
+        Change the drawing rate. A rate of 0 disables the overlay, dropping all the pending primitives
+        """
+        self._rate = int(rate)
+        if self._rate <= 0:
+            self._active = False
+            self._pending = []
+
+    def disable(self):
+        """
+        Disable the overlay, dropping all the pending primitives
+        """
+        self.set_rate(0)
+
+    def begin_frame(self, frame, world=None):
+        """
+        Start collecting the primitives of a new frame. Returns True if this frame is drawn.
+        """
+        if world is not None:
+            self._world = world
+
+        self._pending = []
+        self._active = self._rate > 0 and frame % self._rate == 0
+        return self._active
+
+    def begin_static(self, world=None):
+        """
+        Start collecting primitives drawn once, outside of the frames (e.g. the route when it is loaded).
+        They are drawn if the overlay is enabled, whatever its rate.
+        """
+        if world is not None:
+            self._world = world
+
+        self._pending = []
+        self._active = self.enabled
+        return self._active
+
+    def frame_life_time(self, life_time):
+        """
+        Life time of a per-frame primitive, extended to cover the frames that are not drawn
+        """
+        return life_time + (self._rate - 1) * self._frame_delta if self._rate > 1 else life_time
+
+    def draw_box(self, box, rotation, **kwargs):
+        if self._active:
+            self._pending.append(('draw_box', (box, rotation), kwargs))
+
+    def draw_point(self, location, **kwargs):
+        if self._active:
+            self._pending.append(('draw_point', (location,), kwargs))
+
+    def draw_string(self, location, text, **kwargs):
+        if self._active:
+            self._pending.append(('draw_string', (location, text), kwargs))
+
+    def draw_line(self, begin, end, **kwargs):
+        if self._active:
+            self._pending.append(('draw_line', (begin, end), kwargs))
+
+    def flush(self):
+        """
+        Draw all the primitives collected since the last flush, one draw request each
+        """
+        pending = self._pending
+        self._pending = []
+        if not pending or self._world is None:
+            return
+
+        debug = self._world.debug
+        for method, args, kwargs in pending:
+            getattr(debug, method)(*args, **kwargs)
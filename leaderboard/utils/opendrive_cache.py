@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Cache of the OpenDRIVE description of the current town.
+
+Serializing the OpenDRIVE map is expensive (the documents are several MB),
+so it is fetched from the server once per world load and shared by all its
+consumers: the map pseudo sensor and the GPS conversion of the routes. The
+version only changes when the document does, which lets the consumers tell
+if they already have it.
+"""
+
+from __future__ import print_function
+
+import io
+import xml.etree.ElementTree as ET
+
+# Default GPS reference, used if the map has no geoReference
+DEFAULT_LAT_REF = 42.0
+DEFAULT_LON_REF = 2.0
+
+
+def parse_latlon_ref(opendrive):
+    """
+    Returns the lat and lon of the geoReference of the OpenDRIVE header.
+    Only the header is parsed, not the whole document
+    """
+    lat_ref = DEFAULT_LAT_REF
+    lon_ref = DEFAULT_LON_REF
+
+    source = io.BytesIO(opendrive.encode('utf-8'))
+    for _, element in ET.iterparse(source, events=('end',)):
+        if element.tag == 'geoReference' and element.text:
+            for item in element.text.split(' '):
+                if '+lat_0' in item:
+                    lat_ref = float(item.split('=')[1])
+                if '+lon_0' in item:
+                    lon_ref = float(item.split('=')[1])
+        elif element.tag == 'header':
+            break
+
+    return lat_ref, lon_ref
+
+
+class OpenDriveCache(object):
+
+    """
+    This class provides access to the OpenDRIVE map of the current town.
+
+    The evaluator calls load() after each world load. The other methods fetch
+    the map themselves if the cache is empty or holds another town.
+    """
+
+    _town = None
+    _opendrive = None
+    _version = 0
+    _latlon_ref = None
+
+    @staticmethod
+    def load(carla_map):
+        """
+        Fetch the OpenDRIVE map from the server. The version is only increased if the document has changed
+        """
+        opendrive = carla_map.to_opendrive()
+        if opendrive != OpenDriveCache._opendrive:
+            OpenDriveCache._opendrive = opendrive
+            OpenDriveCache._version += 1
+            OpenDriveCache._latlon_ref = None
+        OpenDriveCache._town = carla_map.name
+
+    @staticmethod
+    def _update(carla_map):
+        if OpenDriveCache._opendrive is None or carla_map.name != OpenDriveCache._town:
+            OpenDriveCache.load(carla_map)
+
+    @staticmethod
+    def get_opendrive(carla_map):
+        """
+        Returns the OpenDRIVE document of the map
+        """
+        OpenDriveCache._update(carla_map)
+        return OpenDriveCache._opendrive
+
+    @staticmethod
+    def get_version(carla_map):
+        """
+        Returns the version of the OpenDRIVE document of the map
+        """
+        OpenDriveCache._update(carla_map)
+        return OpenDriveCache._version
+
+    @staticmethod
+    def get_town():
+        return OpenDriveCache._town
+
+    @staticmethod
+    def get_latlon_ref(carla_map):
+        """
+        Returns the GPS reference (lat, lon) of the map, parsed once per document
+        """
+        OpenDriveCache._update(carla_map)
+        if OpenDriveCache._latlon_ref is None:
+            OpenDriveCache._latlon_ref = parse_latlon_ref(OpenDriveCache._opendrive)
+        return OpenDriveCache._latlon_ref
+
+    @staticmethod
+    def cleanup():
+        """
+        Empty the cache. The version keeps increasing, so that a new document is never mistaken for an old one
+        """
+        OpenDriveCache._town = None
+        OpenDriveCache._opendrive = None
+        OpenDriveCache._latlon_ref = None
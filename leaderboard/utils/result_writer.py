@@ -59,6 +59,10 @@ class ResultOutputProvider(object):
         list_statistics.extend([["Duration (System Time)", "{}s".format(system_time)]])
         list_statistics.extend([["Duration (Game Time)", "{}s".format(game_time)]])
         list_statistics.extend([["Ratio (System Time / Game Time)", "{}".format(ratio)]])
+        list_statistics.extend([["Headless", "{}".format(self._data.headless)]])
+        if self._data.sensor_setup_time is not None:
+            setup_time = round(self._data.sensor_setup_time, 3)
+            list_statistics.extend([["Sensor Setup (System Time)", "{}s".format(setup_time)]])
 
         output += tabulate(list_statistics, tablefmt='fancy_grid')
         output += "\n\n"
@@ -67,7 +71,7 @@ class ResultOutputProvider(object):
         header = ['Criterion', 'Result', 'Value']
         list_statistics = [header]
 
-        for criterion in self._data.scenario.get_criteria():
+        for criterion in self._data.criteria.criteria:
 
             actual_value = criterion.actual_value
             expected_value = criterion.expected_value_success
@@ -113,4 +117,49 @@ class ResultOutputProvider(object):
         output += tabulate(list_statistics, tablefmt='fancy_grid')
         output += "\n"
 
+        # Tick profile part
+        tick_profile = self._data.tick_profiler.summary()
+        if tick_profile:
+            header = ['Phase', 'Calls', 'Mean (ms)', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'Max (ms)', 'Total (s)']
+            list_statistics = [header]
+
+            for phase, stats in tick_profile.items():
+                list_statistics.extend([[phase, stats['count'], stats['mean'], stats['p50'], stats['p95'],
+                                         stats['p99'], stats['max'], round(stats['total'] / 1000, 2)]])
+
+            output += "\n"
+            output += tabulate(list_statistics, headers="firstrow", tablefmt='fancy_grid')
+            output += "\n"
+
+        # Sensor pipeline part
+        if self._data.sensor_metrics:
+            header = ['Sensor', 'Received', 'Dropped', 'FPS', 'MB/s', 'Queue depth', 'Latency p50 (ms)',
+                      'Latency p99 (ms)', 'Latency max (ms)']
+            list_statistics = [header]
+
+            for tag, metrics in self._data.sensor_metrics.items():
+                list_statistics.extend([[tag, metrics['received'], metrics['dropped'], metrics['fps'],
+                                         metrics['bandwidth'], metrics['mean_queue_depth'], metrics['latency_p50'],
+                                         metrics['latency_p99'], metrics['latency_max']]])
+
+            output += "\n"
+            output += tabulate(list_statistics, headers="firstrow", tablefmt='fancy_grid')
+            output += "\n"
+
+        # Sensor decoding part
+        if self._data.sensor_decoder is not None:
+            decode_stats = self._data.sensor_decoder.summary()
+            list_statistics = [["Decoded measurements", decode_stats['decoded']]]
+            list_statistics.extend([["Decoding errors", decode_stats['errors']]])
+            list_statistics.extend([["Peak pending", "{} / {}".format(decode_stats['peak_pending'],
+                                                                      decode_stats['max_pending'])]])
+            list_statistics.extend([["Listener stalls", "{} ({} ms)".format(decode_stats['stalls'],
+                                                                            decode_stats['stall_time'])]])
+            list_statistics.extend([["Mean queue time", "{} ms".format(decode_stats['mean_queue_time'])]])
+            list_statistics.extend([["Mean decode time", "{} ms".format(decode_stats['mean_decode_time'])]])
+
+            output += "\n"
+            output += tabulate(list_statistics, tablefmt='fancy_grid')
+            output += "\n"
+
         return output
@@ -11,12 +11,13 @@ It also contains functions to convert the CARLA world location do GPS coordinate
 """
 
 import math
-import xml.etree.ElementTree as ET
 
 from agents.navigation.global_route_planner import GlobalRoutePlanner
 from agents.navigation.global_route_planner_dao import GlobalRoutePlannerDAO
 from agents.navigation.local_planner import RoadOption
 
+from leaderboard.utils.opendrive_cache import OpenDriveCache
+
 
 def _location_to_gps(lat_ref, lon_ref, location):
     """
@@ -63,24 +64,7 @@ def _get_latlon_ref(world):
     Convert from waypoints world coordinates to CARLA GPS coordinates
     :return: tuple with lat and lon coordinates
     """
-    xodr = world.get_map().to_opendrive()
-    tree = ET.ElementTree(ET.fromstring(xodr))
-
-    # default reference
-    lat_ref = 42.0
-    lon_ref = 2.0
-
-    for opendrive in tree.iter("OpenDRIVE"):
-        for header in opendrive.iter("header"):
-            for georef in header.iter("geoReference"):
-                if georef.text:
-                    str_list = georef.text.split(' ')
-                    for item in str_list:
-                        if '+lat_0' in item:
-                            lat_ref = float(item.split('=')[1])
-                        if '+lon_0' in item:
-                            lon_ref = float(item.split('=')[1])
-    return lat_ref, lon_ref
+    return OpenDriveCache.get_latlon_ref(world.get_map())
 
 
 def downsample_route(route, sample_factor):
@@ -140,7 +124,9 @@ def interpolate_trajectory(world, waypoints_trajectory, hop_resolution=1.0):
         - hop_resolution: is the resolution, how dense is the provided trajectory going to be made
     """
 
-    dao = GlobalRoutePlannerDAO(world.get_map(), hop_resolution)
+    # Getting the map transfers it from the server, so it is only done once
+    carla_map = world.get_map()
+    dao = GlobalRoutePlannerDAO(carla_map, hop_resolution)
     grp = GlobalRoutePlanner(dao)
     grp.setup()
     # Obtain route plan
@@ -153,6 +139,6 @@ def interpolate_trajectory(world, waypoints_trajectory, hop_resolution=1.0):
         for wp_tuple in interpolated_trace:
             route.append((wp_tuple[0].transform, wp_tuple[1]))
 
-    lat_ref, lon_ref = _get_latlon_ref(world)
+    lat_ref, lon_ref = OpenDriveCache.get_latlon_ref(carla_map)
 
     return location_route_to_gps(route, lat_ref, lon_ref), route
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Uniform 2D spatial hash grid, used for neighbor queries between actors.
+
+The grid is incrementally updated: actors only change cells when they cross
+a cell boundary, and radius queries only visit the cells around the center.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+DEFAULT_CELL_SIZE = 20.0  # in meters
+
+
+class SpatialHashGrid(object):
+
+    """
+    2D hash grid of actor ids, keyed by cell.
+
+    To use it:
+    1. Call update() once per tick with the ids and positions of the actors
+    2. Call query_radius() as many times as needed
+    """
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self._cell_size = float(cell_size)
+
+        self._cells = {}
+        self._ids = np.empty(0, dtype=np.int64)
+        self._keys = np.empty((0, 2), dtype=np.int64)
+        self._positions = np.empty((0, 2))
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def cell_size(self):
+        return self._cell_size
+
+    def _cell_of(self, positions):
+        return np.floor(positions / self._cell_size).astype(np.int64)
+
+    def _insert(self, actor_id, key):
+        self._cells.setdefault(key, set()).add(actor_id)
+
+    def _remove(self, actor_id, key):
+        cell = self._cells.get(key, None)
+        if cell is not None:
+            cell.discard(actor_id)
+            if not cell:
+                del self._cells[key]
+
+    def update(self, ids, positions):
+        """
+        Update the grid with the current ids and (N, 2) positions. Actors not
+        present anymore are removed and the new ones are added.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+
+        order = np.argsort(ids, kind='stable')
+        ids = ids[order]
+        positions = positions[order]
+        keys = self._cell_of(positions)
+
+        # Match the new ids with the ones of the previous update
+        prev_index = np.searchsorted(self._ids, ids)
+        prev_index_clipped = np.minimum(prev_index, max(len(self._ids) - 1, 0))
+        if len(self._ids):
+            known = self._ids[prev_index_clipped] == ids
+            moved = known & np.any(self._keys[prev_index_clipped] != keys, axis=1)
+        else:
+            known = np.zeros(len(ids), dtype=bool)
+            moved = known
+
+        # Removed actors
+        still_present = np.zeros(len(self._ids), dtype=bool)
+        still_present[prev_index_clipped[known]] = True
+        for i in np.flatnonzero(~still_present):
+            self._remove(int(self._ids[i]), tuple(self._keys[i]))
+
+        # Actors that crossed a cell boundary
+        for i in np.flatnonzero(moved):
+            actor_id = int(ids[i])
+            self._remove(actor_id, tuple(self._keys[prev_index_clipped[i]]))
+            self._insert(actor_id, tuple(keys[i]))
+
+        # New actors
+        for i in np.flatnonzero(~known):
+            self._insert(int(ids[i]), tuple(keys[i]))
+
+        self._ids = ids
+        self._keys = keys
+        self._positions = positions
+
+    def query_radius(self, x, y, radius):
+        """
+        Returns a tuple with the ids and (M, 2) positions of all the actors
+        closer than radius to the (x, y) point
+        """
+        min_cell = self._cell_of(np.array([x - radius, y - radius]))
+        max_cell = self._cell_of(np.array([x + radius, y + radius]))
+
+        candidates = []
+        for cell_x in range(min_cell[0], max_cell[0] + 1):
+            for cell_y in range(min_cell[1], max_cell[1] + 1):
+                cell = self._cells.get((cell_x, cell_y), None)
+                if cell:
+                    candidates.extend(cell)
+
+        if not candidates:
+            return np.empty(0, dtype=np.int64), np.empty((0, 2))
+
+        rows = np.searchsorted(self._ids, np.array(candidates, dtype=np.int64))
+        diff = self._positions[rows] - (x, y)
+        rows = rows[np.einsum('ij,ij->i', diff, diff) < radius * radius]
+        rows.sort()
+
+        return self._ids[rows], self._positions[rows]
+
+    def query_neighbors(self, actor_id, radius):
+        """
+        Returns the ids and positions of the actors closer than radius to the given actor,
+        not including itself
+        """
+        row = np.searchsorted(self._ids, actor_id)
+        if row >= len(self._ids) or self._ids[row] != actor_id:
+            return np.empty(0, dtype=np.int64), np.empty((0, 2))
+
+        ids, positions = self.query_radius(self._positions[row, 0], self._positions[row, 1], radius)
+        others = ids != actor_id
+        return ids[others], positions[others]
+
+    def clear(self):
+        """
+        Remove all the actors from the grid
+        """
+        self._cells = {}
+        self._ids = np.empty(0, dtype=np.int64)
+        self._keys = np.empty((0, 2), dtype=np.int64)
+        self._positions = np.empty((0, 2))
@@ -85,6 +85,7 @@ class StatisticsManager(object):
 
     def __init__(self):
         self._master_scenario = None
+        self._criteria = None
         self._registry_route_records = []
 
     def resume(self, endpoint):
@@ -99,6 +100,7 @@ class StatisticsManager(object):
     def set_route(self, route_id, index):
 
         self._master_scenario = None
+        self._criteria = None
         route_record = RouteRecord()
         route_record.route_id = route_id
         route_record.index = index
@@ -109,15 +111,24 @@ class StatisticsManager(object):
         else:
             self._registry_route_records.append(route_record)
 
-    def set_scenario(self, scenario):
+    def set_scenario(self, scenario, criteria):
         """
-        Sets the scenario from which the statistics willb e taken
+        Sets the scenario from which the statistics willb e taken, together with the
+        CriteriaRegistry of the ScenarioManager, so that both read the same handles.
         """
         self._master_scenario = scenario
+        self._criteria = criteria
 
-    def compute_route_statistics(self, config, duration_time_system=-1, duration_time_game=-1, failure=""):
+    def compute_route_statistics(self, config, duration_time_system=-1, duration_time_game=-1, failure="",
+                                 tick_profile=None, headless=False, decode_stats=None, sensor_metrics=None,
+                                 sensor_setup_time=None):
         """
-        Compute the current statistics by evaluating all relevant scenario criteria
+        Compute the current statistics by evaluating all relevant scenario criteria.
+        The per-phase tick timings (see TickProfiler.summary) are stored as meta data,
+        together with whether the route ran headless and its game / system time ratio,
+        the backpressure metrics of the sensor decoding (see SensorDecoder.summary)
+        the latency and bandwidth of each sensor (see SensorMetrics.summary)
+        and the time spent setting the sensors up.
         """
         index = config.index
 
@@ -134,13 +145,24 @@ class StatisticsManager(object):
         route_record.meta['duration_system'] = duration_time_system
         route_record.meta['duration_game'] = duration_time_game
         route_record.meta['route_length'] = compute_route_length(config)
+        route_record.meta['headless'] = headless
+        if duration_time_system > 0:
+            route_record.meta['speed_ratio'] = duration_time_game / duration_time_system
+        if tick_profile is not None:
+            route_record.meta['tick_profile'] = tick_profile
+        if decode_stats is not None:
+            route_record.meta['sensor_decode'] = decode_stats
+        if sensor_metrics is not None:
+            route_record.meta['sensor_metrics'] = sensor_metrics
+        if sensor_setup_time is not None:
+            route_record.meta['sensor_setup_time'] = sensor_setup_time
 
         if self._master_scenario:
             if self._master_scenario.timeout_node.timeout:
                 route_record.infractions['route_timeout'].append('Route timeout.')
                 failure = "Agent timed out"
 
-            for node in self._master_scenario.get_criteria():
+            for node in self._criteria.criteria:
                 if node.list_traffic_events:
                     # analyze all traffic events
                     for event in node.list_traffic_events:
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Per-tick phase timing of the evaluation loop.
+
+Every phase keeps a fixed size histogram with logarithmic bins, so recording
+a sample is a single bisection and the memory doesn't grow with the length of
+the route. Percentiles are read from the histogram, with the resolution of
+its bins (~6%, interpolated linearly), while the mean and the maximum are exact.
+"""
+
+from __future__ import print_function
+
+import bisect
+import math
+import time
+
+# Histogram bins, from 1 microsecond to 100 seconds
+BINS_PER_DECADE = 40
+MIN_DURATION = 1e-6
+MAX_DURATION = 1e2
+BIN_EDGES = [MIN_DURATION * 10 ** (i / float(BINS_PER_DECADE))
+             for i in range(int(round(math.log10(MAX_DURATION / MIN_DURATION) * BINS_PER_DECADE)) + 1)]
+
+PERCENTILES = (50, 95, 99)
+
+
+class PhaseHistogram(object):
+
+    """
+    Histogram of the durations of one phase, in seconds
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BIN_EDGES) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.counts[bisect.bisect_right(BIN_EDGES, duration)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def percentile(self, percentile):
+        """
+        Value of the given percentile, interpolated inside its bin and bounded by the maximum
+        """
+        if not self.count:
+            return 0.0
+
+        rank = percentile / 100.0 * self.count
+        accumulated = 0
+        for index, count in enumerate(self.counts):
+            if count and accumulated + count >= rank:
+                low = BIN_EDGES[index - 1] if index > 0 else 0.0
+                high = BIN_EDGES[index] if index < len(BIN_EDGES) else self.max
+                value = low + (high - low) * (rank - accumulated) / count
+                return min(value, self.max)
+            accumulated += count
+
+        return self.max
+
+
+class TickProfiler(object):
+
+    """
+    Low overhead timer of the phases of the evaluation loop.
+
+    To use it:
+    1. Call begin(phase) and end(phase) around each phase, or add(phase, duration)
+       for durations measured elsewhere
+    2. Call summary() at the end of the route, and reset() before the next one
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._phases = []
+        self._starts = {}
+        self._clock = time.perf_counter
+
+    def begin(self, phase):
+        if self.enabled:
+            self._starts[phase] = self._clock()
+
+    def end(self, phase):
+        """
+        Stop timing the phase. Returns the measured duration, in seconds
+        """
+        if not self.enabled:
+            return 0.0
+
+        start = self._starts.pop(phase, None)
+        if start is None:
+            return 0.0
+
+        duration = self._clock() - start
+        self.add(phase, duration)
+        return duration
+
+    def add(self, phase, duration):
+        if not self.enabled:
+            return
+
+        histogram = self._histograms.get(phase, None)
+        if histogram is None:
+            histogram = self._histograms[phase] = PhaseHistogram()
+            self._phases.append(phase)
+        histogram.add(duration)
+
+    def reset(self):
+        self._histograms = {}
+        self._phases = []
+        self._starts = {}
+
+    def summary(self):
+        """
+        Returns a dictionary with the statistics of each phase, in milliseconds,
+        with the phases in the order in which they were first recorded
+        """
+        summary = {}
+        for phase in self._phases:
+            histogram = self._histograms[phase]
+            phase_summary = {
+                'count': histogram.count,
+                'mean': round(1000 * histogram.total / histogram.count, 3),
+                'total': round(1000 * histogram.total, 1),
+            }
+            for percentile in PERCENTILES:
+                phase_summary['p{}'.format(percentile)] = round(1000 * histogram.percentile(percentile), 3)
+            phase_summary['max'] = round(1000 * histogram.max, 3)
+            summary[phase] = phase_summary
+
+        return summary
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Vectorized time to collision between the ego vehicle and its neighbors.
+
+Every neighbor is assumed to keep its current velocity. The relative motion
+is expressed in the ego frame, and the earliest time at which each neighbor
+box enters the ego box is computed for all the neighbors at once.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+from leaderboard.utils.zone_geometry import rotation_matrices
+
+DEFAULT_HORIZON = 3.0      # in seconds
+DEFAULT_MARGIN = 0.3       # in meters
+DEFAULT_BRAKE_TTC = 1.5    # in seconds
+
+
+def time_to_collision(offsets, velocities, half_sizes, horizon=DEFAULT_HORIZON):
+    """
+    Earliest time at which the moving points enter the boxes centered at the origin,
+    with the slab method. Returns an (N,) array, with inf when there is no conflict
+    within the horizon.
+
+    :param offsets: (N, 2) relative positions
+    :param velocities: (N, 2) relative velocities
+    :param half_sizes: (N, 2) half sizes of the boxes
+    """
+    offsets = np.asarray(offsets, dtype=np.float64).reshape(-1, 2)
+    velocities = np.asarray(velocities, dtype=np.float64).reshape(-1, 2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1.0 / velocities
+        t_low = (-half_sizes - offsets) * inverse
+        t_high = (half_sizes - offsets) * inverse
+
+    # Static axes are either always or never inside the slab
+    static = velocities == 0
+    inside = np.abs(offsets) < half_sizes
+    t_low = np.where(static, np.where(inside, -np.inf, np.inf), t_low)
+    t_high = np.where(static, np.inf, t_high)
+
+    t_enter = np.max(np.minimum(t_low, t_high), axis=1)
+    t_exit = np.min(np.maximum(t_low, t_high), axis=1)
+
+    ttc = np.maximum(t_enter, 0.0)
+    conflict = (t_enter <= t_exit) & (t_exit >= 0) & (ttc <= horizon)
+    return np.where(conflict, ttc, np.inf)
+
+
+class TimeToCollision(object):
+
+    """
+    Time to collision of the neighbors of the ego vehicle, computed once per tick.
+    """
+
+    def __init__(self, horizon=DEFAULT_HORIZON, margin=DEFAULT_MARGIN):
+        self.horizon = horizon
+        self.margin = margin
+
+    def compute(self, ego_state, ego_extent, positions, yaws, velocities, extents):
+        """
+        Returns an (N,) array with the time to collision of every neighbor.
+
+        :param ego_state: tuple with the ego (x, y) position, yaw (in degrees) and (x, y) velocity
+        :param ego_extent: (x, y) half extents of the ego bounding box
+        :param positions: (N, 2) positions of the neighbors
+        :param yaws: (N,) yaws of the neighbors, in degrees
+        :param velocities: (N, 2) velocities of the neighbors
+        :param extents: (N, 2) half extents of the neighbors bounding boxes
+        """
+        ego_position, ego_yaw, ego_velocity = ego_state
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        if not len(positions):
+            return np.empty(0)
+
+        # Move to the ego frame
+        axes = rotation_matrices([ego_yaw])[0]
+        offsets = (positions - ego_position) @ axes.T
+        relative_velocities = (np.asarray(velocities, dtype=np.float64).reshape(-1, 2) - ego_velocity) @ axes.T
+
+        # Minkowski sum of the ego box and the neighbor boxes, projected on the ego axes
+        relative_yaws = np.radians(np.asarray(yaws, dtype=np.float64) - ego_yaw)
+        cos = np.abs(np.cos(relative_yaws))
+        sin = np.abs(np.sin(relative_yaws))
+        extents = np.asarray(extents, dtype=np.float64).reshape(-1, 2)
+        half_sizes = np.stack([ego_extent[0] + cos * extents[:, 0] + sin * extents[:, 1],
+                               ego_extent[1] + sin * extents[:, 0] + cos * extents[:, 1]], axis=1) + self.margin
+
+        return time_to_collision(offsets, relative_velocities, half_sizes, self.horizon)
+
+
+class TTCBrakePolicy(object):
+
+    """
+    Braking policy based on the time to collision: brake when the earliest
+    predicted conflict is closer than brake_ttc seconds.
+    """
+
+    def __init__(self, brake_ttc=DEFAULT_BRAKE_TTC):
+        self.brake_ttc = brake_ttc
+
+    def should_brake(self, ttc):
+        return bool(len(ttc)) and float(np.min(ttc)) <= self.brake_ttc
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Oriented rectangle geometry of the areas around the ego vehicle.
+
+The rotation of every area is computed once per tick. Points and actor
+bounding boxes are then tested against all the areas at once, the boxes
+with the separating axis theorem, so no slopes (and no divisions by them)
+are involved.
+
+The safety brake uses boxes_in_zones(): an actor is close as soon as any
+part of its bounding box overlaps an area, boundaries included. This is an
+intended change from the previous check, which only tested the center of the
+actor, strictly inside slope based areas. Those areas weren't rectangles:
+their front and back edges had a slope of 1 / tan(yaw) instead of being
+perpendicular to the area, so they were skewed and reached behind the ego,
+and they were degenerate for yaws multiple of 90 degrees. A box of zero
+extent gives the same result as points_in_zones().
+"""
+
+from __future__ import print_function
+
+import numpy as np
+
+# Radius (in meters) around the ego vehicle in which actors are checked
+PROXIMITY_RADIUS = 50.0
+
+
+class ZoneShape(object):
+
+    """
+    Shape of one of the areas around the ego vehicle.
+
+    - angle: direction of the area with respect to the ego yaw, in degrees
+    - distance: length of the area, measured from the ego center
+    - width: half width of the area. If None, it is computed from the ego bounding box
+      extent as extent_scale[0] * extent.x + extent_scale[1] * extent.y
+    """
+
+    def __init__(self, name, angle, distance, width=None, extent_scale=(0.0, 1.0)):
+        self.name = name
+        self.angle = float(angle)
+        self.distance = float(distance)
+        self.width = width
+        self.extent_scale = extent_scale
+
+    def half_width(self, extent_x, extent_y):
+        if self.width is not None:
+            return float(self.width)
+        return self.extent_scale[0] * extent_x + self.extent_scale[1] * extent_y
+
+
+# Front, left and right areas used by the safety brake
+DEFAULT_ZONE_SHAPES = [
+    ZoneShape("front", 0.0, 10.0, extent_scale=(1.0, 0.0)),
+    ZoneShape("left", -90.0, 3.0, extent_scale=(0.0, 2.0)),
+    ZoneShape("right", 90.0, 3.0, extent_scale=(0.0, 2.0)),
+]
+
+
+def rotation_matrices(yaws):
+    """
+    Returns the (N, 2, 2) matrices whose rows are the forward and lateral unit
+    vectors of the given yaws (in degrees)
+    """
+    yaws = np.radians(np.asarray(yaws, dtype=np.float64))
+    cos = np.cos(yaws)
+    sin = np.sin(yaws)
+    return np.stack([np.stack([cos, sin], axis=-1),
+                     np.stack([-sin, cos], axis=-1)], axis=-2)
+
+
+class ZoneGeometry(object):
+
+    """
+    Oriented rectangles of the areas around the ego vehicle.
+
+    To use it:
+    1. Call update() once per tick with the ego vehicle pose
+    2. Call points_in_zones() or boxes_in_zones() with the actors of the tick
+    """
+
+    def __init__(self, shapes=None):
+        self._shapes = list(shapes) if shapes is not None else list(DEFAULT_ZONE_SHAPES)
+
+        zones = len(self._shapes)
+        self._axes = np.zeros((zones, 2, 2))
+        self._centers = np.zeros((zones, 2))
+        self._half_extents = np.zeros((zones, 2))
+
+    @property
+    def names(self):
+        return [shape.name for shape in self._shapes]
+
+    def update(self, ego_x, ego_y, yaw, extent_x, extent_y):
+        """
+        Compute the rectangles of all the areas for the current ego pose
+        """
+        angles = yaw + np.array([shape.angle for shape in self._shapes])
+        lengths = np.array([shape.distance for shape in self._shapes])
+        widths = np.array([shape.half_width(extent_x, extent_y) for shape in self._shapes])
+
+        self._axes = rotation_matrices(angles)
+        self._centers = np.array([ego_x, ego_y]) + self._axes[:, 0, :] * (lengths / 2)[:, np.newaxis]
+        self._half_extents = np.stack([lengths / 2, widths], axis=1)
+
+    def points_in_zones(self, points):
+        """
+        Returns an (N, Z) boolean array, True when the point is inside the area
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        offset = points[np.newaxis, :, :] - self._centers[:, np.newaxis, :]
+        local = np.einsum('zij,znj->zni', self._axes, offset)
+        inside = np.all(np.abs(local) <= self._half_extents[:, np.newaxis, :], axis=2)
+        return inside.T
+
+    def boxes_in_zones(self, centers, yaws, extents):
+        """
+        Returns an (N, Z) boolean array, True when the oriented box overlaps the area.
+
+        :param centers: (N, 2) array with the box centers
+        :param yaws: (N,) array with the box yaws, in degrees
+        :param extents: (N, 2) array with the box half extents
+        """
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        extents = np.asarray(extents, dtype=np.float64).reshape(-1, 2)
+        box_axes = rotation_matrices(yaws).reshape(-1, 2, 2)
+
+        # cross[z, n, i, j] is the dot product between the axis i of the area and the axis j of the box
+        cross = np.abs(np.einsum('zik,njk->znij', self._axes, box_axes))
+        offset = centers[np.newaxis, :, :] - self._centers[:, np.newaxis, :]
+        offset_zone = np.abs(np.einsum('zij,znj->zni', self._axes, offset))
+        offset_box = np.abs(np.einsum('nij,znj->zni', box_axes, offset))
+
+        zone_half = self._half_extents[:, np.newaxis, :]
+        box_half = extents[np.newaxis, :, :]
+
+        # Separating axes of the area and of the box
+        zone_separated = offset_zone > zone_half + np.einsum('znij,znj->zni', cross, box_half)
+        box_separated = offset_box > box_half + np.einsum('znij,zni->znj', cross, zone_half)
+
+        overlap = ~(np.any(zone_separated, axis=2) | np.any(box_separated, axis=2))
+        return overlap.T
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Benchmark of the proximity check done every tick by the ScenarioManager.
+
+Compares the per-actor Python loop against its vectorized version (ProximityZones),
+checking that both give the same result, for an increasing amount of actors.
+Both use the slope based areas the ScenarioManager used before the ZoneGeometry.
+Their differences with the oriented rectangles of the ZoneGeometry are pinned
+by tests/test_zone_geometry.py.
+No CARLA server is needed.
+"""
+
+from __future__ import print_function
+
+import argparse
+from argparse import RawTextHelpFormatter
+import math
+import timeit
+
+import numpy as np
+from tabulate import tabulate
+
+from leaderboard.utils.zone_geometry import PROXIMITY_RADIUS
+
+ZONE_NAMES = ["front", "left", "right"]
+ZONE_ANGLES = np.array([0.0, -90.0, 90.0])
+ZONE_DISTANCES = np.array([10.0, 3.0, 3.0])
+
+
+class ProximityZones(object):
+
+    """
+    Vectorized version of the slope based front, left and right areas of the ego vehicle,
+    used by the safety brake before the ZoneGeometry.
+
+    To use it:
+    1. Call update_area() once per tick with the ego vehicle pose
+    2. Call classify() or check() with the (N, 2) array of actor positions
+    """
+
+    def __init__(self, radius=PROXIMITY_RADIUS):
+        self._radius_sq = radius * radius
+
+        self._ego_xy = np.zeros(2)
+        self._slope = np.zeros(len(ZONE_NAMES))
+        self._interval_point = np.zeros((len(ZONE_NAMES), 2))
+        self._left_symmetry = np.zeros((len(ZONE_NAMES), 2))
+        self._right_symmetry = np.zeros((len(ZONE_NAMES), 2))
+
+    def update_area(self, ego_x, ego_y, yaw, extent_x, extent_y):
+        """
+        Compute the three areas for the current ego pose. The yaw is in degrees
+        and the extents are the ones of the ego bounding box.
+        """
+        width = np.array([extent_x, extent_y * 2, extent_y * 2])
+        angles = np.radians(yaw + ZONE_ANGLES)
+
+        self._ego_xy = np.array([ego_x, ego_y], dtype=np.float64)
+        self._slope = np.tan(angles)
+
+        self._interval_point = np.stack([ego_x + ZONE_DISTANCES * np.cos(angles),
+                                         ego_y + ZONE_DISTANCES * np.sin(angles)], axis=1)
+
+        norm = np.sqrt(1 / (self._slope ** 2 + 1))
+        offset = np.stack([-width * self._slope * norm, width * norm], axis=1)
+        self._left_symmetry = self._interval_point + offset
+        self._right_symmetry = self._interval_point - offset
+
+    def in_radius(self, positions):
+        """
+        Returns a boolean mask of the positions closer than the proximity radius
+        """
+        diff = positions - self._ego_xy
+        return np.einsum('ij,ij->i', diff, diff) < self._radius_sq
+
+    def classify(self, positions):
+        """
+        Classify an (N, 2) array of positions against the three areas.
+        Returns an (N, 3) boolean array, with one column per area (see ZONE_NAMES)
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        x = positions[:, 0][np.newaxis, :]
+        y = positions[:, 1][np.newaxis, :]
+
+        slope = self._slope[:, np.newaxis]
+        point = self._interval_point[:, :, np.newaxis]
+        left = self._left_symmetry[:, :, np.newaxis]
+        right = self._right_symmetry[:, :, np.newaxis]
+
+        # A null slope makes the front and back boundaries degenerate, so ignore those values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            front_diff = (x - point[:, 0]) / slope + point[:, 1] - y
+            back_diff = (x - self._ego_xy[0]) / slope + self._ego_xy[1] - y
+        left_diff = (x - left[:, 0]) * slope + left[:, 1] - y
+        right_diff = (x - right[:, 0]) * slope + right[:, 1] - y
+
+        inside = (front_diff * back_diff < 0) & (left_diff * right_diff < 0)
+        inside &= self.in_radius(positions)[np.newaxis, :]
+
+        return inside.T
+
+    def check(self, positions, type_ids):
+        """
+        Check all the actors at once.
+
+        :param positions: (N, 2) array with the x, y location of the actors
+        :param type_ids: sequence of N actor type ids, in the same order
+        :return: tuple with the brake flag and the list of the type ids inside the areas
+        """
+        if len(type_ids) == 0:
+            return False, []
+
+        hits = np.flatnonzero(self.classify(positions).any(axis=1))
+
+        close_actors = []
+        for index in hits:
+            if type_ids[index] not in close_actors:
+                close_actors.append(type_ids[index])
+
+        return len(hits) > 0, close_actors
+
+
+def legacy_check(ego, yaw, extent, positions, type_ids):
+    """
+    Per-actor implementation of the area check, as it was done in the ScenarioManager
+    """
+    angle = {"front": 0, "left": -90.0, "right": 90.0}
+    distance = {"front": 10.0, "left": 3.0, "right": 3.0}
+    width = {"front": extent[0], "left": extent[1] * 2, "right": extent[1] * 2}
+
+    interval_point = {}
+    right_symmetry = {}
+    left_symmetry = {}
+    slope = {}
+    for i in angle.keys():
+        slope[i] = math.tan(math.radians(yaw + angle[i]))
+        interval_point[i] = (ego[0] + distance[i] * math.cos(math.radians(yaw + angle[i])),
+                             ego[1] + distance[i] * math.sin(math.radians(yaw + angle[i])))
+        norm = math.sqrt(1 / (slope[i] ** 2 + 1))
+        left_symmetry[i] = (- width[i] * slope[i] * norm + interval_point[i][0], width[i] * norm + interval_point[i][1])
+        right_symmetry[i] = (width[i] * slope[i] * norm + interval_point[i][0], - width[i] * norm + interval_point[i][1])
+
+    brake_on = False
+    close_actors = []
+    for (x, y), type_id in zip(positions, type_ids):
+        if (ego[0] - x) ** 2 + (ego[1] - y) ** 2 < 2500:
+            for i in angle.keys():
+                front_diff = (x - interval_point[i][0]) / slope[i] + interval_point[i][1] - y
+                back_diff = (x - ego[0]) / slope[i] + ego[1] - y
+                left_diff = (x - left_symmetry[i][0]) * slope[i] + left_symmetry[i][1] - y
+                right_diff = (x - right_symmetry[i][0]) * slope[i] + right_symmetry[i][1] - y
+                if front_diff * back_diff < 0 and left_diff * right_diff < 0:
+                    brake_on = True
+                    if type_id not in close_actors:
+                        close_actors.append(type_id)
+
+    return brake_on, close_actors
+
+
+def vectorized_check(zones, ego, yaw, extent, positions, type_ids):
+    """
+    Same check, done with the ProximityZones
+    """
+    zones.update_area(ego[0], ego[1], yaw, extent[0], extent[1])
+    return zones.check(positions, type_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
+    parser.add_argument('--amounts', type=int, nargs='+', default=[10, 50, 100, 300, 1000, 5000],
+                        help='Amount of actors to test')
+    parser.add_argument('--repetitions', type=int, default=50, help='Number of calls timed per amount')
+    parser.add_argument('--spread', type=float, default=60.0,
+                        help='Half size (in meters) of the square in which the actors are placed')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(args.seed)
+    zones = ProximityZones()
+    extent = (2.45, 1.07)
+
+    results = [["Actors", "Loop (ms)", "Vectorized (ms)", "Speedup", "Same result"]]
+    for amount in args.amounts:
+        ego = tuple(rng.uniform(-100, 100, 2))
+        yaw = rng.uniform(-180, 180)
+        positions = np.asarray(ego) + rng.uniform(-args.spread, args.spread, (amount, 2))
+        type_ids = ["vehicle.{}".format(i % 20) if i % 4 else "walker.{}".format(i % 5) for i in range(amount)]
+        position_list = positions.tolist()
+
+        legacy_result = legacy_check(ego, yaw, extent, position_list, type_ids)
+        vectorized_result = vectorized_check(zones, ego, yaw, extent, positions, type_ids)
+
+        legacy_time = timeit.timeit(lambda: legacy_check(ego, yaw, extent, position_list, type_ids),
+                                    number=args.repetitions) / args.repetitions
+        vectorized_time = timeit.timeit(lambda: vectorized_check(zones, ego, yaw, extent, positions, type_ids),
+                                        number=args.repetitions) / args.repetitions
+
+        results.append([amount,
+                        "{:.3f}".format(legacy_time * 1000),
+                        "{:.3f}".format(vectorized_time * 1000),
+                        "{:.1f}x".format(legacy_time / vectorized_time),
+                        legacy_result == vectorized_result])
+
+    print(tabulate(results, headers="firstrow", tablefmt='fancy_grid'))
+
+
+if __name__ == '__main__':
+    main()
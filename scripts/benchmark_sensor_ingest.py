@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Benchmark of the ingest of the sensor data done by the sensor callbacks.
+
+Compares the copy of every reading into a new array (np.frombuffer followed by
+copy.deepcopy) against the preallocated RingBuffer, for a sensor suite of
+cameras and a LiDAR. The readings of a frame are kept by the 'agent' until
+the next frame, as the SensorInterface does. Reports the time, the bytes
+allocated per frame (tracemalloc) and the garbage collector activity.
+No CARLA server is needed, but Python 3.9 or newer is (tracemalloc.reset_peak).
+"""
+
+from __future__ import print_function
+
+import argparse
+from argparse import RawTextHelpFormatter
+import copy
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+from tabulate import tabulate
+
+from leaderboard.envs.sensor_ring import RingBuffer, points_per_frame
+
+
+class RawReading(object):
+    def __init__(self, raw_data, shape):
+        self.raw_data = raw_data
+        self.shape = shape
+
+
+def legacy_ingest(reading, dtype):
+    """
+    Copy of the reading as done by the CallBack, without preallocation
+    """
+    array = np.frombuffer(reading.raw_data, dtype=dtype)
+    array = copy.deepcopy(array)
+    return np.reshape(array, reading.shape), None
+
+
+def ring_ingest(reading, ring):
+    """
+    Copy of the reading into the next free slot of the ring
+    """
+    index, array = ring.write(reading.raw_data)
+    return array, lambda: ring.release(index)
+
+
+class GCMonitor(object):
+
+    """
+    Counts the garbage collections, and the time spent in them
+    """
+
+    def __init__(self):
+        self.collections = 0
+        self.time = 0.0
+        self._start = None
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.collections += 1
+            self.time += time.perf_counter() - self._start
+            self._start = None
+
+
+def run(readings, ingest, frames):
+    """
+    Ingest the readings for the given amount of frames. Returns the mean time per frame,
+    the mean bytes allocated per frame and the garbage collector monitor
+    """
+    monitor = GCMonitor()
+    gc.collect()
+    gc.callbacks.append(monitor)
+    tracemalloc.start()
+
+    held = []
+    allocated = 0
+    elapsed = 0.0
+    for _ in range(frames):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+
+        # The readings arrive while the agent still holds the ones of the previous frame
+        frame_arrays = []
+        frame_held = []
+        for reading, ingest_function in zip(readings, ingest):
+            array, release = ingest_function(reading)
+            frame_arrays.append(array)
+            if release is not None:
+                frame_held.append(release)
+        # The agent drops the arrays at the next get_data(), when the ring readings are released
+        frame_held.append(frame_arrays.clear)
+
+        for release in held:
+            release()
+        held = frame_held
+
+        elapsed += time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += max(peak - before, 0)
+
+    tracemalloc.stop()
+    gc.callbacks.remove(monitor)
+    return elapsed / frames, allocated / frames, monitor
+
+
+def main():
+    if not hasattr(tracemalloc, 'reset_peak'):
+        raise SystemExit("This benchmark needs Python 3.9 or newer (tracemalloc.reset_peak)")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
+    parser.add_argument('--cameras', type=int, default=4, help='Amount of cameras')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--lidar', action='store_true', help='Add a LiDAR to the sensor suite')
+    parser.add_argument('--frames', type=int, default=200, help='Amount of frames ingested')
+    parser.add_argument('--frame-rate', type=float, default=20.0)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    readings = []
+    dtypes = []
+    rings = []
+
+    image_shape = (args.height, args.width, 4)
+    for _ in range(args.cameras):
+        raw_data = rng.randint(0, 255, image_shape, dtype=np.uint8).tobytes()
+        readings.append(RawReading(raw_data, image_shape))
+        dtypes.append(np.uint8)
+        rings.append(RingBuffer(image_shape, np.uint8))
+
+    if args.lidar:
+        lidar_points = int(600000 / args.frame_rate)
+        raw_data = rng.uniform(-80, 80, (lidar_points, 4)).astype(np.float32).tobytes()
+        readings.append(RawReading(raw_data, (lidar_points, 4)))
+        dtypes.append(np.float32)
+        rings.append(RingBuffer((points_per_frame(600000, args.frame_rate), 4), np.float32))
+
+    legacy = [lambda reading, dtype=dtype: legacy_ingest(reading, dtype) for dtype in dtypes]
+    ring = [lambda reading, buffer=buffer: ring_ingest(reading, buffer) for buffer in rings]
+
+    results = [["Ingest", "Time / frame (ms)", "Allocated / frame (MB)", "GC collections", "GC time (ms)"]]
+    for name, ingest in (("deepcopy", legacy), ("ring buffer", ring)):
+        frame_time, allocated, monitor = run(readings, ingest, args.frames)
+        results.append([name,
+                        "{:.2f}".format(1000 * frame_time),
+                        "{:.3f}".format(allocated / 1e6),
+                        monitor.collections,
+                        "{:.2f}".format(1000 * monitor.time)])
+
+    print(tabulate(results, headers="firstrow", tablefmt='fancy_grid'))
+    print("Preallocated by the rings: {:.1f} MB".format(sum(buffer.nbytes for buffer in rings) / 1e6))
+
+
+if __name__ == '__main__':
+    main()
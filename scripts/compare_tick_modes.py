@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Comparison of two evaluations of the same routes, e.g. one with --tick-mode serial
+and the other one with --tick-mode pipelined.
+
+Lists the routes whose scores, infractions, status or game durations differ, while
+the wall time related meta data (duration_system, tick_profile, ...) is ignored.
+Returns a non zero exit code if any route differs.
+
+Both tick modes give the same scores by design (see leaderboard/utils/criteria_pipeline.py,
+tested by tests/test_criteria_pipeline.py). This script checks it end to end, on a real
+server. Differences can still come from the simulation itself, which isn't deterministic
+between two runs (e.g. with background traffic).
+"""
+
+from __future__ import print_function
+
+import argparse
+from argparse import RawTextHelpFormatter
+import sys
+
+from dictor import dictor
+from tabulate import tabulate
+
+from leaderboard.utils.checkpoint_tools import fetch_dict
+
+# Meta data that depends on the wall time, and not on the simulation
+WALL_TIME_META = ('duration_system', 'speed_ratio', 'tick_profile', 'sensor_decode', 'sensor_metrics',
+                  'sensor_setup_time')
+
+
+def comparable_record(record):
+    """
+    Part of a route record that has to be identical between both evaluations
+    """
+    meta = {key: value for key, value in record.get('meta', {}).items() if key not in WALL_TIME_META}
+    return {
+        'route_id': record.get('route_id'),
+        'index': record.get('index'),
+        'status': record.get('status'),
+        'infractions': record.get('infractions'),
+        'scores': record.get('scores'),
+        'meta': meta
+    }
+
+
+def compare_records(reference_records, candidate_records):
+    """
+    Returns the list of (route_id, key) pairs that differ between both lists of records
+    """
+    differences = []
+    if len(reference_records) != len(candidate_records):
+        differences.append(('-', 'amount of routes'))
+
+    for reference, candidate in zip(reference_records, candidate_records):
+        reference = comparable_record(reference)
+        candidate = comparable_record(candidate)
+        for key in reference:
+            if reference[key] != candidate[key]:
+                differences.append((reference['route_id'], key))
+
+    return differences
+
+
+def timing_table(reference_records, candidate_records):
+    rows = [["Route", "Reference (s)", "Candidate (s)", "Speedup"]]
+    for reference, candidate in zip(reference_records, candidate_records):
+        reference_time = dictor(reference, 'meta.duration_system', -1)
+        candidate_time = dictor(candidate, 'meta.duration_system', -1)
+        speedup = reference_time / candidate_time if candidate_time > 0 else float('nan')
+        rows.append([reference.get('route_id'), round(reference_time, 2), round(candidate_time, 2),
+                     "{:.2f}x".format(speedup)])
+
+    return tabulate(rows, headers="firstrow", tablefmt='fancy_grid')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
+    parser.add_argument('reference', help='Checkpoint of the reference evaluation (e.g. serial)')
+    parser.add_argument('candidate', help='Checkpoint of the evaluation to check (e.g. pipelined)')
+    args = parser.parse_args()
+
+    reference_records = dictor(fetch_dict(args.reference), '_checkpoint.records', [])
+    candidate_records = dictor(fetch_dict(args.candidate), '_checkpoint.records', [])
+
+    if not reference_records:
+        print('[Error] No route records found in [{}].'.format(args.reference))
+        return -1
+
+    print(timing_table(reference_records, candidate_records))
+
+    differences = compare_records(reference_records, candidate_records)
+    if differences:
+        print(tabulate(differences, headers=["Route", "Differs in"], tablefmt='fancy_grid'))
+        print('[Error] The evaluations are not identical.')
+        return 1
+
+    print('Both evaluations are identical ({} routes).'.format(len(reference_records)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
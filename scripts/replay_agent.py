@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Replay of sensor recordings (made with --record-sensors) through an agent, without CARLA.
+
+The agent receives the recorded frames as fast as it can process them.
+Reports its throughput, the latency percentiles of its calls and how much its
+controls differ from the recorded ones. Returns a non zero exit code if any
+control differs more than --max-control-diff, so it can be used as a
+regression test of the agent.
+"""
+
+from __future__ import print_function
+
+import argparse
+from argparse import RawTextHelpFormatter
+import importlib
+import os
+import sys
+
+from tabulate import tabulate
+
+from leaderboard.envs.sensor_recorder import SensorRecording
+from leaderboard.envs.sensor_replay import replay_agent, COMPARED_CONTROLS
+
+
+def load_agent(agent_path, agent_config):
+    """
+    Create the agent, as done by the leaderboard evaluator
+    """
+    module_name = os.path.basename(agent_path).split('.')[0]
+    sys.path.insert(0, os.path.dirname(agent_path))
+    module_agent = importlib.import_module(module_name)
+    return getattr(module_agent, module_agent.get_entry_point())(agent_config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
+    parser.add_argument('recordings', nargs='+', help='Directories of the recordings to replay')
+    parser.add_argument("-a", "--agent", type=str, help="Path to Agent's py file", required=True)
+    parser.add_argument("--agent-config", type=str, help="Path to Agent's configuration file", default="")
+    parser.add_argument('--frames', type=int, default=None, help='Maximum amount of frames replayed per recording')
+    parser.add_argument('--max-control-diff', type=float, default=None,
+                        help='Fail if a control differs more than this from the recorded one')
+    args = parser.parse_args()
+
+    header = ['Recording', 'Frames', 'FPS', 'Mean (ms)', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'Max (ms)']
+    header += ['Max {} diff'.format(field) for field in COMPARED_CONTROLS]
+    table = [header]
+
+    failed = False
+    for path in args.recordings:
+        agent = load_agent(args.agent, args.agent_config)
+        try:
+            results = replay_agent(agent, SensorRecording(path), args.frames)
+        finally:
+            agent.destroy()
+
+        max_diffs = [results['{}_max_diff'.format(field)] for field in COMPARED_CONTROLS]
+        table.append([os.path.basename(os.path.normpath(path)), results['frames'], results['throughput'],
+                      results['latency_mean'], results['latency_p50'], results['latency_p95'],
+                      results['latency_p99'], results['latency_max']] + max_diffs)
+
+        if args.max_control_diff is not None and max(max_diffs) > args.max_control_diff:
+            failed = True
+
+    print(tabulate(table, headers="firstrow", tablefmt='fancy_grid'))
+
+    if failed:
+        print("The controls differ more than {} from the recorded ones".format(args.max_control_diff))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@ import json
 import math
 from argparse import RawTextHelpFormatter
 from leaderboard.utils.checkpoint_tools import fetch_dict
+from leaderboard.utils.debug_overlay import DebugOverlay
 import carla
 import os
 
@@ -19,7 +20,7 @@ SCENARIO_COLOR = {
     "Scenario10": [carla.Color(100, 100, 100), "Gray"]   # Gray
 }
 
-def apart_enough(world, _waypoint, scenario_waypoint):
+def apart_enough(overlay, _waypoint, scenario_waypoint):
     """
     Uses the same condition as in route_scenario to see if they will
     be differentiated
@@ -36,11 +37,11 @@ def apart_enough(world, _waypoint, scenario_waypoint):
 
     if distance < TRIGGER_THRESHOLD and dist_angle < TRIGGER_ANGLE_THRESHOLD:
     # if distance < TRIGGER_THRESHOLD:
-        world.debug.draw_point(scenario_waypoint.transform.location + carla.Location(z=1),
-                               size=float(0.15), color=carla.Color(255, 0, 0))
+        overlay.draw_point(scenario_waypoint.transform.location + carla.Location(z=1),
+                           size=float(0.15), color=carla.Color(255, 0, 0))
     else:
-        world.debug.draw_point(scenario_waypoint.transform.location + carla.Location(z=1),
-                               size=float(0.15), color=carla.Color(0, 255, 0))
+        overlay.draw_point(scenario_waypoint.transform.location + carla.Location(z=1),
+                           size=float(0.15), color=carla.Color(0, 255, 0))
 
 def save_from_wp(endpoint, wp):
     """
@@ -80,7 +81,7 @@ def save_from_dict(endpoint, wp):
         entry["other_actors"] = {}
         json.dump(entry, fd, indent=4)
 
-def draw_scenarios(world, scenarios, args):
+def draw_scenarios(world, overlay, scenarios, args):
     """
     Draws all the points related to args.scenarios
     """
@@ -97,19 +98,21 @@ def draw_scenarios(world, scenarios, args):
             location = carla.Location(float(_waypoint["x"]), float(_waypoint["y"]), float(_waypoint["z"]))
 
             scenario_location = location + carla.Location(z=number / z)
-            world.debug.draw_point(scenario_location, size=float(0.15), color=color)
-            world.debug.draw_string(scenario_location + carla.Location(z=0.1), text=str(i+1), color=carla.Color(0, 0, 0), life_time=1000)
+            overlay.draw_point(scenario_location, size=float(0.15), color=color)
+            overlay.draw_string(scenario_location + carla.Location(z=0.1), text=str(i+1), color=carla.Color(0, 0, 0), life_time=1000)
 
             if args.debug:
+                overlay.flush()
                 save_from_dict(args.endpoint, _waypoint)
                 spectator = world.get_spectator()
                 spectator.set_transform(carla.Transform(location + carla.Location(z=50),
                                                             carla.Rotation(pitch=-90)))
                 print(" Scenario [{}/{}]. Press Enter for the next scenario".format(i+1, len(event_list)))
                 input()
+        overlay.flush()
         world.wait_for_tick()
 
-def modify_junction_scenarios(world, scenarios, args):
+def modify_junction_scenarios(world, overlay, scenarios, args):
     """
     Used to move scenario trigger points:
         1) a certain distance to the front (follows the lane)
@@ -124,8 +127,8 @@ def modify_junction_scenarios(world, scenarios, args):
             _waypoint = event['transform']  # trigger point of this scenario
             location = carla.Location(float(_waypoint["x"]), float(_waypoint["y"]), float(_waypoint["z"]))
             rotation = carla.Rotation(float(0), float(_waypoint["pitch"]), float(_waypoint["yaw"]))
-            world.debug.draw_point(location, size=float(0.15), color=carla.Color(0, 255, 255))
-            world.debug.draw_string(location + carla.Location(x=1), text=str(i+1), color=carla.Color(0, 0, 0))
+            overlay.draw_point(location, size=float(0.15), color=carla.Color(0, 255, 255))
+            overlay.draw_string(location + carla.Location(x=1), text=str(i+1), color=carla.Color(0, 0, 0))
 
             # # Case 1)
             # DISTANCE = 10
@@ -140,7 +143,8 @@ def modify_junction_scenarios(world, scenarios, args):
             scenario_waypoint = world.get_map().get_waypoint(new_location)
 
             # Drawing and waiting for input
-            apart_enough(world, _waypoint, scenario_waypoint)
+            apart_enough(overlay, _waypoint, scenario_waypoint)
+            overlay.flush()
             save_from_wp(args.endpoint, scenario_waypoint)
 
             spectator = world.get_spectator()
@@ -201,12 +205,13 @@ def main():
         new_args_scenario.append("Scenario" + ar_sc)
     args.scenarios = new_args_scenario
 
+    overlay = DebugOverlay(world)
     for scenarios in town_data:
 
         if args.modify:
-            modify_junction_scenarios(world, scenarios, args)
+            modify_junction_scenarios(world, overlay, scenarios, args)
         else:
-            draw_scenarios(world, scenarios, args)
+            draw_scenarios(world, overlay, scenarios, args)
 
     print(" ---------------------------- ")
     for ar_sc in args.scenarios:
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Tests of the actor registry, fed with fake world snapshots
+"""
+
+import unittest
+from collections import namedtuple
+
+import numpy as np
+
+from leaderboard.utils.actor_registry import ActorRegistry, RECONCILE_PERIOD
+
+Vector = namedtuple('Vector', ['x', 'y', 'z'])
+Rotation = namedtuple('Rotation', ['pitch', 'yaw', 'roll'])
+Transform = namedtuple('Transform', ['location', 'rotation'])
+BoundingBox = namedtuple('BoundingBox', ['extent'])
+
+
+class FakeActor(object):
+
+    """
+    Stand-in of both the carla.Actor and the carla.ActorSnapshot
+    """
+
+    def __init__(self, actor_id, type_id, x=0.0, y=0.0, yaw=0.0, speed=0.0):
+        self.id = actor_id
+        self.type_id = type_id
+        self.bounding_box = BoundingBox(Vector(2.0, 1.0, 0.5))
+        self._transform = Transform(Vector(x, y, 0.0), Rotation(0.0, yaw, 0.0))
+        self._velocity = Vector(speed, 0.0, 0.0)
+
+    def get_transform(self):
+        return self._transform
+
+    def get_velocity(self):
+        return self._velocity
+
+
+class FakeSnapshot(list):
+
+    def __init__(self, frame, actors):
+        super(FakeSnapshot, self).__init__(actors)
+        self.frame = frame
+
+
+class FakeWorld(object):
+
+    def __init__(self, actors):
+        self.actors = {actor.id: actor for actor in actors}
+        self.requests = 0
+
+    def get_actors(self):
+        self.requests += 1
+        return list(self.actors.values())
+
+    def snapshot(self, frame):
+        return FakeSnapshot(frame, self.actors.values())
+
+
+class FakeDataProvider(object):
+
+    """
+    Spawn and destroy paths of the CarlaDataProvider, over a fake world
+    """
+
+    world = None
+    pool = {}
+
+    @staticmethod
+    def register_actor(actor):
+        FakeDataProvider.pool[actor.id] = actor
+
+    @staticmethod
+    def request_new_actor(actor):
+        FakeDataProvider.world.actors[actor.id] = actor
+        FakeDataProvider.register_actor(actor)
+        return actor
+
+    @staticmethod
+    def remove_actor_by_id(actor_id):
+        del FakeDataProvider.world.actors[actor_id]
+        del FakeDataProvider.pool[actor_id]
+
+    @staticmethod
+    def remove_actors_in_surrounding(location, distance):
+        for actor_id, actor in list(FakeDataProvider.pool.items()):
+            if abs(actor.get_transform().location.x - location) < distance:
+                del FakeDataProvider.world.actors[actor_id]
+                del FakeDataProvider.pool[actor_id]
+
+    @staticmethod
+    def get_actors():
+        return iter(FakeDataProvider.pool.items())
+
+
+class TestActorRegistry(unittest.TestCase):
+
+    def setUp(self):
+        ActorRegistry.cleanup()
+        self.ego = FakeActor(1, 'vehicle.lincoln.mkz2017', speed=5.0)
+        self.walker = FakeActor(2, 'walker.pedestrian.0001', x=10.0, yaw=90.0)
+        self.light = FakeActor(3, 'traffic.traffic_light', x=5.0)
+        self.world = FakeWorld([self.ego, self.walker, self.light])
+
+    def tearDown(self):
+        ActorRegistry.cleanup()
+
+    def test_frame_state(self):
+        ActorRegistry.on_carla_tick(self.world, self.world.snapshot(7))
+
+        # The first tick reconciles
+        self.assertEqual(self.world.requests, 1)
+
+        frame_state = ActorRegistry.get_frame_state()
+        self.assertEqual(frame_state.frame, 7)
+        self.assertEqual(len(frame_state), 3)
+
+        position, rotation, velocity = ActorRegistry.get_state(self.walker.id)
+        np.testing.assert_allclose(position, [10.0, 0.0, 0.0])
+        self.assertEqual(rotation[1], 90.0)
+        np.testing.assert_allclose(ActorRegistry.get_state(self.ego.id)[2], [5.0, 0.0, 0.0])
+
+        self.assertEqual(ActorRegistry.get_type_id(self.light.id), 'traffic.traffic_light')
+        self.assertEqual(ActorRegistry.get_extent(self.ego.id), (2.0, 1.0))
+        self.assertIs(ActorRegistry.get_actor(self.walker.id), self.walker)
+        self.assertEqual([actor.id for actor in ActorRegistry.get_walkers()], [2])
+
+    def test_frame_is_read_only(self):
+        ActorRegistry.on_carla_tick(self.world, self.world.snapshot(1))
+        frame_state = ActorRegistry.get_frame_state()
+
+        self.assertEqual(frame_state.mask('vehicle.').tolist(), [True, False, False])
+        self.assertIs(frame_state.mask('walker.'), frame_state.mask('walker.'))
+        self.assertEqual(frame_state.mask('traffic.traffic_light').tolist(), [False, False, True])
+
+        for array in (frame_state.positions, frame_state.velocities, frame_state.mask('vehicle.')):
+            with self.assertRaises(ValueError):
+                array[0] = 0
+
+    def test_grid_has_only_the_traffic(self):
+        ActorRegistry.on_carla_tick(self.world, self.world.snapshot(1))
+
+        ids = ActorRegistry.get_actors_in_radius(0.0, 0.0, 20.0)
+        self.assertEqual(sorted(ids.tolist()), [1, 2])
+
+    def test_data_provider_hooks(self):
+        FakeDataProvider.world = FakeWorld([self.light])
+        FakeDataProvider.pool = {}
+        ActorRegistry.track_data_provider(FakeDataProvider)
+        ActorRegistry.track_data_provider(FakeDataProvider)
+        ActorRegistry.on_carla_tick(FakeDataProvider.world, FakeDataProvider.world.snapshot(1))
+
+        FakeDataProvider.request_new_actor(self.ego)
+        FakeDataProvider.request_new_actor(self.walker)
+        self.assertEqual([actor.id for actor in ActorRegistry.get_vehicles()], [1])
+        self.assertEqual([actor.id for actor in ActorRegistry.get_walkers()], [2])
+
+        ActorRegistry.on_carla_tick(FakeDataProvider.world, FakeDataProvider.world.snapshot(2))
+        self.assertEqual(sorted(ActorRegistry.get_actors_in_radius(0.0, 0.0, 20.0).tolist()), [1, 2])
+
+        FakeDataProvider.remove_actors_in_surrounding(10.0, 1.0)
+        self.assertEqual(ActorRegistry.get_walkers(), [])
+        FakeDataProvider.remove_actor_by_id(self.ego.id)
+        self.assertIsNone(ActorRegistry.get_actor(self.ego.id))
+
+        # Only the first tick requested the actors to the server
+        self.assertEqual(FakeDataProvider.world.requests, 1)
+
+    def test_periodic_reconcile(self):
+        ActorRegistry.on_carla_tick(self.world, self.world.snapshot(1))
+        del self.world.actors[self.walker.id]
+        other = FakeActor(4, 'vehicle.audi.tt', x=3.0)
+        self.world.actors[other.id] = other
+
+        ActorRegistry.on_carla_tick(self.world, self.world.snapshot(2))
+        self.assertIs(ActorRegistry.get_actor(self.walker.id), self.walker)
+        self.assertIsNone(ActorRegistry.get_state(self.walker.id))
+        self.assertEqual(ActorRegistry.get_type_id(other.id), '')
+
+        for frame in range(3, RECONCILE_PERIOD + 2):
+            ActorRegistry.on_carla_tick(self.world, self.world.snapshot(frame))
+
+        self.assertEqual(self.world.requests, 2)
+        self.assertIsNone(ActorRegistry.get_actor(self.walker.id))
+        self.assertEqual(ActorRegistry.get_type_id(other.id), 'vehicle.audi.tt')
+        self.assertEqual(sorted(ActorRegistry.get_actors_in_radius(0.0, 0.0, 20.0).tolist()), [1, 4])
+
+    def test_cleanup(self):
+        ActorRegistry.on_carla_tick(self.world, self.world.snapshot(1))
+        ActorRegistry.cleanup()
+
+        self.assertIsNone(ActorRegistry.get_frame_state())
+        self.assertIsNone(ActorRegistry.get_state(self.ego.id))
+        self.assertEqual(ActorRegistry.get_vehicles(), [])
+        self.assertEqual(len(ActorRegistry.get_grid()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Tests of the serial and pipelined tick modes, which must give the same statistics
+"""
+
+import threading
+import time
+import unittest
+import weakref
+
+try:
+    import py_trees
+except ImportError:
+    py_trees = None
+
+from leaderboard.utils.criteria_pipeline import CriteriaEventBuffer, CriteriaPipeline
+
+ROUTE_LENGTH = 40  # in frames
+COLLISION_FRAMES = (5, 17)
+LATE_COLLISION_FRAMES = (9, 23)  # received during the agent step, possibly while the criteria are ticked
+CRITERIA_TIME = 0.005  # in seconds
+
+
+class FakeEvent(object):
+
+    def __init__(self, frame):
+        self.frame = frame
+
+
+class FakeSensor(object):
+
+    """
+    Sensor calling its listener from another thread, as the CARLA listener threads do
+    """
+
+    def __init__(self):
+        self._callback = None
+
+    def listen(self, callback):
+        self._callback = callback
+
+    def stop(self):
+        self._callback = None
+
+    def fire(self, event, delay=0.0):
+        def send():
+            time.sleep(delay)
+            if self._callback is not None:
+                self._callback(event)
+
+        thread = threading.Thread(target=send)
+        thread.start()
+        return thread
+
+
+class FakeSimulation(object):
+
+    """
+    State read by the criteria, which only changes with world_tick()
+    """
+
+    def __init__(self):
+        self.frame = 1
+        self.ego_x = 0.0
+        self.light_red = False
+        self.collision_sensor = FakeSensor()
+        self._late_events = []
+
+    def agent_step(self):
+        if self.frame in LATE_COLLISION_FRAMES:
+            self._late_events.append(self.collision_sensor.fire(FakeEvent(self.frame), delay=CRITERIA_TIME / 2))
+        time.sleep(CRITERIA_TIME)
+
+    def world_tick(self):
+        # The events sent during the agent step are received before the end of the tick
+        self.join()
+        self.frame += 1
+        self.ego_x += 1.0
+        self.light_red = (self.frame // 7) % 2 == 1
+        if self.frame in COLLISION_FRAMES:
+            self.collision_sensor.fire(FakeEvent(self.frame)).join()
+
+    def join(self):
+        for thread in self._late_events:
+            thread.join()
+        self._late_events = []
+
+
+if py_trees is not None:
+
+    class FakeCriterion(py_trees.behaviour.Behaviour):
+
+        """
+        Criterion with the result fields of the scenario_runner ones
+        """
+
+        def __init__(self, name, simulation, terminate_on_failure=False):
+            super(FakeCriterion, self).__init__(name)
+            self.simulation = simulation
+            self.actual_value = 0
+            self.test_status = "RUNNING"
+            self.list_traffic_events = []
+            self.terminate_status = None
+            self.threads = set()
+            self._terminate_on_failure = terminate_on_failure
+
+        def update(self):
+            self.threads.add(threading.current_thread().name)
+            return py_trees.common.Status.RUNNING
+
+        def terminate(self, new_status):
+            self.terminate_status = new_status
+
+        def statistics(self):
+            return (self.actual_value, self.test_status, list(self.list_traffic_events),
+                    self.status, self.terminate_status)
+
+    class FakeCollisionTest(FakeCriterion):
+
+        def __init__(self, simulation):
+            super(FakeCollisionTest, self).__init__("CollisionTest", simulation)
+            self._collision_sensor = simulation.collision_sensor
+            self._collision_sensor.listen(lambda event: self._count_collisions(weakref.ref(self), event))
+            self._updates = 0
+
+        @staticmethod
+        def _count_collisions(weak_self, event):
+            self = weak_self()
+            self.actual_value += 1
+            self.test_status = "FAILURE"
+            # As the one of scenario_runner, the result depends on the updates already done
+            self.list_traffic_events.append(('collision', event.frame, self.simulation.ego_x, self._updates))
+
+        def update(self):
+            self._updates += 1
+            # Long enough for the late collisions to be received while ticking
+            time.sleep(CRITERIA_TIME)
+            return super(FakeCollisionTest, self).update()
+
+    class FakeRedLightTest(FakeCriterion):
+
+        def __init__(self, simulation):
+            super(FakeRedLightTest, self).__init__("RunningRedLightTest", simulation)
+
+        def update(self):
+            if self.simulation.light_red and int(self.simulation.ego_x) % 5 == 0:
+                self.actual_value += 1
+                self.list_traffic_events.append(('red_light', self.simulation.frame, self.simulation.ego_x))
+            return super(FakeRedLightTest, self).update()
+
+    class FakeRouteCompletionTest(FakeCriterion):
+
+        def __init__(self, simulation):
+            super(FakeRouteCompletionTest, self).__init__("RouteCompletionTest", simulation)
+
+        def update(self):
+            self.actual_value = 100.0 * self.simulation.ego_x / ROUTE_LENGTH
+            return super(FakeRouteCompletionTest, self).update()
+
+    class FakeBlockedTest(FakeCriterion):
+
+        def __init__(self, simulation, blocked_frame):
+            super(FakeBlockedTest, self).__init__("AgentBlockedTest", simulation, terminate_on_failure=True)
+            self._blocked_frame = blocked_frame
+
+        def update(self):
+            super(FakeBlockedTest, self).update()
+            if self._blocked_frame is not None and self.simulation.frame >= self._blocked_frame:
+                self.test_status = "FAILURE"
+                self.list_traffic_events.append(('blocked', self.simulation.frame, self.simulation.ego_x))
+                return py_trees.common.Status.FAILURE
+            return py_trees.common.Status.RUNNING
+
+    class FakeRouteBehavior(py_trees.behaviour.Behaviour):
+
+        def __init__(self, simulation):
+            super(FakeRouteBehavior, self).__init__("Route")
+            self.simulation = simulation
+
+        def update(self):
+            if self.simulation.ego_x >= ROUTE_LENGTH:
+                return py_trees.common.Status.SUCCESS
+            return py_trees.common.Status.RUNNING
+
+
+def run_route(pipelined, blocked_frame=None):
+    """
+    Runs a route in the order of ScenarioManager._tick_scenario, and returns its statistics
+    """
+    simulation = FakeSimulation()
+    criteria = [FakeRouteCompletionTest(simulation), FakeCollisionTest(simulation),
+                FakeRedLightTest(simulation), FakeBlockedTest(simulation, blocked_frame)]
+
+    criteria_tree = py_trees.composites.Parallel("Test Criteria", policy=py_trees.common.ParallelPolicy.SUCCESS_ON_ALL)
+    criteria_tree.add_children(criteria)
+    scenario_tree = py_trees.composites.Parallel("Scenario", policy=py_trees.common.ParallelPolicy.SUCCESS_ON_ONE)
+    scenario_tree.add_children([FakeRouteBehavior(simulation), criteria_tree])
+
+    pipeline = CriteriaPipeline(pipelined)
+    pipeline.load(scenario_tree, criteria_tree, criteria)
+    try:
+        while True:
+            pipeline.begin_frame(simulation.frame)
+            pipeline.start()
+            simulation.agent_step()
+            pipeline.wait()
+            if pipeline.tick() != py_trees.common.Status.RUNNING:
+                break
+            simulation.world_tick()
+    finally:
+        pipeline.shutdown()
+        simulation.join()
+
+    statistics = {criterion.name: criterion.statistics() for criterion in criteria}
+    statistics['route'] = (simulation.frame, scenario_tree.status, criteria_tree.status)
+    threads = set().union(*[criterion.threads for criterion in criteria])
+    return statistics, threads
+
+
+@unittest.skipIf(py_trees is None, "py_trees is not installed")
+class TestCriteriaPipeline(unittest.TestCase):
+
+    def test_route_completed(self):
+        serial, serial_threads = run_route(pipelined=False)
+        pipelined, pipelined_threads = run_route(pipelined=True)
+
+        self.assertEqual(serial, pipelined)
+        self.assertEqual(serial_threads, {threading.current_thread().name})
+        self.assertNotIn(threading.current_thread().name, pipelined_threads)
+
+        # The late collisions are handled at the start of the next frame
+        self.assertEqual(serial['CollisionTest'][0], 4)
+        self.assertEqual([event[1] for event in serial['CollisionTest'][2]], [5, 9, 17, 23])
+        self.assertEqual(serial['RouteCompletionTest'][0], 100.0)
+        self.assertEqual(serial['route'][1], py_trees.common.Status.SUCCESS)
+
+        # The criteria still running when the route ends are stopped, in both modes
+        self.assertEqual(serial['RunningRedLightTest'][4], py_trees.common.Status.INVALID)
+
+    def test_route_failed_by_a_criterion(self):
+        serial, _ = run_route(pipelined=False, blocked_frame=20)
+        pipelined, _ = run_route(pipelined=True, blocked_frame=20)
+
+        self.assertEqual(serial, pipelined)
+        self.assertEqual(serial['route'][:2], (20, py_trees.common.Status.FAILURE))
+        self.assertEqual(serial['AgentBlockedTest'][4], py_trees.common.Status.FAILURE)
+
+    def test_criteria_errors_are_raised(self):
+        simulation = FakeSimulation()
+        criterion = FakeCriterion("Broken", simulation)
+        criterion.update = lambda: 1 / 0
+        criteria_tree = py_trees.composites.Parallel("Test Criteria")
+        criteria_tree.add_child(criterion)
+
+        pipeline = CriteriaPipeline(pipelined=True)
+        pipeline.load(criteria_tree, criteria_tree, [criterion])
+        pipeline.start()
+        with self.assertRaises(ZeroDivisionError):
+            pipeline.wait()
+        pipeline.shutdown()
+
+
+class TestCriteriaEventBuffer(unittest.TestCase):
+
+    class Criterion(object):
+
+        def __init__(self):
+            self.events = []
+            self._collision_sensor = FakeSensor()
+
+        @staticmethod
+        def _count_collisions(weak_self, event):
+            weak_self().events.append(event.frame)
+
+    def test_events_wait_for_their_frame(self):
+        criterion = self.Criterion()
+        events = CriteriaEventBuffer([criterion])
+
+        for frame in (3, 1, 2, 3):
+            criterion._collision_sensor.fire(FakeEvent(frame)).join()
+        self.assertEqual(criterion.events, [])
+        self.assertEqual(len(events), 4)
+
+        events.deliver(2)
+        self.assertEqual(criterion.events, [1, 2])
+        events.deliver(3)
+        self.assertEqual(criterion.events, [1, 2, 3, 3])
+        self.assertEqual(len(events), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Tests of the drawing rate and the flush of the debug overlay
+"""
+
+import unittest
+
+from leaderboard.utils.debug_overlay import DebugOverlay
+
+
+class FakeDebugHelper(object):
+
+    """
+    Records the draw calls, as the world.debug of CARLA would receive them
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        if not name.startswith('draw_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.calls.append(name)
+
+
+class FakeWorld(object):
+
+    def __init__(self):
+        self.debug = FakeDebugHelper()
+
+
+class TestDebugOverlay(unittest.TestCase):
+
+    def setUp(self):
+        self.world = FakeWorld()
+
+    def draw_frame(self, overlay, frame):
+        overlay.begin_frame(frame)
+        overlay.draw_point('location')
+        overlay.draw_string('location', 'text')
+        overlay.draw_line('begin', 'end')
+        overlay.flush()
+
+    def test_one_draw_call_per_primitive(self):
+        overlay = DebugOverlay(self.world)
+        self.draw_frame(overlay, 0)
+        self.assertEqual(self.world.debug.calls, ['draw_point', 'draw_string', 'draw_line'])
+
+        overlay.flush()
+        self.assertEqual(len(self.world.debug.calls), 3)
+
+    def test_rate(self):
+        overlay = DebugOverlay(self.world, rate=3, frame_delta=0.05)
+        for frame in range(6):
+            self.draw_frame(overlay, frame)
+
+        # Only frames 0 and 3 are drawn
+        self.assertEqual(len(self.world.debug.calls), 6)
+        self.assertAlmostEqual(overlay.frame_life_time(0.006), 0.106)
+
+    def test_disable(self):
+        overlay = DebugOverlay(self.world)
+        overlay.begin_frame(0)
+        overlay.draw_point('location')
+        overlay.disable()
+        overlay.flush()
+        self.draw_frame(overlay, 1)
+
+        self.assertFalse(overlay.enabled)
+        self.assertEqual(self.world.debug.calls, [])
+
+    def test_static_drawings(self):
+        # The drawings of the route are done once, whatever the rate, unless the overlay is disabled
+        overlay = DebugOverlay(rate=3)
+        overlay.begin_frame(1)
+        overlay.begin_static(self.world)
+        overlay.draw_point('location')
+        overlay.flush()
+        self.assertEqual(self.world.debug.calls, ['draw_point'])
+
+        overlay.set_rate(0)
+        overlay.begin_static(self.world)
+        overlay.draw_point('location')
+        overlay.flush()
+        self.assertEqual(len(self.world.debug.calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
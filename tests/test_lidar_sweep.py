@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Tests of the accumulation of the LiDAR packets into sweeps
+"""
+
+import unittest
+
+import numpy as np
+
+from leaderboard.envs.lidar_sweep import LidarSweepAccumulator
+
+
+def packet(frame, rows=3):
+    """
+    Packet whose points all have the frame as coordinates
+    """
+    return np.full((rows, 4), frame, dtype=np.float32).tobytes()
+
+
+def frames_of(reading):
+    return [int(frame) for frame in np.unique(reading[:, 0])] if len(reading) else []
+
+
+class TestLidarSweepAccumulator(unittest.TestCase):
+
+    def test_full_sweeps_aligned_to_the_rotations(self):
+        sweep = LidarSweepAccumulator(4, 2)
+
+        readings = [frames_of(sweep.add(packet(frame), frame)[1]) for frame in range(10, 16)]
+        self.assertEqual(readings, [[], [10, 11], [10, 11], [12, 13], [12, 13], [14, 15]])
+
+    def test_full_sweeps_in_frame_order(self):
+        sweep = LidarSweepAccumulator(4, 3)
+
+        for frame in (10, 12):
+            self.assertEqual(len(sweep.add(packet(frame), frame)[1]), 0)
+        _, reading = sweep.add(packet(11), 11)
+        np.testing.assert_array_equal(reading[:, 0], [10] * 3 + [11] * 3 + [12] * 3)
+
+        # The sweep only changes once the next rotation is complete. Packets before the first one are dropped
+        for frame in (14, 13, 9):
+            self.assertEqual(frames_of(sweep.add(packet(frame), frame)[1]), [10, 11, 12])
+        self.assertEqual(frames_of(sweep.add(packet(15), 15)[1]), [13, 14, 15])
+
+    def test_full_sweeps_with_a_period(self):
+        sweep = LidarSweepAccumulator(4, 2, frame_step=3)
+
+        readings = [frames_of(sweep.add(packet(frame), frame)[1]) for frame in (1, 4, 7, 10)]
+        self.assertEqual(readings, [[], [1, 4], [1, 4], [7, 10]])
+
+    def test_window_of_points_in_frame_order(self):
+        sweep = LidarSweepAccumulator(4, 2, points=5)
+
+        self.assertEqual(len(sweep.add(packet(2), 2)[1]), 3)
+        _, reading = sweep.add(packet(1), 1)
+        np.testing.assert_array_equal(reading[:, 0], [1, 1, 2, 2, 2])
+
+        _, reading = sweep.add(packet(3), 3)
+        np.testing.assert_array_equal(reading[:, 0], [2, 2, 3, 3, 3])
+
+    def test_zero_copy(self):
+        sweep = LidarSweepAccumulator(4, 2, zero_copy=True)
+
+        index, reading = sweep.add(packet(0), 0)
+        self.assertEqual(len(reading), 0)
+        sweep.release(index)
+
+        index, reading = sweep.add(packet(1), 1)
+        self.assertEqual(frames_of(reading), [0, 1])
+        self.assertFalse(reading.flags.writeable)
+        sweep.release(index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Tests of the ordering and the lifecycle of the decoding pool
+"""
+
+import threading
+import time
+import unittest
+
+try:
+    from leaderboard.envs.sensor_decoder import SensorDecoder
+except ImportError:  # The preprocessing needs OpenCV
+    SensorDecoder = None
+
+
+@unittest.skipIf(SensorDecoder is None, "the sensor preprocessing dependencies are not installed")
+class TestSensorDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.decoder = SensorDecoder(workers=4, max_pending=64)
+        self.decoded = {}
+        self.active = {}
+        self.overlaps = 0
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.decoder.shutdown()
+
+    def decode(self, tag):
+        def decode(frame):
+            with self.lock:
+                if self.active.get(tag):
+                    self.overlaps += 1
+                self.active[tag] = True
+            # The first measurements are the slowest, so a parallel decoding would reorder them
+            time.sleep(0.002 * max(0, 5 - frame))
+            with self.lock:
+                self.active[tag] = False
+                self.decoded.setdefault(tag, []).append(frame)
+        return decode
+
+    def test_measurements_of_a_sensor_in_order(self):
+        for frame in range(20):
+            for tag in ('rgb', 'lidar'):
+                self.decoder.submit(tag, self.decode(tag), frame)
+        self.decoder.shutdown()
+
+        self.assertEqual(self.decoded, {'rgb': list(range(20)), 'lidar': list(range(20))})
+        self.assertEqual(self.overlaps, 0)
+        self.assertEqual(self.decoder.summary()['decoded'], 40)
+
+    def test_submit_after_shutdown_is_dropped(self):
+        self.decoder.submit('rgb', self.decode('rgb'), 0)
+        self.decoder.shutdown()
+        self.decoder.submit('rgb', self.decode('rgb'), 1)
+
+        self.assertEqual(self.decoded, {'rgb': [0]})
+        self.assertEqual(self.decoder.summary()['dropped'], 1)
+
+        # Until the next route
+        self.decoder.start()
+        self.decoder.submit('rgb', self.decode('rgb'), 2)
+        self.decoder.shutdown()
+        self.assertEqual(self.decoded, {'rgb': [0, 2]})
+
+
+if __name__ == '__main__':
+    unittest.main()
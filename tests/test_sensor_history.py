@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Tests of the history windows of the small sensors, live and recorded
+"""
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from leaderboard.envs.sensor_history import SensorHistory
+from leaderboard.envs.sensor_recorder import SensorRecorder, SensorRecording
+
+
+class RecordedFrame(dict):
+
+    """
+    Stand-in of the SensorFrame, which needs CARLA
+    """
+
+    def __init__(self, frame, readings):
+        super(RecordedFrame, self).__init__(readings)
+        self.frame = frame
+
+
+class TestSensorHistory(unittest.TestCase):
+
+    def test_window_order(self):
+        history = SensorHistory(3)
+        for frame in range(1, 6):
+            history.append(frame, frame * 0.05, np.arange(2.0) + frame)
+            window = history.window()
+
+        np.testing.assert_array_equal(window['frames'], [3, 4, 5])
+        np.testing.assert_allclose(window['timestamps'], [0.15, 0.2, 0.25])
+        np.testing.assert_array_equal(window['values'], [[3, 4], [4, 5], [5, 6]])
+
+    def test_partial_window(self):
+        history = SensorHistory(4)
+        history.append(1, 0.05, {'speed': 2.0})
+        history.append(2, 0.1, {'speed': 3.0})
+
+        window = history.window()
+        self.assertEqual(window['values'].shape, (2, 1))
+        np.testing.assert_array_equal(window['values'][:, 0], [2.0, 3.0])
+
+    def test_read_only(self):
+        history = SensorHistory(2)
+        history.append(1, 0.05, np.zeros(3))
+        for view in history.window().values():
+            self.assertFalse(view.flags.writeable)
+            with self.assertRaises(ValueError):
+                view[0] = 1
+
+    def test_recorded_window(self):
+        path = tempfile.mkdtemp()
+        try:
+            history = SensorHistory(2)
+            recorder = SensorRecorder(path)
+            for frame in range(1, 4):
+                history.append(frame, frame * 0.05, np.arange(3.0) * frame)
+                recorder.record_frame(RecordedFrame(frame, {'imu': (frame, history.window())}), frame * 0.05)
+            recorder.close()
+
+            live = history.window()
+            recorded = SensorRecording(path).get_frame(2)[2]['imu'][1]
+            for key, view in live.items():
+                self.assertIsInstance(recorded[key], np.ndarray)
+                self.assertEqual(recorded[key].dtype, view.dtype)
+                self.assertFalse(recorded[key].flags.writeable)
+                np.testing.assert_array_equal(recorded[key], view)
+        finally:
+            shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Tests of the recording of the delivered frames
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from leaderboard.envs.sensor_recorder import SensorRecorder, SensorRecording
+
+
+class RecordedFrame(dict):
+
+    """
+    Stand-in of the SensorFrame, which needs CARLA
+    """
+
+    def __init__(self, frame, readings):
+        super(RecordedFrame, self).__init__(readings)
+        self.frame = frame
+
+
+class TestSensorRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_repeated_readings_point_at_the_written_one(self):
+        recorder = SensorRecorder(self.path)
+        for frame in range(1, 7):
+            # The LiDAR and the speedometer have a period of 3 frames
+            period_frame = frame - (frame - 1) % 3
+            recorder.record_frame(RecordedFrame(frame, {
+                'rgb': (frame, np.full((2, 2, 4), frame, dtype=np.uint8)),
+                'lidar': (period_frame, np.full((period_frame, 4), period_frame, dtype=np.float32)),
+                'speed': (period_frame, {'speed': float(period_frame)}),
+            }), frame * 0.05)
+        recorder.close()
+
+        recording = SensorRecording(self.path)
+        for position in range(6):
+            frame, _, readings = recording.get_frame(position)
+            period_frame = frame - (frame - 1) % 3
+            self.assertEqual(readings['rgb'][0], frame)
+            np.testing.assert_array_equal(readings['rgb'][1], np.full((2, 2, 4), frame))
+            self.assertEqual(readings['lidar'][0], period_frame)
+            np.testing.assert_array_equal(readings['lidar'][1], np.full((period_frame, 4), period_frame))
+            self.assertEqual(readings['speed'], (period_frame, {'speed': float(period_frame)}))
+
+        # Only the new readings are stored
+        index = np.load(os.path.join(self.path, 'lidar', 'index.npy'))
+        rows = list(zip(index['chunk'].tolist(), index['slot'].tolist()))
+        self.assertEqual(rows, [rows[0]] * 3 + [rows[3]] * 3)
+        self.assertNotEqual(rows[0], rows[3])
+        with open(os.path.join(self.path, 'speed', 'values.jsonl')) as fd:
+            self.assertEqual(sum('"data"' in line for line in fd), 2)
+
+    def test_arrays_copied_by_the_writer(self):
+        written = threading.Event()
+        recorder = SensorRecorder(self.path)
+
+        # The queued reading is the delivered array, which the writer copies before it is released
+        reading = np.full((4, 4), 7, dtype=np.float32)
+        reading.flags.writeable = False
+        recorder.record_frame(RecordedFrame(1, {'lidar': (1, reading)}), 0.05)
+        recorder.release_after_writes([written.set])
+        self.assertTrue(written.wait(5))
+
+        reading.flags.writeable = True
+        reading[:] = 0
+        recorder.close()
+
+        np.testing.assert_array_equal(SensorRecording(self.path).get_frame(0)[2]['lidar'][1], np.full((4, 4), 7))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Tests of the oriented rectangles of the areas around the ego vehicle
+"""
+
+import math
+import unittest
+
+import numpy as np
+
+from leaderboard.utils.zone_geometry import DEFAULT_ZONE_SHAPES, ZoneGeometry
+
+# Bounding box extent of the ego vehicle
+EXTENT_X = 2.45
+EXTENT_Y = 1.07
+
+FRONT, LEFT, RIGHT = 0, 1, 2
+
+# Share of the points within 15 m of the ego classified as before the ZoneGeometry, on random poses
+AGREEMENT_FRONT = 0.979
+AGREEMENT_SIDE = 0.989
+
+
+def legacy_slope_zones(ego, yaw, extent, points):
+    """
+    Slope based area check done by the ScenarioManager before the ZoneGeometry.
+    Returns an (N, 3) boolean array, with the areas in the order of DEFAULT_ZONE_SHAPES
+    """
+    angle = {"front": 0, "left": -90.0, "right": 90.0}
+    distance = {"front": 10.0, "left": 3.0, "right": 3.0}
+    width = {"front": extent[0], "left": extent[1] * 2, "right": extent[1] * 2}
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    x, y = points[:, 0], points[:, 1]
+
+    inside = np.zeros((len(points), 3), dtype=bool)
+    for column, i in enumerate(["front", "left", "right"]):
+        slope = math.tan(math.radians(yaw + angle[i]))
+        if slope == 0:
+            # The front and back boundaries are degenerate, nothing is inside
+            continue
+
+        interval_point = (ego[0] + distance[i] * math.cos(math.radians(yaw + angle[i])),
+                          ego[1] + distance[i] * math.sin(math.radians(yaw + angle[i])))
+        norm = math.sqrt(1 / (slope ** 2 + 1))
+        left_symmetry = (- width[i] * slope * norm + interval_point[0], width[i] * norm + interval_point[1])
+        right_symmetry = (width[i] * slope * norm + interval_point[0], - width[i] * norm + interval_point[1])
+
+        front_diff = (x - interval_point[0]) / slope + interval_point[1] - y
+        back_diff = (x - ego[0]) / slope + ego[1] - y
+        left_diff = (x - left_symmetry[0]) * slope + left_symmetry[1] - y
+        right_diff = (x - right_symmetry[0]) * slope + right_symmetry[1] - y
+        inside[:, column] = (front_diff * back_diff < 0) & (left_diff * right_diff < 0)
+
+    return inside
+
+
+def legacy_disagreement_band(ego, yaw, extent, points, margin=1e-6):
+    """
+    Where the slope based areas may differ from the oriented rectangles, as an (N, 3) boolean array.
+
+    Their sides are right, but their front and back boundaries go through the same points
+    with a skewed direction: at a lateral offset s, they are moved forward by s * tan(2 * yaw)
+    (yaw of the area). The areas thus differ in the triangles between both boundaries,
+    and on the edges of the rectangles.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2) - np.asarray(ego, dtype=np.float64)
+
+    band = np.zeros((len(points), 3), dtype=bool)
+    for column, shape in enumerate(DEFAULT_ZONE_SHAPES):
+        theta = math.radians(yaw + shape.angle)
+        forward = points.dot([math.cos(theta), math.sin(theta)])
+        lateral = points.dot([-math.sin(theta), math.cos(theta)])
+        half_width = shape.half_width(extent[0], extent[1])
+
+        skew = np.abs(lateral * math.tan(2 * theta)) + margin
+        on_side = np.abs(np.abs(lateral) - half_width) <= margin
+        on_ends = (np.abs(forward) <= skew) | (np.abs(forward - shape.distance) <= skew)
+        band[:, column] = on_side | ((np.abs(lateral) <= half_width + margin) & on_ends)
+
+    return band
+
+
+class TestZoneGeometry(unittest.TestCase):
+
+    def setUp(self):
+        self.geometry = ZoneGeometry()
+        self.geometry.update(0.0, 0.0, 0.0, EXTENT_X, EXTENT_Y)
+
+    def overlap(self, center, yaw, extent):
+        return self.geometry.boxes_in_zones([center], [yaw], [extent])[0]
+
+    def test_areas(self):
+        # Front area from x = 0 to 10, half width EXTENT_X. Side areas 3 m long (left is -y), half width 2 * EXTENT_Y
+        inside = self.geometry.points_in_zones([[5.0, 0.0], [0.5, -2.8], [0.5, 2.8], [-3.0, 0.0]])
+        np.testing.assert_array_equal(inside, [[True, False, False],
+                                               [False, True, False],
+                                               [False, False, True],
+                                               [False, False, False]])
+
+    def test_box_touching_the_edge(self):
+        self.assertTrue(self.overlap([12.0, 0.0], 0.0, [2.0, 1.0])[FRONT])
+        self.assertFalse(self.overlap([12.001, 0.0], 0.0, [2.0, 1.0])[FRONT])
+
+        self.assertTrue(self.overlap([5.0, EXTENT_X + 1.0], 0.0, [2.0, 1.0])[FRONT])
+        self.assertFalse(self.overlap([5.0, EXTENT_X + 1.001], 0.0, [2.0, 1.0])[FRONT])
+
+    def test_box_center_outside(self):
+        # The center of the box is out of the area, but not all of its body
+        self.assertTrue(self.overlap([11.0, 0.0], 0.0, [2.0, 1.0])[FRONT])
+        self.assertFalse(self.geometry.points_in_zones([[11.0, 0.0]])[0][FRONT])
+
+    def test_rotated_box(self):
+        # Aligned, the box is 0.2 m away from the front area. Rotated 45 degrees, its corner gets into it
+        self.assertFalse(self.overlap([11.2, 0.0], 0.0, [1.0, 1.0])[FRONT])
+        self.assertTrue(self.overlap([11.2, 0.0], 45.0, [1.0, 1.0])[FRONT])
+
+        # Along its diagonal, a rotated box doesn't reach as far
+        self.assertTrue(self.overlap([5.0, EXTENT_X + 1.4], 0.0, [1.5, 1.5])[FRONT])
+        self.assertFalse(self.overlap([5.0, EXTENT_X + 2.2], 45.0, [1.5, 0.01])[FRONT])
+
+    def test_rotated_ego(self):
+        # With the ego facing +y, the front area goes along +y, the left one along +x and the right one along -x
+        self.geometry.update(0.0, 0.0, 90.0, EXTENT_X, EXTENT_Y)
+        np.testing.assert_array_equal(self.overlap([0.0, 5.0], 0.0, [1.0, 1.0]), [True, False, False])
+        np.testing.assert_array_equal(self.overlap([0.0, -5.0], 0.0, [1.0, 1.0]), [False, False, False])
+        np.testing.assert_array_equal(self.overlap([2.8, 0.5], 0.0, [0.2, 0.2]), [False, True, False])
+        np.testing.assert_array_equal(self.overlap([-2.8, 0.5], 0.0, [0.2, 0.2]), [False, False, True])
+
+    def test_zero_extent_is_point_test(self):
+        rng = np.random.RandomState(0)
+        for _ in range(50):
+            ego = rng.uniform(-100, 100, 2)
+            yaw = rng.uniform(-180, 180)
+            self.geometry.update(ego[0], ego[1], yaw, EXTENT_X, EXTENT_Y)
+
+            points = ego + rng.uniform(-15, 15, (200, 2))
+            boxes = self.geometry.boxes_in_zones(points, rng.uniform(-180, 180, 200), np.zeros((200, 2)))
+            np.testing.assert_array_equal(boxes, self.geometry.points_in_zones(points))
+
+    def test_legacy_areas_away_from_the_edges(self):
+        # The safety brake only changed in the band of legacy_disagreement_band
+        rng = np.random.RandomState(0)
+        for _ in range(200):
+            ego = rng.uniform(-100, 100, 2)
+            yaw = rng.uniform(-180, 180)
+            self.geometry.update(ego[0], ego[1], yaw, EXTENT_X, EXTENT_Y)
+
+            points = ego + rng.uniform(-15, 15, (500, 2))
+            legacy = legacy_slope_zones(ego, yaw, (EXTENT_X, EXTENT_Y), points)
+            band = legacy_disagreement_band(ego, yaw, (EXTENT_X, EXTENT_Y), points)
+            current = self.geometry.points_in_zones(points)
+
+            np.testing.assert_array_equal(current[~band], legacy[~band])
+
+    def test_legacy_agreement(self):
+        # Documented agreement of the slope based areas, on random poses
+        rng = np.random.RandomState(1)
+        agreement = np.zeros(3)
+        for _ in range(200):
+            ego = rng.uniform(-100, 100, 2)
+            yaw = rng.uniform(-180, 180)
+            self.geometry.update(ego[0], ego[1], yaw, EXTENT_X, EXTENT_Y)
+
+            points = ego + rng.uniform(-15, 15, (500, 2))
+            legacy = legacy_slope_zones(ego, yaw, (EXTENT_X, EXTENT_Y), points)
+            agreement += np.mean(self.geometry.points_in_zones(points) == legacy, axis=0)
+
+        agreement /= 200
+        np.testing.assert_allclose(agreement, [AGREEMENT_FRONT, AGREEMENT_SIDE, AGREEMENT_SIDE], atol=0.004)
+
+    def test_legacy_disagreement_regions(self):
+        def local(yaw, forward, lateral):
+            theta = math.radians(yaw)
+            return [forward * math.cos(theta) - lateral * math.sin(theta),
+                    forward * math.sin(theta) + lateral * math.cos(theta)]
+
+        # At a yaw of 20 degrees, the slope based front area reaches behind the ego and past its
+        # end on one side, and stops short of both on the other side
+        points = [local(20.0, forward, lateral) for forward, lateral in
+                  [(-0.5, -1.5), (10.5, 1.5), (0.5, 1.5), (9.5, -1.5), (5.0, 0.0)]]
+        self.geometry.update(0.0, 0.0, 20.0, EXTENT_X, EXTENT_Y)
+        np.testing.assert_array_equal(legacy_slope_zones((0.0, 0.0), 20.0, (EXTENT_X, EXTENT_Y), points)[:, FRONT],
+                                      [True, True, False, False, True])
+        np.testing.assert_array_equal(self.geometry.points_in_zones(points)[:, FRONT],
+                                      [False, False, True, True, True])
+
+        # At 45 degrees, it shrinks to its center line
+        points = [local(45.0, forward, lateral) for forward, lateral in [(5.0, 0.0), (5.0, 1.0), (5.0, -1.0)]]
+        self.geometry.update(0.0, 0.0, 45.0, EXTENT_X, EXTENT_Y)
+        np.testing.assert_array_equal(legacy_slope_zones((0.0, 0.0), 45.0, (EXTENT_X, EXTENT_Y), points)[:, FRONT],
+                                      [True, False, False])
+        np.testing.assert_array_equal(self.geometry.points_in_zones(points)[:, FRONT], [True, True, True])
+
+    def test_empty(self):
+        self.assertEqual(self.geometry.boxes_in_zones(np.zeros((0, 2)), [], np.zeros((0, 2))).shape, (0, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()